@@ -0,0 +1,173 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Set, Tuple
+
+import numpy as np
+
+from vehicle_matcher import RouteGeometry
+
+# Observations further apart than this are not used to learn segment times.
+MAX_OBSERVATION_GAP_S = 300
+# Learned segment times outside this range are treated as noise (GPS jumps, layovers).
+MIN_SEGMENT_S = 5.0
+MAX_SEGMENT_S = 1800.0
+# Moving backwards by more than this along the shape resets a vehicle's track.
+BACKTRACK_TOLERANCE_M = 50.0
+
+
+@dataclass
+class _Track:
+    pattern: int
+    along: float
+    ts: float
+    last_stop: int = -1
+    last_stop_ts: float = 0.0
+
+
+def _segment_key(from_stop: str, to_stop: str) -> str:
+    return f"{from_stop}>{to_stop}"
+
+
+class EtaPredictor:
+    """Predicts downstream stop arrivals from map-matched vehicles and learned stop-to-stop times."""
+
+    def __init__(self, smoothing: float, default_speed_mps: float, horizon_s: int):
+        self.smoothing = smoothing
+        self.default_speed_mps = default_speed_mps
+        self.horizon_s = horizon_s
+        # Stop-to-stop travel time (including dwell at the origin stop), keyed "from>to".
+        self.segment_times: Dict[str, float] = {}
+        self._dirty: Set[str] = set()
+        self._tracks: Dict[str, _Track] = {}
+
+    def load_segment_times(self, values: Dict[bytes, bytes]) -> None:
+        for key, value in values.items():
+            try:
+                self.segment_times[key.decode("utf-8")] = float(value)
+            except (UnicodeDecodeError, ValueError):
+                continue
+
+    def pop_dirty(self) -> Dict[str, float]:
+        dirty = {key: round(self.segment_times[key], 1) for key in self._dirty}
+        self._dirty.clear()
+        return dirty
+
+    def _learn(self, key: str, seconds: float) -> None:
+        if not MIN_SEGMENT_S <= seconds <= MAX_SEGMENT_S:
+            return
+        previous = self.segment_times.get(key)
+        if previous is None:
+            self.segment_times[key] = seconds
+        else:
+            self.segment_times[key] = previous + self.smoothing * (seconds - previous)
+        self._dirty.add(key)
+
+    def observe(self, geometry: RouteGeometry, matches: Dict[str, Dict[str, Any]]) -> None:
+        """Record the time each vehicle passed each stop and learn the segment between consecutive passes."""
+        seen: Set[str] = set()
+        for vehicle_id, match in matches.items():
+            pattern = match.get("pattern")
+            ts = match.get("updated_at")
+            if pattern is None or ts is None or not match.get("on_route"):
+                continue
+            seen.add(vehicle_id)
+            along = float(match["dist_along_m"])
+            ts = float(ts)
+
+            track = self._tracks.get(vehicle_id)
+            if track is not None and track.pattern == pattern and ts <= track.ts:
+                # Polls often repeat the vehicle's last report; it carries nothing new.
+                continue
+            if (
+                track is None
+                or track.pattern != pattern
+                or along < track.along - BACKTRACK_TOLERANCE_M
+                or ts - track.ts > MAX_OBSERVATION_GAP_S
+            ):
+                self._tracks[vehicle_id] = _Track(pattern=pattern, along=along, ts=ts)
+                continue
+            if along <= track.along:
+                track.ts = ts
+                continue
+
+            lo, hi = geometry.pattern_stops(pattern)
+            stop_dists = geometry.stop_dists[lo:hi]
+            first = int(np.searchsorted(stop_dists, track.along, side="right"))
+            last = int(np.searchsorted(stop_dists, along, side="right"))
+            for k in range(first, last):
+                # Linear interpolation of when the vehicle crossed stop k.
+                passed = track.ts + (float(stop_dists[k]) - track.along) / (along - track.along) * (ts - track.ts)
+                if track.last_stop == k - 1 and k > 0:
+                    key = _segment_key(geometry.stop_ids[lo + k - 1], geometry.stop_ids[lo + k])
+                    self._learn(key, passed - track.last_stop_ts)
+                track.last_stop = k
+                track.last_stop_ts = passed
+            track.along = along
+            track.ts = ts
+
+        for vehicle_id in set(self._tracks) - seen:
+            del self._tracks[vehicle_id]
+
+    def _pattern_times(self, geometry: RouteGeometry, pattern: int) -> np.ndarray:
+        """Cumulative expected seconds from the first stop to each stop of a pattern."""
+        lo, hi = geometry.pattern_stops(pattern)
+        dists = geometry.stop_dists[lo:hi]
+        sched = geometry.stop_sched[lo:hi]
+        seg = np.diff(dists) / self.default_speed_mps
+        sched_seg = np.diff(sched)
+        usable = np.isfinite(sched_seg) & (sched_seg > 0)
+        seg[usable] = sched_seg[usable]
+        for k in range(1, hi - lo):
+            learned = self.segment_times.get(_segment_key(geometry.stop_ids[lo + k - 1], geometry.stop_ids[lo + k]))
+            if learned is not None:
+                seg[k - 1] = learned
+        return np.concatenate(([0.0], np.cumsum(seg)))
+
+    def predict(
+        self,
+        geometry: RouteGeometry,
+        matches: Dict[str, Dict[str, Any]],
+        now: int,
+        skip_trips: Set[str],
+    ) -> Dict[str, List[Tuple[int, Dict[str, Any]]]]:
+        """Predicted (arrival, doc) pairs per stop for every on-route vehicle, grouped by pattern."""
+        by_pattern: Dict[int, List[Dict[str, Any]]] = {}
+        for match in matches.values():
+            if match.get("pattern") is None or not match.get("on_route"):
+                continue
+            if match.get("trip_id") and match["trip_id"] in skip_trips:
+                continue
+            by_pattern.setdefault(int(match["pattern"]), []).append(match)
+
+        per_stop: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        for pattern, group in by_pattern.items():
+            lo, hi = geometry.pattern_stops(pattern)
+            stop_dists = geometry.stop_dists[lo:hi]
+            cum = self._pattern_times(geometry, pattern)
+
+            along = np.array([float(m["dist_along_m"]) for m in group])
+            base = np.array([float(m.get("updated_at") or now) for m in group])
+            position_s = np.interp(along, stop_dists, cum)
+            arrival = base[:, None] + (cum[None, :] - position_s[:, None])
+            keep = (stop_dists[None, :] > along[:, None]) & (arrival >= now) & (arrival <= now + self.horizon_s)
+
+            for row, col in zip(*np.nonzero(keep)):
+                match = group[row]
+                when = int(round(arrival[row, col]))
+                per_stop.setdefault(geometry.stop_ids[lo + col], []).append(
+                    (
+                        when,
+                        {
+                            "trip_id": match.get("trip_id"),
+                            "route_id": match.get("route_id"),
+                            "stop_sequence": int(geometry.stop_sequences[lo + col]),
+                            "arrival": when,
+                            "departure": None,
+                            "delay_s": None,
+                            "headsign": match.get("headsign"),
+                            "vehicle_id": match.get("vehicle_id"),
+                            "source": "predicted",
+                        },
+                    )
+                )
+        return per_stop
+
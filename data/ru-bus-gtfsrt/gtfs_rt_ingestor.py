@@ -3,7 +3,7 @@ import os
 import time
 import uuid
 import logging
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Set, Tuple
 
 import aiohttp
 import redis.asyncio as redis
@@ -14,6 +14,9 @@ import orjson
 
 from google.transit import gtfs_realtime_pb2
 
+from eta_predictor import EtaPredictor
+from vehicle_matcher import GeometryLoader, RouteGeometry, match_fleet
+
 load_dotenv()
 
 logging.basicConfig(
@@ -39,6 +42,12 @@ class Settings(BaseModel):
     REQUEST_TIMEOUT_SECONDS: int = int(os.getenv("REQUEST_TIMEOUT_SECONDS", "8"))
     USER_AGENT: str = os.getenv("USER_AGENT", "RU-Bus-LLM-GTFSrt-Ingestor/1.0")
     VERIFY_TLS: bool = os.getenv("VERIFY_TLS", "true").lower() == "true"
+    ROUTE_GEOMETRY_PATH: Optional[str] = os.getenv("ROUTE_GEOMETRY_PATH")
+    MAP_MATCH_MAX_OFFSET_M: float = float(os.getenv("MAP_MATCH_MAX_OFFSET_M", "150"))
+    ETA_PREDICTION_ENABLED: bool = os.getenv("ETA_PREDICTION_ENABLED", "true").lower() == "true"
+    ETA_HORIZON_SECONDS: int = int(os.getenv("ETA_HORIZON_SECONDS", "3600"))
+    ETA_DEFAULT_SPEED_MPS: float = float(os.getenv("ETA_DEFAULT_SPEED_MPS", "6.0"))
+    ETA_SMOOTHING: float = float(os.getenv("ETA_SMOOTHING", "0.2"))
 
 S = Settings()
 
@@ -91,13 +100,14 @@ async def store_raw(r: redis.Redis, key: str, blob: bytes, ttl: int = 60):
 # ----------------------------
 # VehiclePositions processor (no mapping, no label fallback)
 # ----------------------------
-async def process_vehicle_positions(r: redis.Redis, blob: bytes):
+async def process_vehicle_positions(r: redis.Redis, blob: bytes) -> List[Dict[str, Any]]:
     prefix = S.REDIS_KEY_PREFIX
     feed = gtfs_realtime_pb2.FeedMessage()
     feed.ParseFromString(blob)
 
     route_to_vehicle_ids: Dict[str, List[str]] = {}
     all_vehicle_ids: List[str] = []
+    vehicle_docs: List[Dict[str, Any]] = []
     ts_ms = now_ms()
 
     p = r.pipeline()
@@ -142,6 +152,7 @@ async def process_vehicle_positions(r: redis.Redis, blob: bytes):
         p.set(f"{prefix}:vehicle:{vehicle_id}", jdump(vehicle_doc))
         p.expire(f"{prefix}:vehicle:{vehicle_id}", 120)
         all_vehicle_ids.append(vehicle_id)
+        vehicle_docs.append(vehicle_doc)
 
         # Only maintain per-route set if route_id is present in the feed
         if route_id:
@@ -165,11 +176,80 @@ async def process_vehicle_positions(r: redis.Redis, blob: bytes):
 
     await p.execute()
     logging.info(f"Vehicles total={total}, with_route={with_route}, routes={len(route_to_vehicle_ids)}")
+    return vehicle_docs
+
+# ----------------------------
+# Vehicle progress (map-matched onto route shapes)
+# ----------------------------
+async def process_vehicle_progress(
+    r: redis.Redis, vehicles: List[Dict[str, Any]], route_geometry: Optional[RouteGeometry]
+) -> Dict[str, Dict[str, Any]]:
+    # Keys: {prefix}:vehicle:{vehicle_id}:progress and {prefix}:trips:progress (HASH trip_id -> progress)
+    prefix = S.REDIS_KEY_PREFIX
+    if route_geometry is None or not vehicles:
+        return {}
+
+    matches = await asyncio.to_thread(match_fleet, route_geometry, vehicles, S.MAP_MATCH_MAX_OFFSET_M)
+
+    p = r.pipeline()
+    by_trip: Dict[bytes, bytes] = {}
+    for vehicle_id, match in matches.items():
+        payload = jdump(match)
+        p.set(f"{prefix}:vehicle:{vehicle_id}:progress", payload, ex=120)
+        if match.get("trip_id") and match.get("on_route"):
+            by_trip[match["trip_id"].encode("utf-8")] = payload
+    tk = f"{prefix}:trips:progress"
+    p.delete(tk)
+    if by_trip:
+        p.hset(tk, mapping=by_trip)
+    p.expire(tk, 60)
+    await p.execute()
+    on_route = sum(1 for m in matches.values() if m.get("on_route"))
+    logging.info(f"Map-matched vehicles={len(matches)}, on_route={on_route}")
+    return matches
+
+# ----------------------------
+# Predicted arrivals (from map-matched vehicles, for trips without trip updates)
+# ----------------------------
+async def process_predictions(
+    r: redis.Redis,
+    predictor: EtaPredictor,
+    route_geometry: RouteGeometry,
+    matches: Dict[str, Dict[str, Any]],
+    live_trips: Set[str],
+    written: Dict[str, List[bytes]],
+):
+    # Key: {prefix}:stop:{stop_id}:arrivals (same ZSET as trip updates; members carry source="predicted")
+    # `written` holds last cycle's predicted members so they can be replaced without touching live ones.
+    prefix = S.REDIS_KEY_PREFIX
+    started = time.perf_counter()
+    predictor.observe(route_geometry, matches)
+    per_stop = predictor.predict(route_geometry, matches, int(time.time()), live_trips)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+
+    p = r.pipeline()
+    for stop_id, members in written.items():
+        p.zrem(f"{prefix}:stop:{stop_id}:arrivals", *members)
+    written.clear()
+    for stop_id, items in per_stop.items():
+        key = f"{prefix}:stop:{stop_id}:arrivals"
+        mapping = {jdump(doc): when for when, doc in items}
+        p.zadd(key, mapping)
+        p.expire(key, 90)
+        written[stop_id] = list(mapping)
+    learned = predictor.pop_dirty()
+    if learned:
+        p.hset(f"{prefix}:segment_times", mapping=learned)
+    await p.execute()
+    total = sum(len(items) for items in per_stop.values())
+    logging.info(
+        f"Predicted arrivals={total}, stops={len(per_stop)}, learned_segments={len(learned)} in {elapsed_ms:.1f} ms"
+    )
 
 # ----------------------------
 # TripUpdates processor (no mapping)
 # ----------------------------
-async def process_trip_updates(r: redis.Redis, blob: bytes):
+async def process_trip_updates(r: redis.Redis, blob: bytes) -> Set[str]:
     # Key: {prefix}:stop:{stop_id}:arrivals (ZSET; member JSON has trip_id & route_id as-is from feed)
     # \"\"\"
     prefix = S.REDIS_KEY_PREFIX
@@ -221,6 +301,7 @@ async def process_trip_updates(r: redis.Redis, blob: bytes):
         p.expire(key, 90)
     await p.execute()
     logging.info(f"Processed arrivals for {len(per_stop)} stops.")
+    return {doc["trip_id"] for items in per_stop.values() for _, doc in items if doc["trip_id"]}
 
 # ----------------------------
 # Alerts processor
@@ -281,6 +362,12 @@ async def run():
         logging.error("No feed URLs configured. Set VEHICLE_POSITIONS_URL and/or TRIP_UPDATES_URL/ALERTS_URL.")
         return
 
+    geometry = GeometryLoader(S.ROUTE_GEOMETRY_PATH)
+    predictor = EtaPredictor(S.ETA_SMOOTHING, S.ETA_DEFAULT_SPEED_MPS, S.ETA_HORIZON_SECONDS)
+    predictor.load_segment_times(await r.hgetall(f"{S.REDIS_KEY_PREFIX}:segment_times"))
+    predicted_members: Dict[str, List[bytes]] = {}
+    live_trips: Set[str] = set()
+
     async with aiohttp.ClientSession() as session:
         while True:
             have_lock = await acquire_lock(r, S.LOCK_KEY, S.LOCK_TTL_SECONDS, token)
@@ -292,17 +379,23 @@ async def run():
             await refresh_lock(r, S.LOCK_KEY, S.LOCK_TTL_SECONDS, token)
 
             try:
+                route_geometry = geometry.get()
+                matches: Dict[str, Dict[str, Any]] = {}
                 if S.VEHICLE_POSITIONS_URL:
                     data = await fetch_feed(session, S.VEHICLE_POSITIONS_URL, http_states["VEHICLE_POSITIONS_URL"])
                     if data:
                         await store_raw(r, f"{S.REDIS_KEY_PREFIX}:vehicle_positions:raw", data, ttl=S.REFRESH_SECONDS*4)
-                        await process_vehicle_positions(r, data)
+                        vehicles = await process_vehicle_positions(r, data)
+                        matches = await process_vehicle_progress(r, vehicles, route_geometry)
 
                 if S.TRIP_UPDATES_URL:
                     data = await fetch_feed(session, S.TRIP_UPDATES_URL, http_states["TRIP_UPDATES_URL"])
                     if data:
                         await store_raw(r, f"{S.REDIS_KEY_PREFIX}:trip_updates:raw", data, ttl=S.REFRESH_SECONDS*4)
-                        await process_trip_updates(r, data)
+                        live_trips = await process_trip_updates(r, data)
+
+                if S.ETA_PREDICTION_ENABLED and matches and route_geometry is not None:
+                    await process_predictions(r, predictor, route_geometry, matches, live_trips, predicted_members)
 
                 if S.ALERTS_URL:
                     data = await fetch_feed(session, S.ALERTS_URL, http_states["ALERTS_URL"])
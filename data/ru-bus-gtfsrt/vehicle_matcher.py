@@ -0,0 +1,180 @@
+import logging
+import math
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+EARTH_RADIUS_M = 6_371_000.0
+DEFAULT_GEOMETRY_PATH = Path(__file__).resolve().parent.parent / "index" / "route_geometry.npz"
+
+
+class RouteGeometry:
+    """Shapes and stop patterns written nightly by src/tasks/build_route_geometry.py."""
+
+    def __init__(self, path: Path, data: Any):
+        self.path = path
+        self.lat0 = float(data["lat0"])
+        self.cos_lat0 = math.cos(math.radians(self.lat0))
+
+        offsets = data["shape_offsets"]
+        lat, lon, dist = data["shape_lat"], data["shape_lon"], data["shape_dist"]
+        self.shape_ids: List[str] = [str(s) for s in data["shape_ids"]]
+        self.shape_xy: List[np.ndarray] = []
+        self.shape_dist: List[np.ndarray] = []
+        for i in range(len(self.shape_ids)):
+            lo, hi = int(offsets[i]), int(offsets[i + 1])
+            self.shape_xy.append(self.project(lat[lo:hi], lon[lo:hi]))
+            self.shape_dist.append(dist[lo:hi])
+
+        self.pattern_shape = data["pattern_shape"]
+        self.pattern_route: List[str] = [str(r) for r in data["pattern_route"]]
+        self.pattern_headsign: List[str] = [str(h) for h in data["pattern_headsign"]]
+        self.stop_offsets = data["pattern_stop_offsets"]
+        self.stop_ids: List[str] = [str(s) for s in data["stop_ids"]]
+        self.stop_sequences = data["stop_sequences"]
+        self.stop_dists = data["stop_dists"]
+        # Median scheduled seconds from the first stop; older builds have none.
+        if "stop_sched_s" in data.files:
+            self.stop_sched = data["stop_sched_s"]
+        else:
+            self.stop_sched = np.full(len(self.stop_ids), np.nan)
+
+        self.trip_pattern: Dict[str, int] = {
+            str(trip): int(p) for trip, p in zip(data["trip_ids"], data["trip_pattern"])
+        }
+        self.route_patterns: Dict[str, List[int]] = {}
+        for pattern, route_id in enumerate(self.pattern_route):
+            self.route_patterns.setdefault(route_id, []).append(pattern)
+
+    @classmethod
+    def load(cls, path: Path) -> "RouteGeometry":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(path, data)
+
+    def project(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        return np.column_stack(
+            (
+                np.radians(lon) * self.cos_lat0 * EARTH_RADIUS_M,
+                np.radians(lat) * EARTH_RADIUS_M,
+            )
+        )
+
+    def pattern_stops(self, pattern: int) -> Tuple[int, int]:
+        return int(self.stop_offsets[pattern]), int(self.stop_offsets[pattern + 1])
+
+
+class GeometryLoader:
+    """Reloads route geometry when the nightly build replaces the file."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path) if path else DEFAULT_GEOMETRY_PATH
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._geometry: Optional[RouteGeometry] = None
+
+    def get(self) -> Optional[RouteGeometry]:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return self._geometry
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp != self._stamp:
+            try:
+                self._geometry = RouteGeometry.load(self.path)
+                self._stamp = stamp
+                logging.info(f"Loaded route geometry from {self.path} ({len(self._geometry.shape_ids)} shapes)")
+            except Exception as e:
+                logging.warning(f"Could not load route geometry {self.path}: {e}")
+        return self._geometry
+
+
+def _project_onto_shape(xy: np.ndarray, shape_xy: np.ndarray, shape_dist: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Snap m points onto one polyline at once; returns (offset_m, distance_along_m) per point."""
+    seg_start = shape_xy[:-1]
+    seg_vec = shape_xy[1:] - seg_start
+    seg_len2 = np.maximum((seg_vec ** 2).sum(axis=1), 1e-9)
+
+    rel = xy[:, None, :] - seg_start[None, :, :]
+    t = np.clip((rel * seg_vec[None, :, :]).sum(axis=2) / seg_len2[None, :], 0.0, 1.0)
+    closest = seg_start[None, :, :] + t[:, :, None] * seg_vec[None, :, :]
+    offsets = np.hypot(*(closest - xy[:, None, :]).transpose(2, 0, 1))
+
+    best = np.argmin(offsets, axis=1)
+    rows = np.arange(len(xy))
+    along = shape_dist[best] + t[rows, best] * np.sqrt(seg_len2[best])
+    return offsets[rows, best], along
+
+
+def match_fleet(
+    geometry: RouteGeometry,
+    vehicles: List[Dict[str, Any]],
+    max_offset_m: float,
+) -> Dict[str, Dict[str, Any]]:
+    """Snap every vehicle onto the shape of its trip (or its route's patterns) in one pass."""
+    candidates: List[Tuple[int, int]] = []
+    for i, doc in enumerate(vehicles):
+        if doc.get("lat") is None or doc.get("lon") is None:
+            continue
+        pattern = geometry.trip_pattern.get(doc.get("trip_id") or "")
+        if pattern is not None:
+            candidates.append((i, pattern))
+            continue
+        for pattern in geometry.route_patterns.get(doc.get("route_id") or "", []):
+            candidates.append((i, pattern))
+    if not candidates:
+        return {}
+
+    lats = np.array([float(v.get("lat") or 0.0) for v in vehicles])
+    lons = np.array([float(v.get("lon") or 0.0) for v in vehicles])
+    xy = geometry.project(lats, lons)
+
+    cand_vehicle = np.array([c[0] for c in candidates], dtype=np.int64)
+    cand_pattern = np.array([c[1] for c in candidates], dtype=np.int64)
+    cand_shape = geometry.pattern_shape[cand_pattern]
+    cand_offset = np.full(len(candidates), np.inf)
+    cand_along = np.zeros(len(candidates))
+
+    for shape in np.unique(cand_shape):
+        mask = cand_shape == shape
+        offsets, along = _project_onto_shape(
+            xy[cand_vehicle[mask]], geometry.shape_xy[shape], geometry.shape_dist[shape]
+        )
+        cand_offset[mask] = offsets
+        cand_along[mask] = along
+
+    # Best candidate per vehicle: sort by (vehicle, offset) and keep the first row of each vehicle.
+    order = np.lexsort((cand_offset, cand_vehicle))
+    first = order[np.concatenate(([True], np.diff(cand_vehicle[order]) != 0))]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for c in first:
+        doc = vehicles[int(cand_vehicle[c])]
+        pattern = int(cand_pattern[c])
+        shape = int(cand_shape[c])
+        offset = float(cand_offset[c])
+        along = float(cand_along[c])
+        length = float(geometry.shape_dist[shape][-1])
+
+        lo, hi = geometry.pattern_stops(pattern)
+        stop_dists = geometry.stop_dists[lo:hi]
+        nxt = min(int(np.searchsorted(stop_dists, along, side="right")), hi - lo - 1)
+
+        results[str(doc["vehicle_id"])] = {
+            "vehicle_id": doc["vehicle_id"],
+            "trip_id": doc.get("trip_id"),
+            "route_id": doc.get("route_id") or geometry.pattern_route[pattern],
+            "shape_id": geometry.shape_ids[shape],
+            "pattern": pattern,
+            "on_route": offset <= max_offset_m,
+            "offset_m": round(offset, 1),
+            "dist_along_m": round(along, 1),
+            "shape_length_m": round(length, 1),
+            "progress": round(along / length, 4) if length > 0 else 0.0,
+            "next_stop_id": geometry.stop_ids[lo + nxt],
+            "next_stop_sequence": int(geometry.stop_sequences[lo + nxt]),
+            "next_stop_dist_m": round(max(0.0, float(stop_dists[nxt]) - along), 1),
+            "headsign": geometry.pattern_headsign[pattern],
+            "updated_at": doc.get("updated_at"),
+        }
+    return results
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, HTTPException
+from typing import AsyncIterator, Union
 
-from src.app.schemas.chat import ChatRequest
+import redis.asyncio as redis
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from src.app.api.deps import get_redis
+from src.app.schemas.chat import ChatRequest, ChatWidgetResponse
 from src.app.schemas.chat_widgets import LLMWidgetConfig
-from src.app.services.llm_router import route_message
+from src.app.services.llm_client import LLMUnavailable
+from src.app.services.llm_router import route_message, route_message_with_data, stream_route_message
+from src.app.utils.json import jdump
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -12,10 +19,44 @@ router = APIRouter(prefix="/chat", tags=["chat"])
 @router.post(
     "",
     summary="Chat with the model router",
-    response_model=LLMWidgetConfig,
+    response_model=Union[ChatWidgetResponse, LLMWidgetConfig],
 )
-async def chat(req: ChatRequest) -> LLMWidgetConfig:
+async def chat(
+    req: ChatRequest, r: redis.Redis = Depends(get_redis)
+) -> Union[ChatWidgetResponse, LLMWidgetConfig]:
     try:
-        return await route_message(req.message)
+        if req.include_widget_data:
+            return await route_message_with_data(req.message, req.lat, req.lon, r)
+        return await route_message(req.message, req.lat, req.lon, r)
+    except LLMUnavailable as exc:
+        raise HTTPException(status_code=503, detail=f"LLM unavailable: {exc}")
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"LLM routing failed: {exc}")
+
+
+def _sse(event: str, data: object) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + jdump(data) + b"\n\n"
+
+
+@router.post(
+    "/stream",
+    summary="Chat with the model router, streamed as server-sent events",
+    response_class=StreamingResponse,
+)
+async def chat_stream(req: ChatRequest, r: redis.Redis = Depends(get_redis)) -> StreamingResponse:
+    async def events() -> AsyncIterator[bytes]:
+        try:
+            async for event, data in stream_route_message(
+                req.message, req.lat, req.lon, r, req.include_widget_data
+            ):
+                yield _sse(event, data)
+        except LLMUnavailable as exc:
+            yield _sse("error", {"status": 503, "detail": f"LLM unavailable: {exc}"})
+        except Exception as exc:
+            yield _sse("error", {"status": 500, "detail": f"LLM routing failed: {exc}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -6,6 +6,9 @@ import redis.asyncio as redis
 from src.app.api.deps import get_redis
 from src.app.services.transit_cache import get_health as redis_health
 from src.app.db.session import psql_ping
+from src.app.services.llm_client import llm_client
+from src.app.services.response_cache import response_cache
+from src.app.services import index_store, semantic_search, warmup, widget_prefetch
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -32,8 +35,9 @@ async def readiness(r: redis.Redis = Depends(get_redis)) -> dict[str, object]:
     except Exception:
         redis_ok = False
 
-    if not (pg_ok and redis_ok):
-        detail = {"postgres_ok": pg_ok, "redis_ok": redis_ok}
+    warm = warmup.is_ready()
+    if not (pg_ok and redis_ok and warm):
+        detail = {"postgres_ok": pg_ok, "redis_ok": redis_ok, "warmup": warmup.status()}
         raise HTTPException(status_code=503, detail=detail)
 
     return {
@@ -41,4 +45,18 @@ async def readiness(r: redis.Redis = Depends(get_redis)) -> dict[str, object]:
         "postgres_ok": pg_ok,
         "redis_ok": redis_ok,
         "vehicle_positions_stale": vehicle_positions_stale,
+        "indexes": index_store.metrics(),
+        "warmup": warmup.status(),
     }
+
+
+@router.get("/llm", summary="LLM client, query embedding, response cache and widget prefetch metrics")
+async def llm_metrics(r: redis.Redis = Depends(get_redis)) -> dict[str, object]:
+    metrics: dict[str, object] = llm_client.metrics()
+    try:
+        metrics["response_cache"] = await response_cache.metrics(r)
+    except redis.RedisError:
+        metrics["response_cache"] = None
+    metrics["widget_prefetch"] = widget_prefetch.metrics()
+    metrics["embedding"] = semantic_search.embedding_batcher.metrics()
+    return metrics
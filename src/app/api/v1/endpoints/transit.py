@@ -2,16 +2,23 @@
 from __future__ import annotations
 
 import time
-from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 import redis.asyncio as redis
 
 from src.app.api.deps import get_redis
+from src.app.core.config import settings
 from src.app.schemas.transit import (
     AlertsResponse,
     ArrivalsResponse,
+    JourneyResponse,
+    NearestStopsResponse,
     Vehicle,
     VehiclesResponse,
 )
+from src.app.services import gtfs_static, route_shapes, stop_index
+from src.app.services.journey_planner import plan_trip
 from src.app.services.transit_cache import (
     get_stop_arrivals as svc_get_stop_arrivals,
     get_route_vehicles as svc_get_route_vehicles,
@@ -21,6 +28,18 @@ from src.app.services.transit_cache import (
 
 router = APIRouter(prefix="", tags=["transit"])
 
+@router.get("/stops/nearest", response_model=NearestStopsResponse)
+async def get_nearest_stops(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    k: int = Query(5, ge=1, le=25),
+    max_distance_m: Optional[float] = Query(None, gt=0),
+):
+    if gtfs_static.current_feed() is None:
+        raise HTTPException(status_code=503, detail="Static GTFS not loaded yet")
+    stops = stop_index.nearest_stops(lat, lon, k, max_distance_m)
+    return NearestStopsResponse(lat=lat, lon=lon, as_of=int(time.time() * 1000), stops=stops)
+
 @router.get("/stops/{stop_id}/arrivals", response_model=ArrivalsResponse)
 async def get_stop_arrivals(
     stop_id: str,
@@ -46,6 +65,26 @@ async def get_route_vehicles(route_id: str, r: redis.Redis = Depends(get_redis))
         stale=stale,
     )
 
+@router.get("/routes/{route_id}/shape", response_class=Response)
+async def get_route_shape(
+    route_id: str,
+    request: Request,
+    direction_id: Optional[str] = Query(None),
+    tolerance_m: Optional[float] = Query(None, gt=0, description="One of the prebuilt tolerances"),
+):
+    tolerance = f"{tolerance_m:g}" if tolerance_m is not None else None
+    shape = route_shapes.get_route_shape(route_id, direction_id, tolerance)
+    if shape is None:
+        raise HTTPException(status_code=404, detail="Shape not found")
+
+    headers = {
+        "Cache-Control": f"public, max-age={settings.route_shape_max_age_s}, stale-while-revalidate=86400",
+        "ETag": shape.etag,
+    }
+    if request.headers.get("if-none-match") == shape.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=shape.body, media_type="application/json", headers=headers)
+
 @router.get("/vehicles/{vehicle_id}", response_model=Vehicle)
 async def get_vehicle(vehicle_id: str, r: redis.Redis = Depends(get_redis)):
     vehicle = await svc_get_vehicle(r, vehicle_id)
@@ -56,3 +95,29 @@ async def get_vehicle(vehicle_id: str, r: redis.Redis = Depends(get_redis)):
 @router.get("/alerts", response_model=AlertsResponse)
 async def get_alerts(r: redis.Redis = Depends(get_redis)):
     return await svc_get_alerts(r)
+
+@router.get("/journeys", response_model=JourneyResponse)
+async def get_journey(
+    origin: str = Query(..., alias="from", description="Origin stop_id or landmark_id"),
+    destination: str = Query(..., alias="to", description="Destination stop_id or landmark_id"),
+    depart_at: Optional[int] = Query(None, description="Unix seconds; defaults to now"),
+    realtime: bool = Query(False, description="Apply delays from cached trip updates"),
+    max_transfers: int = Query(3, ge=0, le=6),
+    r: redis.Redis = Depends(get_redis),
+):
+    feed = gtfs_static.current_feed()
+    if feed is None:
+        raise HTTPException(status_code=503, detail="Static GTFS not loaded yet")
+
+    journey = await plan_trip(
+        r,
+        feed,
+        origin,
+        destination,
+        depart_at or int(time.time()),
+        realtime=realtime,
+        max_transfers=max_transfers,
+    )
+    if journey is None:
+        raise HTTPException(status_code=404, detail="No journey found")
+    return journey
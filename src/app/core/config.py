@@ -1,7 +1,8 @@
 # src/app/core/config.py
 from __future__ import annotations
 from functools import lru_cache
-from typing import List
+from pathlib import Path
+from typing import List, Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -19,7 +20,8 @@ class Settings(BaseSettings):
     api_prefix: str = "/api"
     api_version: str = "v1"
 
-    database_url: str
+    # Required by src/app/db/session.py; offline tools such as the intent eval run without it.
+    database_url: str = ""
     sql_echo: bool = False
     db_connect_timeout: int = 5
     gtfs_schema: str = "gtfs"
@@ -29,13 +31,73 @@ class Settings(BaseSettings):
     redis_url: str = "redis://localhost:6379/0"
     redis_key_prefix: str = "gtfsrt"
 
+    index_dir: Path = Path(__file__).resolve().parents[3] / "data" / "index"
+    # How often workers look for a newly published index manifest.
+    index_check_s: int = 30
+    # Load the model and indexes at startup; /health/ready stays 503 until that finishes.
+    warmup_enabled: bool = True
+    # Load model weights and indexes at import, for gunicorn --preload (see gunicorn_conf.py).
+    preload_models: bool = False
+    sbert_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    # "onnx" serves queries from the int8 export in index_dir/onnx (src/tasks/export_onnx_encoder.py).
+    embedding_backend: Literal["torch", "onnx"] = "torch"
+    onnx_threads: int = 1
+    # Exact/near-exact stop names and aliases are matched before (or instead of) embedding.
+    lexical_search_enabled: bool = True
+    # Search-time knobs for approximate indexes (FAISS_INDEX in the builders); ignored by Flat.
+    faiss_nprobe: int = 16
+    faiss_ef_search: int = 64
+    # Route documents (ordered stop lists from build_route_index.py) are searched with the same
+    # query embedding; up to route_search_k of them compete with stop hits on calibrated scores.
+    route_search_enabled: bool = True
+    route_search_k: int = 2
+    # Vector search for chat only looks at stops/landmarks on a campus the message names (stops
+    # without a campus pass), once at least campus_filter_min_coverage of the indexed stops have
+    # one. With a shared location and a radius > 0, it is limited to documents within that
+    # radius instead; off by default. Stops the message names are never filtered out.
+    campus_filter_enabled: bool = True
+    campus_filter_min_coverage: float = 0.8
+    geo_filter_radius_m: int = 0
+    # Concurrent query embeddings are encoded together: a batch closes at max_size queries or
+    # max_wait_ms after its first one, whichever comes first.
+    embed_batching_enabled: bool = True
+    embed_batch_max_size: int = 32
+    embed_batch_max_wait_ms: float = 2.0
+
     llm_api_base: str = "http://localhost:11434/v1"
     llm_api_key: str = ""
     llm_model: str = "llama3.1:8b-instruct-q4_K_M"
+    llm_connect_timeout_s: float = 3.0
+    llm_read_timeout_s: float = 30.0
+    llm_keepalive_s: float = 30.0
+    llm_max_retries: int = 1
+    llm_retry_backoff_s: float = 0.25
+    llm_max_concurrency: int = 4
+    llm_max_queue: int = 32
+    llm_queue_timeout_s: float = 10.0
+
+    intent_fast_path_enabled: bool = True
+    intent_fast_path_threshold: float = 0.6
+
+    response_cache_enabled: bool = True
+    response_cache_similarity: float = 0.93
+    response_cache_ttl_s: int = 6 * 3600
+    response_cache_max_entries: int = 2000
 
     vehicle_positions_staleness_s: int = 60
     trip_updates_staleness_s: int = 90
 
+    agency_timezone: str = "America/New_York"
+    gtfs_version_check_s: int = 60
+    schedule_fallback_enabled: bool = True
+
+    stop_grid_cell_m: int = 250
+    route_shape_max_age_s: int = 86400
+
+    journey_max_transfers: int = 3
+    journey_max_walk_m: int = 400
+    journey_walk_speed_mps: float = 1.3
+
     @property
     def allow_origins_list(self) -> List[str]:
         s = (self.cors_allow_origins or "").strip()
@@ -10,6 +10,9 @@ from sqlalchemy.pool import QueuePool
 from src.app.core.config import settings
 
 
+if not settings.database_url:
+    raise RuntimeError("Missing required env var: DATABASE_URL")
+
 engine = create_engine(
     settings.database_url,
     echo=settings.sql_echo,
@@ -0,0 +1,21 @@
+"""gunicorn -c src/app/gunicorn_conf.py src.app.main:app
+
+Loads the embedding model and indexes once in the master, then forks workers that share those
+pages copy-on-write instead of each loading its own copy.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+
+# Read by src.app.core.config when the master imports the app below.
+os.environ.setdefault("PRELOAD_MODELS", "true")
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(4, multiprocessing.cpu_count()))))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Workers still warm up (first inference) after fork; give them time before the first health check.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import contextlib
 
 from src.app.api.router import api_router_v1
@@ -9,6 +10,12 @@ from starlette.datastructures import State
 
 from src.app.core.config import settings
 from src.app.db import redis_client as redis_db
+from src.app.services import gtfs_static, index_store, semantic_search, warmup
+from src.app.services.llm_client import llm_client
+
+if settings.preload_models:
+    # Under gunicorn --preload this import runs once in the master, before workers fork.
+    warmup.preload()
 
 class App(FastAPI):
     state: State
@@ -18,9 +25,19 @@ async def lifespan(app: App):
     state: State = app.state
     if getattr(state, "redis", None) is None:
         state.redis = await redis_db.connect(settings.redis_url)
+    state.gtfs_refresher = asyncio.create_task(gtfs_static.run_refresher())
+    state.index_watcher = asyncio.create_task(index_store.run_watcher())
+    # Runs alongside serving so liveness answers at once; readiness waits for it.
+    state.warmup = asyncio.create_task(warmup.run_warmup())
     try:
         yield
     finally:
+        for task in (state.warmup, state.gtfs_refresher, state.index_watcher):
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        await llm_client.aclose()
+        await semantic_search.embedding_batcher.aclose()
         await redis_db.close(getattr(state, "redis", None))
 
 app = App(
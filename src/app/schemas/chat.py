@@ -1,8 +1,24 @@
 from __future__ import annotations
 
+from typing import Optional, Union
+
 from pydantic import BaseModel, Field
 
+from src.app.schemas.chat_widgets import LLMWidgetConfig
+from src.app.schemas.transit import ActiveRoutesResponse, ArrivalsWidgetResponse
+
 
 class ChatRequest(BaseModel):
     message: str = Field(..., min_length=1)
+    lat: Optional[float] = Field(None, ge=-90, le=90)
+    lon: Optional[float] = Field(None, ge=-180, le=180)
+    # Return the widget's data with its config, saving the follow-up /widgets request.
+    include_widget_data: bool = False
+
 
+class ChatWidgetResponse(BaseModel):
+    config: LLMWidgetConfig
+    # Same payload as /widgets/arrivals or /widgets/active-routes; None for chat_message.
+    widget_data: Optional[Union[ArrivalsWidgetResponse, ActiveRoutesResponse]] = None
+    # True when the data was loaded while the model was still answering.
+    prefetched: bool = False
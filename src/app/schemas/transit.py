@@ -1,9 +1,11 @@
 # src/app/schemas/transit.py
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
+ArrivalSource = Literal["live", "predicted", "scheduled"]
+
 
 class ArrivalItem(BaseModel):
     trip_id: Optional[str] = None
@@ -13,6 +15,7 @@ class ArrivalItem(BaseModel):
     departure: Optional[int] = None
     delay_s: Optional[int] = None
     eta_seconds: Optional[int] = None
+    source: ArrivalSource = "live"
 
 
 class ArrivalsResponse(BaseModel):
@@ -22,6 +25,19 @@ class ArrivalsResponse(BaseModel):
     stale: bool = False
 
 
+class VehicleProgress(BaseModel):
+    shape_id: Optional[str] = None
+    on_route: bool = False
+    offset_m: Optional[float] = None
+    dist_along_m: Optional[float] = None
+    shape_length_m: Optional[float] = None
+    progress: Optional[float] = None
+    next_stop_id: Optional[str] = None
+    next_stop_sequence: Optional[int] = None
+    next_stop_dist_m: Optional[float] = None
+    headsign: Optional[str] = None
+
+
 class Vehicle(BaseModel):
     vehicle_id: str
     trip_id: Optional[str] = None
@@ -33,6 +49,7 @@ class Vehicle(BaseModel):
     label: Optional[str] = None
     updated_at: Optional[int] = None
     ingested_at_ms: Optional[int] = None
+    progress: Optional[VehicleProgress] = None
 
 
 class VehiclesResponse(BaseModel):
@@ -52,6 +69,7 @@ class WidgetArrival(BaseModel):
     route_long_name: str
     route_color: str
     to: str = "TBD"
+    source: ArrivalSource = "live"
 
 
 class WidgetStop(BaseModel):
@@ -76,3 +94,46 @@ class ActiveRoute(BaseModel):
 class ActiveRoutesResponse(BaseModel):
     as_of: int
     routes: List[ActiveRoute]
+
+
+class JourneyLeg(BaseModel):
+    mode: Literal["bus", "walk"]
+    from_stop_id: str
+    from_stop_name: str
+    to_stop_id: str
+    to_stop_name: str
+    departure: int
+    arrival: int
+    route_id: Optional[str] = None
+    route_name: Optional[str] = None
+    route_color: Optional[str] = None
+    trip_id: Optional[str] = None
+    headsign: Optional[str] = None
+    num_stops: int = 0
+
+
+class JourneyResponse(BaseModel):
+    origin: str
+    destination: str
+    as_of: int
+    departure: int
+    arrival: int
+    duration_s: int
+    transfers: int
+    legs: List[JourneyLeg]
+    realtime: bool = False
+
+
+class NearestStop(BaseModel):
+    stop_id: str
+    stop_name: str
+    lat: float
+    lon: float
+    distance_m: float
+
+
+class NearestStopsResponse(BaseModel):
+    lat: float
+    lon: float
+    as_of: int
+    stops: List[NearestStop]
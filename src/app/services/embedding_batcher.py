@@ -0,0 +1,148 @@
+# src/app/services/embedding_batcher.py
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.app.utils.stats import percentile
+
+_BATCH_SAMPLES = 512
+
+# Texts -> normalized (n, dim) float32 embeddings, called on the batcher's thread.
+Encoder = Callable[[Sequence[str]], np.ndarray]
+
+
+class EmbeddingBatcher:
+    """Encodes concurrent queries together on one dedicated thread.
+
+    The first waiting query opens a batch; queries already queued (they arrived while the previous
+    batch was encoding) or arriving within ``max_wait_ms`` join it, up to ``max_batch``. The wait
+    only applies while traffic is concurrent, so a lone query never pays for it. The model
+    releases the GIL inside its matrix kernels, so the event loop keeps serving while a batch runs.
+    """
+
+    def __init__(self, encode: Encoder, max_batch: int, max_wait_ms: float) -> None:
+        self._encode = encode
+        self._max_batch = max(1, max_batch)
+        self._max_wait_s = max(0.0, max_wait_ms) / 1000
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue[Tuple[str, asyncio.Future[np.ndarray]]]] = None
+        self._worker: Optional[asyncio.Task[None]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._last_batch = 0
+        self._batch_sizes: Deque[int] = deque(maxlen=_BATCH_SAMPLES)
+        self._encode_ms: Deque[float] = deque(maxlen=_BATCH_SAMPLES)
+        self._counters: Dict[str, int] = {"queries": 0, "batches": 0, "deduplicated": 0, "errors": 0}
+
+    def _ensure_worker(self) -> asyncio.Queue[Tuple[str, asyncio.Future[np.ndarray]]]:
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run(self._queue))
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        assert self._queue is not None
+        return self._queue
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Normalized (1, dim) float32 embedding, encoded in a batch with concurrent callers."""
+        queue = self._ensure_worker()
+        future: asyncio.Future[np.ndarray] = asyncio.get_running_loop().create_future()
+        queue.put_nowait((text, future))
+        self._counters["queries"] += 1
+        return await future
+
+    async def _collect(
+        self, queue: asyncio.Queue[Tuple[str, asyncio.Future[np.ndarray]]]
+    ) -> List[Tuple[str, asyncio.Future[np.ndarray]]]:
+        batch = [await queue.get()]
+        wait_s = self._max_wait_s if self._last_batch > 1 else 0.0
+        deadline = time.monotonic() + wait_s
+        while len(batch) < self._max_batch:
+            if not queue.empty():
+                batch.append(queue.get_nowait())
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self, queue: asyncio.Queue[Tuple[str, asyncio.Future[np.ndarray]]]) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [(text, future) for text, future in await self._collect(queue) if not future.done()]
+            if not batch:
+                continue
+            # Identical queries in one batch (a popular stop at rush hour) are encoded once.
+            texts = list(dict.fromkeys(text for text, _ in batch))
+            self._counters["deduplicated"] += len(batch) - len(texts)
+            started = time.perf_counter()
+            try:
+                vectors = await loop.run_in_executor(self._executor, self._encode, texts)
+            except Exception as exc:
+                if len(texts) == 1:
+                    self._fail(batch, texts[0], exc)
+                    continue
+                # Retry one by one so a single bad input only fails its own callers.
+                for text in texts:
+                    try:
+                        vector = await loop.run_in_executor(self._executor, self._encode, [text])
+                    except Exception as text_exc:
+                        self._fail(batch, text, text_exc)
+                    else:
+                        self._resolve(batch, text, vector)
+                continue
+            self._encode_ms.append((time.perf_counter() - started) * 1000)
+            self._batch_sizes.append(len(texts))
+            self._last_batch = len(batch)
+            self._counters["batches"] += 1
+            for row, text in enumerate(texts):
+                self._resolve(batch, text, vectors[row : row + 1])
+
+    def _resolve(self, batch: List[Tuple[str, asyncio.Future[np.ndarray]]], text: str, vector: np.ndarray) -> None:
+        for queued, future in batch:
+            if queued == text and not future.done():
+                future.set_result(vector)
+
+    def _fail(self, batch: List[Tuple[str, asyncio.Future[np.ndarray]]], text: str, exc: Exception) -> None:
+        self._counters["errors"] += 1
+        for queued, future in batch:
+            if queued == text and not future.done():
+                future.set_exception(exc)
+
+    async def aclose(self) -> None:
+        worker, self._worker = self._worker, None
+        if worker is not None and not worker.done():
+            worker.cancel()
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def metrics(self) -> Dict[str, Any]:
+        sizes = list(self._batch_sizes)
+        encode_ms = list(self._encode_ms)
+        return {
+            **self._counters,
+            "max_batch": self._max_batch,
+            "max_wait_ms": self._max_wait_s * 1000,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batch_size_mean": round(sum(sizes) / len(sizes), 2) if sizes else 0.0,
+            "batch_size_max": max(sizes, default=0),
+            "encode_ms_p50": round(percentile(encode_ms, 0.5), 1),
+            "encode_ms_p95": round(percentile(encode_ms, 0.95), 1),
+        }
+
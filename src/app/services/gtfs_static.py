@@ -0,0 +1,366 @@
+# src/app/services/gtfs_static.py
+from __future__ import annotations
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+from zoneinfo import ZoneInfo
+
+import anyio
+import numpy as np
+from sqlalchemy import text
+
+from src.app.core.config import settings
+from src.app.db.session import get_session
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+UNVERSIONED = "unversioned"
+_WEEKDAY_COLUMNS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+
+
+@dataclass(frozen=True)
+class StaticFeed:
+    """Array-backed snapshot of the static GTFS tables for one feed version."""
+
+    version: str
+
+    stop_ids: List[str]
+    stop_index: Dict[str, int]
+    stop_names: List[str]
+    stop_lat: np.ndarray
+    stop_lon: np.ndarray
+
+    route_ids: List[str]
+    route_index: Dict[str, int]
+    routes: List[Dict[str, str]]
+
+    trip_ids: List[str]
+    trip_index: Dict[str, int]
+    trip_route: np.ndarray
+    trip_service: np.ndarray
+    trip_direction: np.ndarray
+    trip_headsigns: List[str]
+    trip_shape_ids: List[Optional[str]]
+
+    service_ids: List[str]
+    # service idx -> (weekday flags, start date, end date)
+    calendar: Dict[int, Tuple[Tuple[bool, ...], date, date]]
+    # date -> {service idx: exception_type}
+    calendar_dates: Dict[date, Dict[int, int]]
+
+    # stop_times, sorted by (trip, stop_sequence); times are seconds after service-day start
+    st_trip: np.ndarray
+    st_stop: np.ndarray
+    st_sequence: np.ndarray
+    st_arrival: np.ndarray
+    st_departure: np.ndarray
+
+    _derived: Dict[str, Any] = field(default_factory=dict, compare=False, repr=False)
+
+    def derived(self, key: str, builder: Callable[["StaticFeed"], T]) -> T:
+        """Memoize a structure computed from this snapshot; it dies with the snapshot."""
+        value = self._derived.get(key)
+        if value is None:
+            value = builder(self)
+            self._derived[key] = value
+        return value
+
+    def trip_destination(self, trip: int) -> str:
+        """Headsign of a trip, falling back to the name of its last stop."""
+        if self.trip_headsigns[trip]:
+            return self.trip_headsigns[trip]
+        last_stops = self.derived("trip_last_stop", _trip_last_stops)
+        stop = int(last_stops[trip])
+        return self.stop_names[stop] if stop >= 0 else ""
+
+    def active_services(self, day: date) -> np.ndarray:
+        """Boolean mask over service indices running on the given service day."""
+        cache_key = f"services:{day.isoformat()}"
+        mask = self._derived.get(cache_key)
+        if mask is not None:
+            return mask
+
+        mask = np.zeros(len(self.service_ids), dtype=bool)
+        weekday = day.weekday()
+        for svc, (flags, start, end) in self.calendar.items():
+            if start <= day <= end and flags[weekday]:
+                mask[svc] = True
+        for svc, exception_type in self.calendar_dates.get(day, {}).items():
+            mask[svc] = exception_type == 1
+
+        self._derived[cache_key] = mask
+        return mask
+
+
+def _trip_last_stops(feed: StaticFeed) -> np.ndarray:
+    last = np.full(len(feed.trip_ids), -1, dtype=np.int32)
+    if len(feed.st_trip):
+        # stop_times are sorted by (trip, sequence); a trip's last row precedes the next trip.
+        ends = np.concatenate((np.flatnonzero(np.diff(feed.st_trip)), [len(feed.st_trip) - 1]))
+        last[feed.st_trip[ends]] = feed.st_stop[ends]
+    return last
+
+
+# ---------------------------------------------------------------------------
+# Helpers: parsing
+# ---------------------------------------------------------------------------
+
+def parse_gtfs_time(value: Any) -> int | None:
+    """Convert an HH:MM:SS GTFS time (hours may exceed 24) to seconds."""
+    if value is None:
+        return None
+    if isinstance(value, int):
+        return value
+    raw = str(value).strip()
+    if not raw:
+        return None
+    try:
+        hours, minutes, seconds = (int(part) for part in raw.split(":"))
+    except ValueError:
+        return None
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _parse_date(value: Any) -> date | None:
+    if value is None:
+        return None
+    if isinstance(value, date):
+        return value
+    raw = str(value).strip()
+    try:
+        return datetime.strptime(raw, "%Y%m%d").date()
+    except ValueError:
+        return None
+
+
+def _coerce_float(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _coerce_int(value: Any, default: int = -1) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def _str_or_none(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    s = str(value).strip()
+    return s or None
+
+
+def agency_tz() -> ZoneInfo:
+    return ZoneInfo(settings.agency_timezone)
+
+
+def service_day_start(day: date) -> int:
+    """Epoch seconds of GTFS time 00:00:00 for a service day ("noon minus 12h")."""
+    noon = datetime(day.year, day.month, day.day, 12, tzinfo=agency_tz())
+    return int((noon - timedelta(hours=12)).timestamp())
+
+
+# ---------------------------------------------------------------------------
+# Helpers: database lookups
+# ---------------------------------------------------------------------------
+
+def _fetch_rows(sql: str, optional: bool = False) -> List[Dict[str, Any]]:
+    try:
+        with get_session() as db:
+            return [dict(row) for row in db.execute(text(sql)).mappings().all()]
+    except Exception:
+        if optional:
+            return []
+        raise
+
+
+def _fetch_version() -> str:
+    schema = settings.gtfs_schema
+    rows = _fetch_rows(
+        f"SELECT version FROM {schema}.feed_version ORDER BY loaded_at DESC LIMIT 1",
+        optional=True,
+    )
+    if not rows:
+        return UNVERSIONED
+    return str(rows[0]["version"])
+
+
+def _load_feed(version: str) -> StaticFeed:
+    schema = settings.gtfs_schema
+
+    stop_rows = _fetch_rows(f"SELECT stop_id, stop_name, stop_lat, stop_lon FROM {schema}.stops")
+    stop_ids = [str(row["stop_id"]) for row in stop_rows]
+    stop_index = {stop_id: i for i, stop_id in enumerate(stop_ids)}
+
+    route_rows = _fetch_rows(f"SELECT * FROM {schema}.routes")
+    route_ids = [str(row["route_id"]) for row in route_rows]
+    routes = [
+        {
+            "route_id": str(row["route_id"]),
+            "short_name": _str_or_none(row.get("route_short_name")) or "",
+            "long_name": _str_or_none(row.get("route_long_name")) or "",
+            "color": _str_or_none(row.get("route_color")) or "",
+        }
+        for row in route_rows
+    ]
+    route_index = {route_id: i for i, route_id in enumerate(route_ids)}
+
+    trip_rows = _fetch_rows(f"SELECT * FROM {schema}.trips")
+    service_index: Dict[str, int] = {}
+    for row in trip_rows:
+        service_index.setdefault(str(row["service_id"]), len(service_index))
+
+    calendar_rows = _fetch_rows(f"SELECT * FROM {schema}.calendar", optional=True)
+    calendar_date_rows = _fetch_rows(f"SELECT * FROM {schema}.calendar_dates", optional=True)
+    for row in calendar_rows + calendar_date_rows:
+        service_index.setdefault(str(row["service_id"]), len(service_index))
+    service_ids = list(service_index)
+
+    trip_ids = [str(row["trip_id"]) for row in trip_rows]
+    trip_index = {trip_id: i for i, trip_id in enumerate(trip_ids)}
+
+    calendar: Dict[int, Tuple[Tuple[bool, ...], date, date]] = {}
+    for row in calendar_rows:
+        start, end = _parse_date(row.get("start_date")), _parse_date(row.get("end_date"))
+        if start is None or end is None:
+            continue
+        flags = tuple(str(row.get(col) or "0").strip() == "1" for col in _WEEKDAY_COLUMNS)
+        calendar[service_index[str(row["service_id"])]] = (flags, start, end)
+
+    calendar_dates: Dict[date, Dict[int, int]] = {}
+    for row in calendar_date_rows:
+        day = _parse_date(row.get("date"))
+        if day is None:
+            continue
+        exception_type = _coerce_int(row.get("exception_type"), 0)
+        calendar_dates.setdefault(day, {})[service_index[str(row["service_id"])]] = exception_type
+
+    st_rows = _fetch_rows(
+        f"SELECT trip_id, stop_id, stop_sequence, arrival_time, departure_time FROM {schema}.stop_times"
+    )
+    st_trip: List[int] = []
+    st_stop: List[int] = []
+    st_sequence: List[int] = []
+    st_arrival: List[int] = []
+    st_departure: List[int] = []
+    for row in st_rows:
+        trip = trip_index.get(str(row["trip_id"]))
+        stop = stop_index.get(str(row["stop_id"]))
+        if trip is None or stop is None:
+            continue
+        arrival = parse_gtfs_time(row.get("arrival_time"))
+        departure = parse_gtfs_time(row.get("departure_time"))
+        if arrival is None and departure is None:
+            continue
+        st_trip.append(trip)
+        st_stop.append(stop)
+        st_sequence.append(_coerce_int(row.get("stop_sequence"), 0))
+        st_arrival.append(arrival if arrival is not None else departure)
+        st_departure.append(departure if departure is not None else arrival)
+
+    st_trip_arr = np.asarray(st_trip, dtype=np.int32)
+    st_sequence_arr = np.asarray(st_sequence, dtype=np.int32)
+    order = np.lexsort((st_sequence_arr, st_trip_arr))
+
+    return StaticFeed(
+        version=version,
+        stop_ids=stop_ids,
+        stop_index=stop_index,
+        stop_names=[str(row["stop_name"] or row["stop_id"]) for row in stop_rows],
+        stop_lat=np.asarray([_coerce_float(row["stop_lat"]) for row in stop_rows], dtype=np.float64),
+        stop_lon=np.asarray([_coerce_float(row["stop_lon"]) for row in stop_rows], dtype=np.float64),
+        route_ids=route_ids,
+        route_index=route_index,
+        routes=routes,
+        trip_ids=trip_ids,
+        trip_index=trip_index,
+        trip_route=np.asarray(
+            [route_index.get(str(row["route_id"]), -1) for row in trip_rows], dtype=np.int32
+        ),
+        trip_service=np.asarray(
+            [service_index[str(row["service_id"])] for row in trip_rows], dtype=np.int32
+        ),
+        trip_direction=np.asarray(
+            [_coerce_int(row.get("direction_id")) for row in trip_rows], dtype=np.int8
+        ),
+        trip_headsigns=[_str_or_none(row.get("trip_headsign")) or "" for row in trip_rows],
+        trip_shape_ids=[_str_or_none(row.get("shape_id")) for row in trip_rows],
+        service_ids=service_ids,
+        calendar=calendar,
+        calendar_dates=calendar_dates,
+        st_trip=st_trip_arr[order],
+        st_stop=np.asarray(st_stop, dtype=np.int32)[order],
+        st_sequence=st_sequence_arr[order],
+        st_arrival=np.asarray(st_arrival, dtype=np.int32)[order],
+        st_departure=np.asarray(st_departure, dtype=np.int32)[order],
+    )
+
+
+# ---------------------------------------------------------------------------
+# Public service functions
+# ---------------------------------------------------------------------------
+
+_feed: Optional[StaticFeed] = None
+_refresh_lock = asyncio.Lock()
+_warm_builders: Dict[str, Callable[[StaticFeed], Any]] = {}
+
+
+def warm_on_load(key: str, builder: Callable[[StaticFeed], Any]) -> None:
+    """Build a derived structure for every new snapshot before it is published."""
+    _warm_builders[key] = builder
+
+
+def _load_and_warm(version: str) -> StaticFeed:
+    feed = _load_feed(version)
+    for _ in range(2):
+        # The loader swaps a whole new schema in at once, but our tables are read one query at a
+        # time; if a swap landed in between, read them all again from the new version.
+        latest = _fetch_version()
+        if latest == feed.version:
+            break
+        logger.info("GTFS version changed to %s while loading %s; reloading", latest, feed.version)
+        feed = _load_feed(latest)
+    for key, builder in _warm_builders.items():
+        feed.derived(key, builder)
+    return feed
+
+
+def load_feed() -> StaticFeed:
+    """Synchronously load the published GTFS version; meant for scripts and benchmarks."""
+    return _load_feed(_fetch_version())
+
+
+def current_feed() -> Optional[StaticFeed]:
+    """Return the loaded snapshot without blocking; None until the first load finishes."""
+    return _feed
+
+
+async def refresh_feed(force: bool = False) -> Optional[StaticFeed]:
+    """Reload the snapshot when Postgres advertises a different GTFS version."""
+    global _feed
+    async with _refresh_lock:
+        try:
+            version = await anyio.to_thread.run_sync(_fetch_version)
+            if force or _feed is None or _feed.version != version:
+                feed = await anyio.to_thread.run_sync(_load_and_warm, version)
+                _feed = feed
+                logger.info("Loaded static GTFS version %s (%d stop_times)", feed.version, len(feed.st_trip))
+        except Exception:
+            logger.exception("Static GTFS refresh failed")
+        return _feed
+
+
+async def run_refresher(interval_s: Optional[int] = None) -> None:
+    """Background loop keeping the snapshot in sync with the loaded GTFS version."""
+    interval = interval_s or settings.gtfs_version_check_s
+    while True:
+        await refresh_feed()
+        await asyncio.sleep(interval)
@@ -0,0 +1,138 @@
+# src/app/services/index_store.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+import anyio
+import faiss
+
+from src.app.core.config import settings
+from src.app.utils.index_manifest import read_manifest
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+# Version reported for indexes written before builders published manifests.
+LEGACY_VERSION = "legacy"
+# Vectors stay in the page cache, shared by every worker on the host, instead of being copied
+# into each process. Older faiss builds only map inverted lists.
+_MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def _tune(index: faiss.Index) -> faiss.Index:
+    """Apply search-time parameters to IVF / HNSW indexes; Flat has none and is left alone."""
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", settings.faiss_nprobe), ("efSearch", settings.faiss_ef_search)):
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass
+    return index
+
+
+def selector_params(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Search parameters that restrict ``index`` to ``selector`` and keep its tuned nprobe/efSearch.
+
+    IVF indexes reject plain SearchParameters, and the typed ones would otherwise reset the knobs
+    _tune() set. The caller must keep ``selector`` referenced until the search returns.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def read_index_mmap(path: Path) -> faiss.Index:
+    if not path.exists():
+        raise FileNotFoundError(f"Index missing at {path}")
+    return _tune(faiss.read_index(str(path), _MMAP_FLAGS))
+
+
+class IndexStore(Generic[T]):
+    """The current version of one manifest-published index, swapped in whole when a new one appears.
+
+    ``loader(index_dir, manifest)`` builds the in-memory snapshot (manifest is None for legacy
+    files). Readers take one snapshot reference per request, so a swap never blocks them and never
+    mixes two versions within a request.
+    """
+
+    def __init__(self, name: str, loader: Callable[[Path, Optional[Dict[str, Any]]], T]) -> None:
+        self.name = name
+        self._loader = loader
+        self._current: Optional[Tuple[str, T]] = None
+        self._first_load = threading.Lock()
+        self._failed_version: Optional[str] = None
+        self._stats: Dict[str, Any] = {"reloads": 0, "failures": 0, "loaded_at": None}
+        _stores.append(self)
+
+    def _published(self) -> Tuple[str, Optional[Dict[str, Any]]]:
+        manifest = read_manifest(settings.index_dir, self.name)
+        return (str(manifest["version"]) if manifest else LEGACY_VERSION), manifest
+
+    def _load(self, version: str, manifest: Optional[Dict[str, Any]]) -> Tuple[str, T]:
+        started = time.perf_counter()
+        snapshot = self._loader(settings.index_dir, manifest)
+        self._stats["loaded_at"] = int(time.time())
+        logger.info("Loaded %s index %s in %.0f ms", self.name, version, (time.perf_counter() - started) * 1000)
+        return version, snapshot
+
+    def get(self) -> T:
+        current = self._current
+        if current is None:
+            with self._first_load:
+                if self._current is None:
+                    self._current = self._load(*self._published())
+                current = self._current
+        return current[1]
+
+    @property
+    def version(self) -> Optional[str]:
+        current = self._current
+        return current[0] if current is not None else None
+
+    def reload_if_changed(self) -> bool:
+        """Load a newly published version and swap it in; blocking, so call it off the event loop."""
+        current = self._current
+        if current is None:
+            # Nothing served yet; the first request loads whatever is published then.
+            return False
+        version, manifest = self._published()
+        if version == current[0] or version == self._failed_version:
+            return False
+        try:
+            self._current = self._load(version, manifest)
+        except Exception:
+            # Keep serving the old version; retry only once a newer one is published.
+            self._failed_version = version
+            self._stats["failures"] += 1
+            logger.exception("Loading %s index %s failed; still serving %s", self.name, version, current[0])
+            return False
+        self._failed_version = None
+        self._stats["reloads"] += 1
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"version": self.version, **self._stats}
+
+
+_stores: List[IndexStore[Any]] = []
+
+
+async def run_watcher(interval_s: Optional[int] = None) -> None:
+    """Background loop swapping in index versions as builders publish them."""
+    interval = interval_s or settings.index_check_s
+    while True:
+        for store in list(_stores):
+            await anyio.to_thread.run_sync(store.reload_if_changed)
+        await asyncio.sleep(interval)
+
+
+def metrics() -> Dict[str, Dict[str, Any]]:
+    return {store.name: store.metrics() for store in _stores}
@@ -0,0 +1,119 @@
+# src/app/services/intent_router.py
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+from src.app.core.config import settings
+from src.app.schemas.chat_widgets import ActiveRoutesConfig, BusArrivalsConfig, LLMWidgetConfig
+
+INTENT_ARRIVALS = "bus_arrivals"
+INTENT_ACTIVE_ROUTES = "active_routes"
+
+# (pattern, weight): the strongest matching pattern sets the text confidence of an intent.
+_ARRIVAL_PATTERNS: List[Tuple[re.Pattern[str], float]] = [
+    (re.compile(r"\bnext (bus|buses|shuttle|one|ride)\b"), 1.0),
+    (re.compile(r"\b(arrivals?|eta|etas)\b"), 0.95),
+    (re.compile(r"\bwhen('s| is| does| will)\b.*\b(bus|shuttle|come|coming|arrive|arriving|get here|leave|leaving)\b"), 0.9),
+    (re.compile(r"\bhow (long|soon)\b.*\b(bus|shuttle|until|till|wait)\b"), 0.9),
+    (re.compile(r"\b(bus|buses|shuttle)\b.*\b(coming|arriving|due)\b"), 0.85),
+    (re.compile(r"\bany (bus|buses|shuttles)\b.*\b(at|to|near|from)\b"), 0.8),
+    (re.compile(r"\bbus(es)? times?\b"), 0.85),
+    (re.compile(r"\bwhat('s| is) coming\b"), 0.85),
+]
+_ACTIVE_PATTERNS: List[Tuple[re.Pattern[str], float]] = [
+    (re.compile(r"\bactive (routes|buses|lines)\b"), 1.0),
+    (re.compile(r"\b(what|which) (buses|routes|lines|bus routes)\b.*\b(running|operating|active|out|in service|available)\b"), 1.0),
+    (re.compile(r"\b(what|which)('s| is| are)\b.*\b(running|operating|in service)\b"), 0.85),
+    (re.compile(r"\b(are|is) (the )?(buses|routes) (running|operating)\b"), 0.85),
+]
+# Questions the widgets cannot answer: trip planning, other days, complaints, lost items.
+_VETO_PATTERNS: List[re.Pattern[str]] = [
+    re.compile(r"\bfrom\b.+\bto\b"),
+    re.compile(r"\bhow (do|can|should) i get\b"),
+    # A destination rather than the stop to watch: "next bus to busch", "leave college ave for cook".
+    re.compile(r"\b(bus|shuttle|one) to\b"),
+    re.compile(r"\b(leave|leaves|leaving|go|goes|going|head|heading)\b.*\b(for|to)\b"),
+    re.compile(r"\brunning late\b"),
+    re.compile(r"\b(directions?|transfer|tomorrow|yesterday|weekend|sunday|saturday|holiday|tonight at|last night)\b"),
+    re.compile(r"\b(why|complain|complaint|lost|refund|late again|rude)\b"),
+]
+
+# Semantic similarity below FLOOR gives no confidence in the stop; at or above CEILING, full confidence.
+_STOP_SCORE_FLOOR = 0.35
+_STOP_SCORE_CEILING = 0.6
+# Stops scoring within this margin of the best one are shown together.
+_STOP_SCORE_MARGIN = 0.05
+_MAX_FAST_STOPS = 3
+# Confidence in "the user means the stops they are standing next to" when no stop is named.
+_NEARBY_STOP_CONFIDENCE = 0.9
+
+
+@dataclass(frozen=True)
+class FastRoute:
+    config: LLMWidgetConfig
+    intent: str
+    confidence: float
+
+
+def _normalize(message: str) -> str:
+    return re.sub(r"\s+", " ", message.lower().replace("’", "'")).strip()
+
+
+def _text_confidence(text: str, patterns: Sequence[Tuple[re.Pattern[str], float]]) -> float:
+    return max((weight for pattern, weight in patterns if pattern.search(text)), default=0.0)
+
+
+def classify_intent(message: str) -> Tuple[Optional[str], float]:
+    """Widget intent of a message from its wording alone, with a 0..1 confidence."""
+    text = _normalize(message)
+    if not text or any(pattern.search(text) for pattern in _VETO_PATTERNS):
+        return None, 0.0
+    arrivals = _text_confidence(text, _ARRIVAL_PATTERNS)
+    active = _text_confidence(text, _ACTIVE_PATTERNS)
+    if arrivals == active:
+        return None, 0.0
+    if arrivals > active:
+        return INTENT_ARRIVALS, arrivals - active
+    return INTENT_ACTIVE_ROUTES, active - arrivals
+
+
+def _stop_confidence(score: float) -> float:
+    span = _STOP_SCORE_CEILING - _STOP_SCORE_FLOOR
+    return min(1.0, max(0.0, (score - _STOP_SCORE_FLOOR) / span))
+
+
+def fast_route(
+    message: str,
+    stop_hits: Sequence[Tuple[str, float]],
+    nearby_stop_ids: Sequence[str] = (),
+    threshold: Optional[float] = None,
+) -> Optional[FastRoute]:
+    """Widget config for common requests without an LLM call, or None to fall through.
+
+    ``stop_hits`` are (stop_id, similarity) from the semantic hits already resolved for the
+    message, best first; ``nearby_stop_ids`` are the stops closest to the user's location.
+    """
+    threshold = settings.intent_fast_path_threshold if threshold is None else threshold
+    intent, confidence = classify_intent(message)
+    if intent is None:
+        return None
+
+    if intent == INTENT_ACTIVE_ROUTES:
+        if confidence < threshold:
+            return None
+        return FastRoute(ActiveRoutesConfig(), intent, confidence)
+
+    best = stop_hits[0][1] if stop_hits else 0.0
+    named = _stop_confidence(best)
+    if named == 0.0 and nearby_stop_ids:
+        stop_ids = list(nearby_stop_ids[:1])
+        confidence *= _NEARBY_STOP_CONFIDENCE
+    else:
+        stop_ids = [stop_id for stop_id, score in stop_hits if score >= best - _STOP_SCORE_MARGIN]
+        stop_ids = stop_ids[:_MAX_FAST_STOPS]
+        confidence *= named
+    if not stop_ids or confidence < threshold:
+        return None
+    return FastRoute(BusArrivalsConfig(stopIds=stop_ids), intent, confidence)
@@ -0,0 +1,422 @@
+# src/app/services/journey_planner.py
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import anyio
+import numpy as np
+import redis.asyncio as redis
+
+from src.app.core.config import settings
+from src.app.schemas.transit import JourneyLeg, JourneyResponse
+from src.app.services import gtfs_static, semantic_search, transit_cache
+from src.app.services.gtfs_static import StaticFeed, agency_tz, service_day_start
+from src.app.services.stop_index import get_stop_grid
+
+_RAPTOR_KEY = "raptor"
+_INF = np.iinfo(np.int64).max
+
+
+@dataclass(frozen=True)
+class Pattern:
+    """Trips of one route that visit exactly the same stop sequence."""
+
+    route: int
+    stops: np.ndarray
+    # Rows are trips ordered by departure from the first stop.
+    trips: np.ndarray
+    services: np.ndarray
+    arrivals: np.ndarray
+    departures: np.ndarray
+
+
+@dataclass(frozen=True)
+class RaptorData:
+    patterns: List[Pattern]
+    # stop idx -> [(pattern idx, position in pattern)]
+    stop_patterns: List[List[Tuple[int, int]]]
+    # stop idx -> [(stop idx, walk seconds)]
+    transfers: List[List[Tuple[int, int]]]
+    max_departure: int
+
+
+@dataclass(frozen=True)
+class Leg:
+    mode: str
+    from_stop: int
+    to_stop: int
+    departure: int
+    arrival: int
+    route: int = -1
+    trip: int = -1
+    num_stops: int = 0
+
+
+@dataclass(frozen=True)
+class Journey:
+    departure: int
+    arrival: int
+    legs: List[Leg]
+
+    @property
+    def transfers(self) -> int:
+        return max(0, sum(1 for leg in self.legs if leg.mode == "bus") - 1)
+
+
+# ---------------------------------------------------------------------------
+# Helpers: building
+# ---------------------------------------------------------------------------
+
+def _build_transfers(feed: StaticFeed) -> List[List[Tuple[int, int]]]:
+    grid = get_stop_grid(feed)
+    speed = settings.journey_walk_speed_mps
+    transfers: List[List[Tuple[int, int]]] = [[] for _ in feed.stop_ids]
+    for stop in range(len(feed.stop_ids)):
+        lat, lon = feed.stop_lat[stop], feed.stop_lon[stop]
+        if np.isnan(lat) or np.isnan(lon):
+            continue
+        for hit in grid.within(float(lat), float(lon), settings.journey_max_walk_m):
+            if hit.stop != stop:
+                transfers[stop].append((hit.stop, int(hit.distance_m / speed)))
+    return transfers
+
+
+def build_raptor_data(feed: StaticFeed) -> RaptorData:
+    boundaries = np.flatnonzero(np.diff(feed.st_trip)) + 1
+    starts = np.concatenate(([0], boundaries)) if len(feed.st_trip) else np.array([], dtype=np.int64)
+    ends = np.concatenate((boundaries, [len(feed.st_trip)])) if len(feed.st_trip) else starts
+
+    grouped: Dict[Tuple[int, Tuple[int, ...]], List[Tuple[int, np.ndarray, np.ndarray]]] = {}
+    for start, end in zip(starts, ends):
+        trip = int(feed.st_trip[start])
+        stops = tuple(int(s) for s in feed.st_stop[start:end])
+        key = (int(feed.trip_route[trip]), stops)
+        grouped.setdefault(key, []).append(
+            (trip, feed.st_arrival[start:end], feed.st_departure[start:end])
+        )
+
+    patterns: List[Pattern] = []
+    stop_patterns: List[List[Tuple[int, int]]] = [[] for _ in feed.stop_ids]
+    for (route, stops), trips in grouped.items():
+        trips.sort(key=lambda item: int(item[2][0]))
+        trip_idx = np.asarray([t for t, _, _ in trips], dtype=np.int32)
+        pattern_idx = len(patterns)
+        patterns.append(
+            Pattern(
+                route=route,
+                stops=np.asarray(stops, dtype=np.int32),
+                trips=trip_idx,
+                services=feed.trip_service[trip_idx],
+                arrivals=np.vstack([arr for _, arr, _ in trips]).astype(np.int64),
+                departures=np.vstack([dep for _, _, dep in trips]).astype(np.int64),
+            )
+        )
+        for pos, stop in enumerate(stops):
+            stop_patterns[stop].append((pattern_idx, pos))
+
+    max_departure = int(feed.st_departure.max()) if len(feed.st_departure) else 0
+    return RaptorData(
+        patterns=patterns,
+        stop_patterns=stop_patterns,
+        transfers=_build_transfers(feed),
+        max_departure=max_departure,
+    )
+
+
+def get_raptor_data(feed: StaticFeed) -> RaptorData:
+    return feed.derived(_RAPTOR_KEY, build_raptor_data)
+
+
+gtfs_static.warm_on_load(_RAPTOR_KEY, build_raptor_data)
+
+
+# ---------------------------------------------------------------------------
+# Helpers: routing
+# ---------------------------------------------------------------------------
+
+def _service_days(feed: StaticFeed, data: RaptorData, depart_at: int) -> List[Tuple[int, np.ndarray]]:
+    """Service days whose trips can still be running at or after depart_at."""
+    tz = agency_tz()
+    first = (datetime.fromtimestamp(depart_at - data.max_departure, tz) - timedelta(hours=12)).date()
+    last = datetime.fromtimestamp(depart_at, tz).date() + timedelta(days=1)
+    days: List[Tuple[int, np.ndarray]] = []
+    day = first
+    while day <= last:
+        active = feed.active_services(day)
+        if active.any():
+            days.append((service_day_start(day), active))
+        day += timedelta(days=1)
+    return days
+
+
+def _earliest_trip(
+    pattern: Pattern,
+    pos: int,
+    ready_at: int,
+    days: Sequence[Tuple[int, np.ndarray]],
+    delays: Dict[int, int],
+    max_delay: int,
+) -> Optional[Tuple[int, int, int]]:
+    """Return (row, day_start, delay) of the first trip departing pattern[pos] at or after ready_at."""
+    column = pattern.departures[:, pos]
+    best: Optional[Tuple[int, int, int]] = None
+    best_dep = _INF
+    for day_start, active in days:
+        row = int(np.searchsorted(column, ready_at - day_start - max_delay, side="left"))
+        while row < len(column):
+            scheduled = day_start + int(column[row])
+            if scheduled - max_delay > best_dep:
+                break
+            if active[pattern.services[row]]:
+                delay = delays.get(int(pattern.trips[row]), 0)
+                actual = scheduled + delay
+                if ready_at <= actual < best_dep:
+                    best, best_dep = (row, day_start, delay), actual
+            row += 1
+    return best
+
+
+def _reconstruct(
+    parents: List[Dict[int, tuple]],
+    labels: List[np.ndarray],
+    round_k: int,
+    dest: int,
+    origins: Iterable[int],
+) -> List[Leg]:
+    origin_set = set(origins)
+    legs: List[Leg] = []
+    stop, k = dest, round_k
+    while True:
+        while k > 0 and stop not in parents[k]:
+            k -= 1
+        parent = parents[k].get(stop)
+        if parent is None:
+            if stop in origin_set:
+                break
+            return []
+        if parent[0] == "walk":
+            _, from_stop, walk_s = parent
+            arrival = int(labels[k][stop])
+            legs.append(Leg("walk", from_stop, stop, arrival - walk_s, arrival))
+            stop = from_stop
+            continue
+        _, route, trip, from_stop, departure, arrival, num_stops = parent
+        legs.append(Leg("bus", from_stop, stop, departure, arrival, route, trip, num_stops))
+        stop, k = from_stop, k - 1
+    legs.reverse()
+    return legs
+
+
+# ---------------------------------------------------------------------------
+# Public service functions
+# ---------------------------------------------------------------------------
+
+def plan_journey(
+    feed: StaticFeed,
+    origins: Sequence[int],
+    destinations: Sequence[int],
+    depart_at: int,
+    max_transfers: Optional[int] = None,
+    delays: Optional[Dict[int, int]] = None,
+) -> Optional[Journey]:
+    """Earliest-arrival RAPTOR query between two sets of stop indices."""
+    if not origins or not destinations:
+        return None
+    data = get_raptor_data(feed)
+    delays = delays or {}
+    max_delay = max((abs(d) for d in delays.values()), default=0)
+    max_rounds = (settings.journey_max_transfers if max_transfers is None else max_transfers) + 1
+    days = _service_days(feed, data, depart_at)
+    dest_set = set(destinations)
+
+    n_stops = len(feed.stop_ids)
+    best = np.full(n_stops, _INF, dtype=np.int64)
+    labels: List[np.ndarray] = [np.full(n_stops, _INF, dtype=np.int64)]
+    parents: List[Dict[int, tuple]] = [{}]
+
+    marked = set()
+    for stop in origins:
+        labels[0][stop] = best[stop] = depart_at
+        marked.add(stop)
+    for stop in list(marked):
+        for other, walk_s in data.transfers[stop]:
+            arrival = depart_at + walk_s
+            if arrival < best[other]:
+                labels[0][other] = best[other] = arrival
+                parents[0][other] = ("walk", stop, walk_s)
+                marked.add(other)
+
+    def target_bound() -> int:
+        return min(int(best[d]) for d in dest_set)
+
+    for k in range(1, max_rounds + 1):
+        prev_labels = labels[-1]
+        labels.append(prev_labels.copy())
+        parents.append({})
+        cur = labels[k]
+
+        queue: Dict[int, int] = {}
+        for stop in marked:
+            for pattern_idx, pos in data.stop_patterns[stop]:
+                if pos < queue.get(pattern_idx, 1 << 30):
+                    queue[pattern_idx] = pos
+
+        improved = set()
+        for pattern_idx, start in queue.items():
+            pattern = data.patterns[pattern_idx]
+            boarded: Optional[Tuple[int, int, int]] = None
+            board_stop = board_pos = -1
+            for pos in range(start, len(pattern.stops)):
+                stop = int(pattern.stops[pos])
+                if boarded is not None:
+                    row, day_start, delay = boarded
+                    arrival = day_start + int(pattern.arrivals[row, pos]) + delay
+                    if arrival < min(int(best[stop]), target_bound()):
+                        cur[stop] = best[stop] = arrival
+                        departure = day_start + int(pattern.departures[row, board_pos]) + delay
+                        parents[k][stop] = (
+                            "bus",
+                            pattern.route,
+                            int(pattern.trips[row]),
+                            board_stop,
+                            departure,
+                            arrival,
+                            pos - board_pos,
+                        )
+                        improved.add(stop)
+
+                ready_at = int(prev_labels[stop])
+                if ready_at == _INF:
+                    continue
+                if boarded is not None:
+                    row, day_start, delay = boarded
+                    if ready_at > day_start + int(pattern.departures[row, pos]) + delay:
+                        continue
+                candidate = _earliest_trip(pattern, pos, ready_at, days, delays, max_delay)
+                if candidate is None:
+                    continue
+                if boarded is None or candidate != boarded:
+                    c_row, c_day, c_delay = candidate
+                    c_dep = c_day + int(pattern.departures[c_row, pos]) + c_delay
+                    if boarded is None or c_dep < (
+                        boarded[1] + int(pattern.departures[boarded[0], pos]) + boarded[2]
+                    ):
+                        boarded, board_stop, board_pos = candidate, stop, pos
+
+        for stop in list(improved):
+            for other, walk_s in data.transfers[stop]:
+                arrival = int(cur[stop]) + walk_s
+                if arrival < min(int(best[other]), target_bound()):
+                    cur[other] = best[other] = arrival
+                    parents[k][other] = ("walk", stop, walk_s)
+                    improved.add(other)
+
+        marked = improved
+        if not marked:
+            break
+
+    best_round, best_dest, best_arrival = -1, -1, _INF
+    for k, round_labels in enumerate(labels):
+        for dest in dest_set:
+            if int(round_labels[dest]) < best_arrival:
+                best_round, best_dest, best_arrival = k, dest, int(round_labels[dest])
+    if best_round < 0:
+        return None
+
+    if best_dest in origins:
+        return Journey(departure=depart_at, arrival=depart_at, legs=[])
+    legs = _reconstruct(parents, labels, best_round, best_dest, origins)
+    if not legs:
+        return None
+    return Journey(departure=legs[0].departure, arrival=best_arrival, legs=legs)
+
+
+def resolve_place(feed: StaticFeed, place_id: str) -> List[int]:
+    """Map a stop id, or a landmark id from the semantic index, to stop indices."""
+    stop = feed.stop_index.get(place_id)
+    if stop is not None:
+        return [stop]
+    doc = semantic_search.get_document(place_id) or {}
+    meta = doc.get("metadata") or {}
+    return [feed.stop_index[s] for s in meta.get("near_stop_ids", []) if s in feed.stop_index]
+
+
+def _build_leg(feed: StaticFeed, leg: Leg) -> JourneyLeg:
+    payload = {
+        "mode": leg.mode,
+        "from_stop_id": feed.stop_ids[leg.from_stop],
+        "from_stop_name": feed.stop_names[leg.from_stop],
+        "to_stop_id": feed.stop_ids[leg.to_stop],
+        "to_stop_name": feed.stop_names[leg.to_stop],
+        "departure": leg.departure,
+        "arrival": leg.arrival,
+        "num_stops": leg.num_stops,
+    }
+    if leg.mode == "bus":
+        route = feed.routes[leg.route] if leg.route >= 0 else {}
+        payload.update(
+            {
+                "route_id": route.get("route_id"),
+                "route_name": route.get("long_name") or route.get("short_name") or route.get("route_id"),
+                "route_color": f"#{route['color'].lstrip('#')}" if route.get("color") else None,
+                "trip_id": feed.trip_ids[leg.trip],
+                "headsign": feed.trip_headsigns[leg.trip] or None,
+            }
+        )
+    return JourneyLeg(**payload)
+
+
+async def plan_trip(
+    r: redis.Redis,
+    feed: StaticFeed,
+    origin: str,
+    destination: str,
+    depart_at: int,
+    realtime: bool = False,
+    max_transfers: Optional[int] = None,
+) -> JourneyResponse | None:
+    """Plan the earliest-arrival journey between two stops or landmarks."""
+    origins = resolve_place(feed, origin)
+    destinations = resolve_place(feed, destination)
+    if not origins or not destinations:
+        return None
+
+    # RAPTOR is pure Python; keep it off the event loop.
+    journey = await anyio.to_thread.run_sync(plan_journey, feed, origins, destinations, depart_at, max_transfers)
+    if journey is None:
+        return None
+
+    delays: Dict[int, int] = {}
+    if realtime:
+        # Only predictions at the stops the scheduled journey boards at (and the origins), up to
+        # its arrival, can change it; reading every stop in the feed on each request does not scale.
+        boarding = {leg.from_stop for leg in journey.legs if leg.mode == "bus"} | set(origins)
+        trip_delays = await transit_cache.get_trip_delays(
+            r, [feed.stop_ids[stop] for stop in sorted(boarding)], until=journey.arrival
+        )
+        delays = {
+            feed.trip_index[trip_id]: delay
+            for trip_id, delay in trip_delays.items()
+            if trip_id in feed.trip_index
+        }
+        if delays:
+            delayed = await anyio.to_thread.run_sync(
+                plan_journey, feed, origins, destinations, depart_at, max_transfers, delays
+            )
+            journey = delayed or journey
+            delays = delays if delayed is not None else {}
+
+    return JourneyResponse(
+        origin=origin,
+        destination=destination,
+        as_of=int(time.time() * 1000),
+        departure=journey.departure,
+        arrival=journey.arrival,
+        duration_s=journey.arrival - depart_at,
+        transfers=journey.transfers,
+        legs=[_build_leg(feed, leg) for leg in journey.legs],
+        realtime=bool(delays),
+    )
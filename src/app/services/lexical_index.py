@@ -0,0 +1,144 @@
+# src/app/services/lexical_index.py
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_LEADING_ARTICLES = {"the"}
+# Tokens shorter than this are only ever matched exactly ("b", "lx", "hall").
+_FUZZY_MIN_LEN = 4
+# Each misspelled token costs this share of the phrase, spread over its tokens.
+_FUZZY_PENALTY = 0.3
+
+
+def normalize(text: str) -> List[str]:
+    """Lowercase alphanumeric tokens; apostrophes are dropped so "Brower's" matches "browers"."""
+    return _TOKEN.findall(text.lower().replace("'", "").replace("’", ""))
+
+
+def _deletes(token: str) -> Set[str]:
+    return {token[:i] + token[i + 1 :] for i in range(len(token))}
+
+
+def _within_one_edit(a: str, b: str) -> bool:
+    """Damerau-Levenshtein distance <= 1 (one insert, delete, substitution or adjacent swap)."""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    i = 0
+    while i < min(la, lb) and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        if a[i + 1 :] == b[i + 1 :]:
+            return True
+        return i + 1 < la and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2 :] == b[i + 2 :]
+    if la > lb:
+        return a[i + 1 :] == b[i:]
+    return a[i:] == b[i + 1 :]
+
+
+@dataclass(frozen=True)
+class LexicalMatch:
+    doc_id: str
+    score: float
+    exact: bool
+    # Message token span [start, end) the phrase matched.
+    start: int
+    end: int
+
+
+@dataclass
+class _Node:
+    children: Dict[str, "_Node"] = field(default_factory=dict)
+    # (doc_id, weight) for phrases ending at this node
+    docs: List[Tuple[str, float]] = field(default_factory=list)
+
+
+class LexicalIndex:
+    """Token trie over stop names, nicknames and landmark aliases, with one-typo token lookup.
+
+    Every start position in the message walks the trie, so all phrases mentioned anywhere in it
+    are found in O(tokens x longest phrase). Misspelled tokens are resolved against the trie's
+    vocabulary through a deletion index (SymSpell-style) instead of comparing against every word.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str, float]]) -> None:
+        self._root = _Node()
+        self._vocab: Set[str] = set()
+        self._deletes: Dict[str, Set[str]] = {}
+        self.size = 0
+        for phrase, doc_id, weight in entries:
+            tokens = normalize(phrase)
+            self._add(tokens, doc_id, weight)
+            if len(tokens) > 1 and tokens[0] in _LEADING_ARTICLES:
+                self._add(tokens[1:], doc_id, weight)
+        for token in self._vocab:
+            if len(token) >= _FUZZY_MIN_LEN:
+                for key in _deletes(token) | {token}:
+                    self._deletes.setdefault(key, set()).add(token)
+
+    def _add(self, tokens: Sequence[str], doc_id: str, weight: float) -> None:
+        if not tokens or sum(map(len, tokens)) < 3:
+            return
+        node = self._root
+        for token in tokens:
+            node = node.children.setdefault(token, _Node())
+            self._vocab.add(token)
+        if all(existing != doc_id for existing, _ in node.docs):
+            node.docs.append((doc_id, weight))
+            self.size += 1
+
+    def _corrections(self, token: str) -> Set[str]:
+        if len(token) < _FUZZY_MIN_LEN or token in self._vocab:
+            return set()
+        candidates: Set[str] = set()
+        for key in _deletes(token) | {token}:
+            candidates |= self._deletes.get(key, set())
+        return {c for c in candidates if _within_one_edit(token, c)}
+
+    def match(self, text: str, fuzzy: bool = True) -> List[LexicalMatch]:
+        """Best match per document, best first."""
+        tokens = normalize(text)
+        corrections = [self._corrections(t) if fuzzy else set() for t in tokens]
+        best: Dict[str, LexicalMatch] = {}
+        for start in range(len(tokens)):
+            # (node, misspelled tokens so far); several paths when a typo has more than one fix.
+            frontier: List[Tuple[_Node, int]] = [(self._root, 0)]
+            for end in range(start, len(tokens)):
+                step: List[Tuple[_Node, int]] = []
+                for node, typos in frontier:
+                    child = node.children.get(tokens[end])
+                    if child is not None:
+                        step.append((child, typos))
+                    for fixed in corrections[end]:
+                        child = node.children.get(fixed)
+                        if child is not None:
+                            step.append((child, typos + 1))
+                if not step:
+                    break
+                span = end - start + 1
+                for node, typos in step:
+                    for doc_id, weight in node.docs:
+                        score = weight * (1.0 - _FUZZY_PENALTY * typos / span)
+                        current = best.get(doc_id)
+                        if current is None or score > current.score or (
+                            score == current.score and span > current.end - current.start
+                        ):
+                            best[doc_id] = LexicalMatch(doc_id, score, typos == 0, start, end + 1)
+                frontier = step
+        return sorted(best.values(), key=lambda m: (-m.score, m.doc_id))
+
+
+def build_entries(documents: Sequence[dict]) -> List[Tuple[str, str, float]]:
+    """Fallback lexicon from index metadata alone (official names, no nicknames) for older indexes."""
+    entries: List[Tuple[str, str, float]] = []
+    for doc in documents:
+        meta = doc.get("metadata") or {}
+        name: Optional[str] = meta.get("official_name") or meta.get("name")
+        if name:
+            entries.append((name, doc["doc_id"], 1.0))
+    return entries
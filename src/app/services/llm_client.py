@@ -0,0 +1,211 @@
+# src/app/services/llm_client.py
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional
+
+import aiohttp
+import orjson
+
+from src.app.core.config import settings
+from src.app.utils.stats import percentile
+
+_RETRY_STATUSES = {429, 502, 503, 504}
+_WAIT_SAMPLES = 512
+
+
+class LLMOverloaded(RuntimeError):
+    """Raised without calling the model when too many requests are already queued."""
+
+
+class LLMUnavailable(RuntimeError):
+    """Raised when the model server failed or timed out on every attempt."""
+
+
+class LLMClient:
+    """Keep-alive chat-completions client with bounded concurrency and a bounded wait queue."""
+
+    def __init__(self) -> None:
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._slots = asyncio.Semaphore(settings.llm_max_concurrency)
+        self._waiting = 0
+        self._in_flight = 0
+        self._wait_ms: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self._latency_ms: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self._ttfb_ms: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self._counters: Dict[str, int] = {
+            "requests": 0,
+            "completed": 0,
+            "shed": 0,
+            "retries": 0,
+            "timeouts": 0,
+            "errors": 0,
+        }
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            headers = {"Content-Type": "application/json"}
+            if settings.llm_api_key:
+                headers["Authorization"] = f"Bearer {settings.llm_api_key}"
+            self._session = aiohttp.ClientSession(
+                headers=headers,
+                connector=aiohttp.TCPConnector(
+                    limit=settings.llm_max_concurrency,
+                    keepalive_timeout=settings.llm_keepalive_s,
+                ),
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    connect=settings.llm_connect_timeout_s,
+                    sock_read=settings.llm_read_timeout_s,
+                ),
+            )
+        return self._session
+
+    async def aclose(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _post(self, payload: bytes) -> Dict[str, Any]:
+        url = f"{settings.llm_api_base}/chat/completions"
+        attempts = settings.llm_max_retries + 1
+        for attempt in range(attempts):
+            last = attempt == attempts - 1
+            try:
+                async with self._get_session().post(url, data=payload) as resp:
+                    if resp.status in _RETRY_STATUSES and not last:
+                        self._counters["retries"] += 1
+                    else:
+                        resp.raise_for_status()
+                        return orjson.loads(await resp.read())
+            except asyncio.TimeoutError as exc:
+                self._counters["timeouts"] += 1
+                if last:
+                    raise LLMUnavailable("LLM request timed out") from exc
+                self._counters["retries"] += 1
+            except aiohttp.ClientResponseError as exc:
+                raise LLMUnavailable(f"LLM returned HTTP {exc.status}") from exc
+            except aiohttp.ClientError as exc:
+                if last:
+                    raise LLMUnavailable(f"LLM connection failed: {exc}") from exc
+                self._counters["retries"] += 1
+            await asyncio.sleep(settings.llm_retry_backoff_s * (2 ** attempt))
+        raise LLMUnavailable("LLM request failed")
+
+    @contextlib.asynccontextmanager
+    async def _slot(self) -> AsyncIterator[None]:
+        """Hold one concurrency slot; sheds load instead of queueing past the limit."""
+        self._counters["requests"] += 1
+        if self._waiting >= settings.llm_max_queue:
+            self._counters["shed"] += 1
+            raise LLMOverloaded("LLM queue is full")
+
+        queued_at = time.perf_counter()
+        if not self._slots.locked():
+            # A free slot is taken without yielding, so it never counts towards the queue.
+            await self._slots.acquire()
+        else:
+            self._waiting += 1
+            try:
+                # Not wait_for: on 3.11 it can drop an acquire that completes as the timeout
+                # fires, leaking the slot. Here acquire() sees the cancellation and hands it on.
+                async with asyncio.timeout(settings.llm_queue_timeout_s):
+                    await self._slots.acquire()
+            except asyncio.TimeoutError as exc:
+                self._counters["shed"] += 1
+                raise LLMOverloaded("Timed out waiting for an LLM slot") from exc
+            finally:
+                self._waiting -= 1
+
+        started = time.perf_counter()
+        self._wait_ms.append((started - queued_at) * 1000)
+        self._in_flight += 1
+        try:
+            yield
+        except LLMUnavailable:
+            self._counters["errors"] += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._slots.release()
+            self._latency_ms.append((time.perf_counter() - started) * 1000)
+
+    def _payload(self, messages: List[dict], temperature: float, stream: bool = False) -> bytes:
+        body: Dict[str, Any] = {"model": settings.llm_model, "messages": messages, "temperature": temperature}
+        if stream:
+            body["stream"] = True
+        return orjson.dumps(body)
+
+    async def chat(self, messages: List[dict], temperature: float = 0.2) -> str:
+        """Content of the first choice."""
+        async with self._slot():
+            body = await self._post(self._payload(messages, temperature))
+            choice = (body.get("choices") or [{}])[0]
+            content = (choice.get("message") or {}).get("content")
+            if not content:
+                raise LLMUnavailable("LLM returned empty content")
+        self._counters["completed"] += 1
+        return content.strip()
+
+    async def stream_chat(self, messages: List[dict], temperature: float = 0.2) -> AsyncIterator[str]:
+        """Content deltas of the first choice as the server produces them (OpenAI-style SSE)."""
+        url = f"{settings.llm_api_base}/chat/completions"
+        async with self._slot():
+            started = time.perf_counter()
+            first = True
+            try:
+                async with self._get_session().post(url, data=self._payload(messages, temperature, stream=True)) as resp:
+                    resp.raise_for_status()
+                    async for raw_line in resp.content:
+                        line = raw_line.strip()
+                        if not line.startswith(b"data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == b"[DONE]":
+                            break
+                        try:
+                            chunk = orjson.loads(data)
+                        except orjson.JSONDecodeError:
+                            continue
+                        delta = ((chunk.get("choices") or [{}])[0].get("delta") or {}).get("content")
+                        if not delta:
+                            continue
+                        if first:
+                            self._ttfb_ms.append((time.perf_counter() - started) * 1000)
+                            first = False
+                        yield delta
+            except asyncio.TimeoutError as exc:
+                self._counters["timeouts"] += 1
+                raise LLMUnavailable("LLM stream timed out") from exc
+            except aiohttp.ClientResponseError as exc:
+                raise LLMUnavailable(f"LLM returned HTTP {exc.status}") from exc
+            except aiohttp.ClientError as exc:
+                raise LLMUnavailable(f"LLM connection failed: {exc}") from exc
+            if first:
+                raise LLMUnavailable("LLM returned empty content")
+        self._counters["completed"] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        wait = list(self._wait_ms)
+        latency = list(self._latency_ms)
+        ttfb = list(self._ttfb_ms)
+        return {
+            **self._counters,
+            "queue_depth": self._waiting,
+            "in_flight": self._in_flight,
+            "max_concurrency": settings.llm_max_concurrency,
+            "max_queue": settings.llm_max_queue,
+            "wait_ms_p50": round(percentile(wait, 0.5), 1),
+            "wait_ms_p95": round(percentile(wait, 0.95), 1),
+            "wait_ms_max": round(max(wait, default=0.0), 1),
+            "latency_ms_p50": round(percentile(latency, 0.5), 1),
+            "latency_ms_p95": round(percentile(latency, 0.95), 1),
+            "ttfb_ms_p50": round(percentile(ttfb, 0.5), 1),
+            "ttfb_ms_p95": round(percentile(ttfb, 0.95), 1),
+        }
+
+
+llm_client = LLMClient()
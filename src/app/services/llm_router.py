@@ -1,19 +1,41 @@
 from __future__ import annotations
 
-import asyncio
-from typing import List, Optional, Tuple
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
 
+import numpy as np
 import orjson
-import requests
+import redis.asyncio as redis
 
 from src.app.core.config import settings
+from src.app.schemas.chat import ChatWidgetResponse
 from src.app.schemas.chat_widgets import (
     ActiveRoutesConfig,
     BusArrivalsConfig,
     ChatMessageConfig,
     LLMWidgetConfig,
 )
-from src.app.services import semantic_search, transit_lookup
+from src.app.services import gtfs_static, intent_router, retrieval, semantic_search, stop_index, transit_lookup
+from src.app.services.intent_router import FastRoute
+from src.app.services.llm_client import LLMOverloaded, llm_client
+from src.app.services.response_cache import response_cache
+from src.app.services.widget_prefetch import Prefetch
+
+logger = logging.getLogger(__name__)
+
+NEAREST_STOPS_K = 3
+NEAREST_STOPS_MAX_M = 800
+# Semantic document types _resolve_context turns into stops
+_CONTEXT_TYPES = ("stop", "landmark")
+# The router's JSON always leads with "type", so it is known after the first few tokens.
+_TYPE_FIELD = re.compile(r'"type"\s*:\s*"([a-z_]+)"')
+_WIDGET_TYPES = {"chat_message", "bus_arrivals", "active_routes"}
+# "5pm", "5:30", "10:15 am": near-identical embeddings, different answers.
+_CLOCK_TIME = re.compile(r"\b(\d{1,2}(?::\d{2})?)\s*([ap])\.?m\b|\b(\d{1,2}:\d{2})\b|\b(noon|midnight)\b")
+BUSY_MESSAGE = "I'm getting a lot of questions right now. Please try again in a moment."
 
 
 def _system_prompt() -> str:
@@ -60,64 +82,307 @@ def _parse_llm_json(raw_text: str) -> LLMWidgetConfig:
     return ChatMessageConfig(message="Let me help with that.")
 
 
-def _call_llm(messages: List[dict]) -> str:
-    url = f"{settings.llm_api_base}/chat/completions"
-    headers = {"Content-Type": "application/json"}
-    if settings.llm_api_key:
-        headers["Authorization"] = f"Bearer {settings.llm_api_key}"
-
-    payload = {
-        "model": settings.llm_model,
-        "messages": messages,
-        "temperature": 0.2,
-    }
+@dataclass(frozen=True)
+class _Context:
+    text: str
+    stop_ids: List[str]
+    # (stop_id, similarity) for each of stop_ids, best first
+    stop_hits: List[Tuple[str, float]]
+    embedding: Optional[np.ndarray]
 
-    resp = requests.post(url, headers=headers, data=orjson.dumps(payload))
-    resp.raise_for_status()
-    body = resp.json()
-    choice = body.get("choices", [{}])[0]
-    msg = choice.get("message", {})
-    content = msg.get("content")
-    if not content:
-        raise RuntimeError("LLM returned empty content")
-    return content.strip()
-
-
-def _resolve_context(user_message: str) -> Tuple[str, List[str]]:
-    hits = semantic_search.search(user_message, k=5)
-    stop_ids: List[str] = []
-    parts: List[str] = []
 
+def _resolve_context(
+    user_message: str,
+    hits: Optional[List[Dict[str, Any]]] = None,
+    embedding: Optional[np.ndarray] = None,
+) -> _Context:
+    if not user_message.strip():
+        return _Context("", [], [], None)
+    if hits is None:
+        hits = semantic_search.search(user_message, k=5)
+    scores: Dict[str, float] = {}
+    route_parts: List[str] = []
     for hit in hits:
         meta = hit.get("metadata") or {}
-        if meta.get("type") != "stop":
+        if meta.get("type") == "route":
+            # The route document lists its stops in order, which is what "does the LX go to ..." needs.
+            route_parts.append(hit.get("text") or "")
             continue
-        stop_id = meta.get("stop_id")
-        if not stop_id or stop_id in stop_ids:
+        if meta.get("type") == "stop" and meta.get("stop_id"):
+            hit_stops = [str(meta["stop_id"])]
+        elif meta.get("type") == "landmark":
+            hit_stops = [str(s) for s in meta.get("near_stop_ids") or []]
+        else:
             continue
+        for stop_id in hit_stops:
+            scores.setdefault(stop_id, float(hit.get("score") or 0.0))
+    candidate_ids = sorted(scores, key=lambda stop_id: -scores[stop_id])
 
-        stop = transit_lookup.get_stop(stop_id)
+    stops = transit_lookup.get_stops(candidate_ids)
+    stop_ids: List[str] = []
+    parts: List[str] = []
+    for stop_id in candidate_ids:
+        stop = stops.get(stop_id)
         if not stop:
             continue
-        routes = transit_lookup.get_routes_for_stop(stop_id)
-        route_labels = [
-            r["short_name"] or r["route_id"] for r in routes if r.get("route_id")
-        ]
+        route_labels = [r["short_name"] or r["route_id"] for r in stop["routes"]]
         stop_name = stop["name"] or stop_id
         label = f"Stop {stop_id} ({stop_name}), routes: {', '.join(route_labels) or 'none'}"
         parts.append(label)
         stop_ids.append(stop_id)
 
-    context = " | ".join(parts)
-    return context, stop_ids
+    parts += [part for part in route_parts if part]
+    return _Context(
+        text=" | ".join(parts),
+        stop_ids=stop_ids,
+        stop_hits=[(stop_id, scores[stop_id]) for stop_id in stop_ids],
+        embedding=embedding,
+    )
+
+
+def _nearest_stops_context(lat: float, lon: float) -> Tuple[str, List[str]]:
+    """Describe the stops closest to a location the user shared."""
+    nearby = stop_index.nearest_stops(lat, lon, NEAREST_STOPS_K, NEAREST_STOPS_MAX_M)
+    if not nearby:
+        return "", []
+    labels = [f"{s['stop_id']} ({s['stop_name']}, {int(s['distance_m'])} m)" for s in nearby]
+    return f"User is near stops: {', '.join(labels)}", [str(s["stop_id"]) for s in nearby]
+
+
+def _search_filter(user_message: str, lat: Optional[float], lon: Optional[float]) -> semantic_search.SearchFilter:
+    """Only the document types _resolve_context uses, on the campus or near the place we know of."""
+    campus = None
+    # Until the overlay gives most stops a campus, filtering by it would mostly drop stops.
+    if settings.campus_filter_enabled and semantic_search.campus_coverage() >= settings.campus_filter_min_coverage:
+        campus = semantic_search.mentioned_campus(user_message)
+    if campus is None and lat is not None and lon is not None and settings.geo_filter_radius_m > 0:
+        return semantic_search.SearchFilter.around(lat, lon, settings.geo_filter_radius_m, types=_CONTEXT_TYPES)
+    return semantic_search.SearchFilter(campus=campus, types=_CONTEXT_TYPES)
+
+
+@dataclass(frozen=True)
+class _Prepared:
+    messages: List[dict]
+    stop_ids: List[str]
+    fast: Optional[FastRoute]
+    embedding: Optional[np.ndarray]
+    # Stops, routes and clock times the answer depends on; cached answers are only reused for
+    # the same ones ("does the LX go to Hill Center" vs "the EE" embed almost identically).
+    cache_guard: str
+
+
+async def _prepare(
+    user_message: str,
+    lat: Optional[float],
+    lon: Optional[float],
+) -> _Prepared:
+    # A verbatim stop name or alias needs no embedding. Otherwise embedding is the CPU-bound
+    # part; it is batched with concurrent requests on the embedding thread.
+    retrieved = await retrieval.retrieve(user_message, k=5, filters=_search_filter(user_message, lat, lon))
+    embedding = retrieved.embedding
+    resolved = _resolve_context(user_message, retrieved.hits, embedding)
+    context, stop_ids = resolved.text, resolved.stop_ids
+    near_ids: List[str] = []
+    if lat is not None and lon is not None:
+        near_context, near_ids = _nearest_stops_context(lat, lon)
+        if near_context:
+            context = " | ".join(part for part in (near_context, context) if part)
+            stop_ids = near_ids + [s for s in stop_ids if s not in near_ids]
+    fast = None
+    if settings.intent_fast_path_enabled:
+        fast = intent_router.fast_route(user_message, resolved.stop_hits, near_ids)
+    if fast is None and embedding is None and user_message.strip() and settings.response_cache_enabled:
+        # Going to the model after all: the response cache is keyed by the query embedding.
+        embedding = await semantic_search.embed_query_async(user_message)
+    return _Prepared(
+        messages=_build_messages(user_message, context or None),
+        stop_ids=stop_ids,
+        fast=fast,
+        embedding=embedding,
+        cache_guard=_cache_guard(user_message, near_ids, resolved.stop_ids, retrieved.route_ids),
+    )
+
+
+def _cache_guard(user_message: str, near_ids: List[str], named_ids: List[str], route_ids: List[str]) -> str:
+    times = sorted({"".join(filter(None, match.groups())) for match in _CLOCK_TIME.finditer(user_message.lower())})
+    near = near_ids[0] if near_ids else "-"
+    named = named_ids[0] if named_ids else "-"
+    return "|".join((near, named, ",".join(sorted(route_ids)) or "-", ",".join(times) or "-"))
+
+
+def _cache_version(r: Optional[redis.Redis], prepared: _Prepared) -> Optional[str]:
+    """GTFS version to cache under, or None when this request should not use the cache."""
+    if r is None or prepared.embedding is None or not settings.response_cache_enabled:
+        return None
+    feed = gtfs_static.current_feed()
+    return feed.version if feed is not None else gtfs_static.UNVERSIONED
+
 
+async def _cache_lookup(r: redis.Redis, version: str, prepared: _Prepared) -> Optional[LLMWidgetConfig]:
+    assert prepared.embedding is not None
+    try:
+        return await response_cache.lookup(r, version, prepared.cache_guard, prepared.embedding)
+    except redis.RedisError:
+        logger.warning("Response cache lookup failed", exc_info=True)
+        return None
+
+
+async def _cache_store(r: redis.Redis, version: str, prepared: _Prepared, result: LLMWidgetConfig) -> None:
+    assert prepared.embedding is not None
+    try:
+        await response_cache.store(r, version, prepared.cache_guard, prepared.embedding, result)
+    except redis.RedisError:
+        logger.warning("Response cache store failed", exc_info=True)
+
+
+def _speculate(prefetch: Prefetch, user_message: str, prepared: _Prepared) -> None:
+    """Start loading the widget the model will most likely pick, before it has answered."""
+    intent, _ = intent_router.classify_intent(user_message)
+    if intent == intent_router.INTENT_ACTIVE_ROUTES:
+        prefetch.start(intent)
+    elif prepared.stop_ids:
+        # Arrivals are by far the most common widget, and the candidates are few: guess them
+        # whenever the message resolved to stops, unless the wording clearly asks for routes.
+        prefetch.start(intent_router.INTENT_ARRIVALS, prepared.stop_ids)
 
-async def route_message(user_message: str) -> LLMWidgetConfig:
-    context, stop_ids = _resolve_context(user_message)
-    messages = _build_messages(user_message, context or None)
-    raw = await asyncio.to_thread(_call_llm, messages)
-    result = _parse_llm_json(raw)
 
+def _finalize(result: LLMWidgetConfig, stop_ids: List[str]) -> LLMWidgetConfig:
     if isinstance(result, BusArrivalsConfig) and not result.stopIds and stop_ids:
         return BusArrivalsConfig(stopIds=stop_ids)
     return result
+
+
+async def route_message(
+    user_message: str,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    r: Optional[redis.Redis] = None,
+    prefetch: Optional[Prefetch] = None,
+) -> LLMWidgetConfig:
+    prepared = await _prepare(user_message, lat, lon)
+    if prepared.fast is not None:
+        return prepared.fast.config
+    if prefetch is not None:
+        _speculate(prefetch, user_message, prepared)
+    version = _cache_version(r, prepared)
+    if version is not None:
+        cached = await _cache_lookup(r, version, prepared)
+        if cached is not None:
+            return cached
+    try:
+        raw = await llm_client.chat(prepared.messages)
+    except LLMOverloaded:
+        return ChatMessageConfig(message=BUSY_MESSAGE)
+    result = _finalize(_parse_llm_json(raw), prepared.stop_ids)
+    if version is not None:
+        await _cache_store(r, version, prepared, result)
+    return result
+
+
+async def route_message_with_data(
+    user_message: str,
+    lat: Optional[float],
+    lon: Optional[float],
+    r: redis.Redis,
+) -> ChatWidgetResponse:
+    """The routing decision together with its widget's data, loaded alongside the model call."""
+    prefetch = Prefetch(r)
+    try:
+        config = await route_message(user_message, lat, lon, r, prefetch)
+        data, prefetched = await prefetch.resolve(config)
+    finally:
+        await prefetch.cancel()
+    return ChatWidgetResponse(config=config, widget_data=data, prefetched=prefetched)
+
+
+async def stream_route_message(
+    user_message: str,
+    lat: Optional[float] = None,
+    lon: Optional[float] = None,
+    r: Optional[redis.Redis] = None,
+    include_widget_data: bool = False,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """(event, data) pairs: raw tokens, the widget type as soon as it is known, the final config,
+    the widget's data when requested, timings."""
+    if include_widget_data and r is not None:
+        prefetch = Prefetch(r)
+        try:
+            async for event, data in _stream_route(user_message, lat, lon, r, prefetch):
+                yield event, data
+        finally:
+            await prefetch.cancel()
+    else:
+        async for event, data in _stream_route(user_message, lat, lon, r, None):
+            yield event, data
+
+
+async def _widget_data_event(prefetch: Prefetch, result: LLMWidgetConfig) -> Dict[str, Any]:
+    data, prefetched = await prefetch.resolve(result)
+    return {"data": data.model_dump() if data is not None else None, "prefetched": prefetched}
+
+
+async def _stream_route(
+    user_message: str,
+    lat: Optional[float],
+    lon: Optional[float],
+    r: Optional[redis.Redis],
+    prefetch: Optional[Prefetch],
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    started = time.perf_counter()
+    prepared = await _prepare(user_message, lat, lon)
+    stop_ids = prepared.stop_ids
+    timings: Dict[str, Optional[float]] = {"ttfb_ms": None, "widget_ms": None}
+
+    def widget_event(widget_type: str) -> Dict[str, Any]:
+        timings["widget_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        data: Dict[str, Any] = {"type": widget_type}
+        if widget_type == "bus_arrivals":
+            # Lets the client start fetching arrivals before the model has listed stopIds.
+            data["candidateStopIds"] = stop_ids
+        return data
+
+    shortcut: Optional[LLMWidgetConfig] = prepared.fast.config if prepared.fast is not None else None
+    version = _cache_version(r, prepared) if shortcut is None else None
+    if version is not None:
+        shortcut = await _cache_lookup(r, version, prepared)
+    if shortcut is not None:
+        stop_ids = getattr(shortcut, "stopIds", stop_ids)
+        yield "widget", widget_event(shortcut.type)
+        yield "result", shortcut.model_dump()
+        if prefetch is not None:
+            yield "widget_data", await _widget_data_event(prefetch, shortcut)
+        yield "done", {
+            **timings,
+            "total_ms": timings["widget_ms"],
+            "fast_path": prepared.fast is not None,
+            "cached": prepared.fast is None,
+        }
+        return
+
+    if prefetch is not None:
+        _speculate(prefetch, user_message, prepared)
+    raw: List[str] = []
+    widget_sent = False
+    try:
+        async for delta in llm_client.stream_chat(prepared.messages):
+            if timings["ttfb_ms"] is None:
+                timings["ttfb_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            raw.append(delta)
+            yield "token", {"text": delta}
+            if not widget_sent:
+                match = _TYPE_FIELD.search("".join(raw))
+                if match and match.group(1) in _WIDGET_TYPES:
+                    widget_sent = True
+                    yield "widget", widget_event(match.group(1))
+        result = _finalize(_parse_llm_json("".join(raw)), stop_ids)
+        if version is not None:
+            await _cache_store(r, version, prepared, result)
+    except LLMOverloaded:
+        result = ChatMessageConfig(message=BUSY_MESSAGE)
+
+    if not widget_sent:
+        yield "widget", widget_event(result.type)
+    yield "result", result.model_dump()
+    if prefetch is not None:
+        yield "widget_data", await _widget_data_event(prefetch, result)
+    yield "done", {**timings, "total_ms": round((time.perf_counter() - started) * 1000, 1), "fast_path": False, "cached": False}
@@ -0,0 +1,81 @@
+# src/app/services/onnx_encoder.py
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import onnxruntime as ort
+import orjson
+from tokenizers import Tokenizer
+
+# Files written by src/tasks/export_onnx_encoder.py
+MODEL_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+CONFIG_FILE = "encoder.json"
+
+
+class OnnxEncoder:
+    """Sentence-transformers compatible encoder over an exported, int8-quantized ONNX model.
+
+    Reproduces the SBERT pipeline (tokenize, transformer, mean pooling, L2 normalize) with only
+    onnxruntime and tokenizers loaded, so a worker never imports torch.
+    """
+
+    def __init__(self, model_dir: Path, threads: int = 1) -> None:
+        config_path = model_dir / CONFIG_FILE
+        if not config_path.exists():
+            raise FileNotFoundError(
+                f"ONNX encoder missing at {model_dir}; run python -m src.tasks.export_onnx_encoder"
+            )
+        self.config: Dict[str, Any] = orjson.loads(config_path.read_bytes())
+
+        self._tokenizer = Tokenizer.from_file(str(model_dir / TOKENIZER_FILE))
+        self._tokenizer.enable_truncation(max_length=int(self.config["max_seq_length"]))
+        self._tokenizer.enable_padding(pad_id=int(self.config.get("pad_token_id", 0)))
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = max(1, threads)
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = ort.InferenceSession(
+            str(model_dir / self.config.get("model_file", MODEL_FILE)),
+            sess_options=options,
+            providers=["CPUExecutionProvider"],
+        )
+        self._inputs = {i.name for i in self._session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.config["dim"])
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self._tokenizer.encode_batch(texts)
+        ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feed = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self._inputs:
+            feed["token_type_ids"] = np.asarray([e.type_ids for e in encodings], dtype=np.int64)
+        (tokens,) = self._session.run(["last_hidden_state"], feed)
+        # Mean pooling over real tokens, as in the SBERT Pooling module.
+        weights = mask[:, :, None].astype(np.float32)
+        return (tokens * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+
+    def encode(
+        self,
+        sentences: Sequence[str],
+        batch_size: int = 32,
+        normalize_embeddings: bool = False,
+        **_: Any,
+    ) -> np.ndarray:
+        texts = list(sentences)
+        if not texts:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        # Similar lengths together, so padding stays short.
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        out = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(order), max(1, batch_size)):
+            rows = order[start : start + batch_size]
+            out[rows] = self._encode_batch([texts[i] for i in rows])
+        if normalize_embeddings:
+            out /= np.clip(np.linalg.norm(out, axis=1, keepdims=True), 1e-12, None)
+        return out
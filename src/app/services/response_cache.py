@@ -0,0 +1,217 @@
+# src/app/services/response_cache.py
+from __future__ import annotations
+
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import redis.asyncio as redis
+from pydantic import TypeAdapter
+
+from src.app.core.config import settings
+from src.app.schemas.chat_widgets import LLMWidgetConfig
+from src.app.utils.json import jdump, jload
+
+_CONFIG_ADAPTER: TypeAdapter[LLMWidgetConfig] = TypeAdapter(LLMWidgetConfig)
+_GUARD_SEP = b"\x00"
+
+
+def _keys(version: str) -> Dict[str, str]:
+    base = f"{settings.redis_key_prefix}:llmcache:{version}"
+    return {
+        # entry_id -> guard + NUL + float32 embedding
+        "vectors": f"{base}:vectors",
+        # entry_id scored by insertion sequence, so workers can pull only what they have not seen
+        "log": f"{base}:log",
+        "seq": f"{base}:seq",
+        # entry_id scored by last use, for LRU eviction
+        "lru": f"{base}:lru",
+    }
+
+
+def _entry_key(version: str, entry_id: str) -> str:
+    return f"{settings.redis_key_prefix}:llmcache:{version}:entry:{entry_id}"
+
+
+def _stats_key() -> str:
+    return f"{settings.redis_key_prefix}:llmcache:stats"
+
+
+@dataclass
+class _Mirror:
+    """This worker's copy of one version's cached query embeddings."""
+
+    seq: int = 0
+    ids: List[str] = field(default_factory=list)
+    guards: List[str] = field(default_factory=list)
+    # Rows [0, len(ids)) are in use; capacity doubles when full, so adding stays amortized O(1).
+    _buf: Optional[np.ndarray] = None
+
+    @property
+    def vectors(self) -> Optional[np.ndarray]:
+        return None if self._buf is None else self._buf[: len(self.ids)]
+
+    def add(self, entry_id: str, packed: bytes) -> None:
+        guard, _, raw = packed.partition(_GUARD_SEP)
+        vec = np.frombuffer(raw, dtype=np.float32)
+        if self._buf is None:
+            self._buf = np.empty((16, vec.size), dtype=np.float32)
+        elif vec.size != self._buf.shape[1]:
+            return
+        n = len(self.ids)
+        if n == len(self._buf):
+            grown = np.empty((2 * n, vec.size), dtype=np.float32)
+            grown[:n] = self._buf
+            self._buf = grown
+        self._buf[n] = vec
+        self.ids.append(entry_id)
+        self.guards.append(guard.decode("utf-8"))
+
+    def remove(self, row: int) -> None:
+        # Row order does not matter; the last row fills the hole.
+        assert self._buf is not None
+        last = len(self.ids) - 1
+        self._buf[row] = self._buf[last]
+        self.ids[row] = self.ids[last]
+        self.guards[row] = self.guards[last]
+        self.ids.pop()
+        self.guards.pop()
+
+
+class ResponseCache:
+    """Routing decisions shared by all workers through Redis, looked up by query-embedding similarity.
+
+    A lookup only matches entries stored under the same GTFS version and the same guard (the stops
+    the query resolved to), so near-identical phrasings about different stops never collide.
+    """
+
+    def __init__(self) -> None:
+        self._mirrors: Dict[str, _Mirror] = {}
+        self._local = {"lookups": 0, "hits": 0, "stores": 0}
+
+    async def _sync(self, r: redis.Redis, version: str) -> _Mirror:
+        mirror = self._mirrors.get(version)
+        if mirror is None:
+            # A new feed version orphans the old entries; they expire on their own.
+            self._mirrors = {}
+            mirror = self._mirrors[version] = _Mirror()
+
+        keys = _keys(version)
+        pipe = r.pipeline()
+        pipe.zrange(keys["log"], 0, 0, withscores=True)
+        pipe.zrangebyscore(keys["log"], f"({mirror.seq}", "+inf", withscores=True)
+        oldest, fresh = await pipe.execute()
+        if not fresh:
+            return mirror
+
+        # Also true for a fresh worker (seq 0) once the log start has been trimmed: the live
+        # entries logged before it are only in the vectors hash.
+        gap = bool(oldest) and int(oldest[0][1]) > mirror.seq + 1
+        if gap or len(mirror.ids) > 2 * settings.response_cache_max_entries:
+            # Trimmed past our position, or too many stale rows: rebuild from the vectors hash.
+            rebuilt = _Mirror(seq=int(fresh[-1][1]))
+            for entry_id, packed in (await r.hgetall(keys["vectors"])).items():
+                rebuilt.add(entry_id.decode("utf-8"), packed)
+            self._mirrors[version] = rebuilt
+            return rebuilt
+
+        ids = [member.decode("utf-8") for member, _ in fresh]
+        for entry_id, packed in zip(ids, await r.hmget(keys["vectors"], ids)):
+            if packed:
+                mirror.add(entry_id, packed)
+        mirror.seq = int(fresh[-1][1])
+        return mirror
+
+    async def lookup(
+        self,
+        r: redis.Redis,
+        version: str,
+        guard: str,
+        embedding: np.ndarray,
+    ) -> Optional[LLMWidgetConfig]:
+        self._local["lookups"] += 1
+        mirror = await self._sync(r, version)
+        hit: Optional[LLMWidgetConfig] = None
+        while mirror.vectors is not None and len(mirror.ids):
+            candidates = np.flatnonzero(np.asarray(mirror.guards) == guard)
+            if not len(candidates):
+                break
+            sims = mirror.vectors[candidates] @ embedding.reshape(-1)
+            best = int(np.argmax(sims))
+            if float(sims[best]) < settings.response_cache_similarity:
+                break
+            row = int(candidates[best])
+            entry_id = mirror.ids[row]
+            pipe = r.pipeline()
+            pipe.get(_entry_key(version, entry_id))
+            pipe.zadd(_keys(version)["lru"], {entry_id: time.time()}, xx=True)
+            payload, _ = await pipe.execute()
+            if payload is None:
+                # Expired or evicted elsewhere; forget it and try the next best.
+                mirror.remove(row)
+                continue
+            hit = _CONFIG_ADAPTER.validate_python(jload(payload))
+            break
+
+        await r.hincrby(_stats_key(), "hits" if hit is not None else "misses", 1)
+        if hit is not None:
+            self._local["hits"] += 1
+        return hit
+
+    async def store(
+        self,
+        r: redis.Redis,
+        version: str,
+        guard: str,
+        embedding: np.ndarray,
+        config: LLMWidgetConfig,
+    ) -> None:
+        keys = _keys(version)
+        entry_id = uuid.uuid4().hex[:16]
+        ttl = settings.response_cache_ttl_s
+        seq = await r.incr(keys["seq"])
+
+        pipe = r.pipeline()
+        pipe.set(_entry_key(version, entry_id), jdump(config.model_dump()), ex=ttl)
+        pipe.hset(
+            keys["vectors"],
+            entry_id,
+            guard.encode("utf-8") + _GUARD_SEP + embedding.astype(np.float32).reshape(-1).tobytes(),
+        )
+        pipe.zadd(keys["log"], {entry_id: seq})
+        pipe.zadd(keys["lru"], {entry_id: time.time()})
+        # Keep enough log for workers that are behind; older positions trigger a full resync.
+        pipe.zremrangebyrank(keys["log"], 0, -2 * settings.response_cache_max_entries - 1)
+        for key in keys.values():
+            pipe.expire(key, ttl)
+        pipe.zcard(keys["lru"])
+        *_, size = await pipe.execute()
+        self._local["stores"] += 1
+
+        overflow = int(size) - settings.response_cache_max_entries
+        if overflow > 0:
+            evicted = [m.decode("utf-8") for m, _ in await r.zpopmin(keys["lru"], overflow)]
+            if evicted:
+                pipe = r.pipeline()
+                pipe.delete(*[_entry_key(version, entry_id) for entry_id in evicted])
+                pipe.hdel(keys["vectors"], *evicted)
+                pipe.zrem(keys["log"], *evicted)
+                await pipe.execute()
+
+    async def metrics(self, r: redis.Redis) -> Dict[str, Any]:
+        raw = await r.hgetall(_stats_key())
+        shared = {k.decode("utf-8"): int(v) for k, v in raw.items()}
+        hits, misses = shared.get("hits", 0), shared.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            # Every hit is a model call that did not happen.
+            "llm_calls_avoided": hits,
+            "worker": {**self._local, "mirrored_entries": sum(len(m.ids) for m in self._mirrors.values())},
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,61 @@
+# src/app/services/retrieval.py
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import anyio
+import numpy as np
+
+from src.app.core.config import settings
+from src.app.services import route_search, semantic_search
+
+
+@dataclass(frozen=True)
+class Retrieved:
+    # Stop, landmark and route hits on one score scale, best first
+    hits: List[Dict[str, Any]]
+    # None when a verbatim stop name made the embedding unnecessary
+    embedding: Optional[np.ndarray]
+    # Routes the query names by short or long name, best first
+    route_ids: List[str]
+
+
+def _merge(stop_hits: List[Dict[str, Any]], route_hits: List[Dict[str, Any]], k: int) -> List[Dict[str, Any]]:
+    """Top k across both indexes; a route only makes the cut by outscoring a stop."""
+    return sorted(stop_hits + route_hits, key=lambda hit: -hit["score"])[:k]
+
+
+async def retrieve(
+    query: str,
+    k: int = 5,
+    filters: Optional[semantic_search.SearchFilter] = None,
+) -> Retrieved:
+    """Hits from the semantic and route indexes for one query, embedded at most once.
+
+    Names are matched lexically in both first. Unless a stop was named verbatim, the query is
+    embedded once and both vector indexes are searched with it concurrently (faiss releases the
+    GIL), route scores calibrated to the semantic index's scale. ``filters`` restrict the stop and
+    landmark side; route documents have no campus or location.
+    """
+    if not query.strip():
+        return Retrieved([], None, [])
+    stop_lexical = semantic_search.lexical_search(query, k, filters)
+    route_lexical = route_search.lexical_search(query, settings.route_search_k)
+    route_ids = [hit["metadata"]["route_id"] for hit in route_lexical]
+    if semantic_search.is_exact(stop_lexical):
+        return Retrieved(_merge(stop_lexical, route_lexical, k), None, route_ids)
+
+    embedding = await semantic_search.embed_query_async(query)
+    stop_hits, route_hits = await asyncio.gather(
+        anyio.to_thread.run_sync(semantic_search.search_vector, embedding, k, stop_lexical, filters),
+        anyio.to_thread.run_sync(
+            route_search.search_vector,
+            embedding,
+            settings.route_search_k,
+            route_lexical,
+            semantic_search.score_stats(),
+        ),
+    )
+    return Retrieved(_merge(stop_hits, route_hits, k), embedding, route_ids)
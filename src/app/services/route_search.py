@@ -0,0 +1,167 @@
+# src/app/services/route_search.py
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+import orjson
+
+from src.app.core.config import settings
+from src.app.services import lexical_index, semantic_search
+from src.app.services.index_store import IndexStore, read_index_mmap
+
+logger = logging.getLogger(__name__)
+
+# Files of route indexes built before manifests; newer builds are found through routes_manifest.json.
+LEGACY_FILES = {
+    "index": settings.index_dir / "routes.faiss",
+    "meta": settings.index_dir / "routes_meta.json",
+}
+DOC_PREFIX = "route:"
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    """One published version of the route index; never mutated once loaded."""
+
+    index: Optional[faiss.Index]
+    by_id: Dict[str, Dict[str, Any]]
+    # Short names of two or more characters ("lx", "ee", "rexb"), matched as single tokens.
+    short_names: Dict[str, List[str]]
+    lexical: lexical_index.LexicalIndex
+    # Mean and std of the best score probe queries got at build time; see calibrate().
+    score_stats: Optional[Dict[str, float]]
+
+
+def _route_doc(route_id: str, value: Any) -> Dict[str, Any]:
+    # Older builds stored only the document text per route.
+    if isinstance(value, str):
+        value = {"doc": value}
+    return {
+        "doc_id": f"{DOC_PREFIX}{route_id}",
+        "text": value.get("doc", ""),
+        "metadata": {
+            "type": "route",
+            "route_id": route_id,
+            "short_name": value.get("short_name") or "",
+            "long_name": value.get("long_name") or "",
+        },
+    }
+
+
+def _name_entries(docs: Sequence[Dict[str, Any]]) -> Tuple[Dict[str, List[str]], List[Tuple[str, str, float]]]:
+    short_names: Dict[str, List[str]] = {}
+    entries: List[Tuple[str, str, float]] = []
+    for doc in docs:
+        meta = doc["metadata"]
+        short = "".join(lexical_index.normalize(meta["short_name"]))
+        if len(short) >= 2:
+            short_names.setdefault(short, []).append(doc["doc_id"])
+        elif short:
+            # A bare "a" or "h" is an ordinary word; only "route A" / "A route" name the route.
+            entries += [(f"route {short}", doc["doc_id"], 1.0), (f"{short} route", doc["doc_id"], 1.0)]
+        if meta["long_name"]:
+            entries.append((meta["long_name"], doc["doc_id"], 1.0))
+    return short_names, entries
+
+
+def _load_snapshot(index_dir: Path, manifest: Optional[Dict[str, Any]]) -> _Snapshot:
+    if manifest is None:
+        files = dict(LEGACY_FILES)
+    else:
+        files = {role: index_dir / name for role, name in manifest["files"].items()}
+        missing = [str(files[role]) for role in ("index", "meta") if not files[role].exists()]
+        if missing:
+            raise FileNotFoundError(f"Route index {manifest['version']} is missing {', '.join(missing)}")
+
+    raw: Dict[str, Any] = {}
+    if files["meta"].exists():
+        raw = orjson.loads(files["meta"].read_bytes())
+    docs = [_route_doc(str(route_id), value) for route_id, value in raw.items()]
+
+    index = read_index_mmap(files["index"]) if files["index"].exists() else None
+    if index is not None and index.ntotal != len(docs):
+        raise ValueError(f"Route index has {index.ntotal} vectors but {len(docs)} routes")
+
+    short_names, entries = _name_entries(docs)
+    return _Snapshot(
+        index=index,
+        by_id={doc["doc_id"]: doc for doc in docs},
+        short_names=short_names,
+        lexical=lexical_index.LexicalIndex(entries),
+        score_stats=(manifest or {}).get("score_stats"),
+    )
+
+
+_store: IndexStore[_Snapshot] = IndexStore("routes", _load_snapshot)
+
+
+def _hit(doc: Dict[str, Any], score: float, match: str) -> Dict[str, Any]:
+    return {
+        "score": score,
+        "doc_id": doc["doc_id"],
+        "text": doc["text"],
+        "metadata": doc["metadata"],
+        "match": match,
+    }
+
+
+def lexical_search(query: str, k: int = 2) -> List[Dict[str, Any]]:
+    """Routes named in the query by short name ("LX", "route A") or long name."""
+    if not settings.route_search_enabled or not settings.lexical_search_enabled or not query.strip():
+        return []
+    snapshot = _store.get()
+    results: Dict[str, Dict[str, Any]] = {}
+    for token in lexical_index.normalize(query):
+        for doc_id in snapshot.short_names.get(token, ()):
+            results[doc_id] = _hit(snapshot.by_id[doc_id], 1.0, "exact")
+    for match in snapshot.lexical.match(query):
+        doc = snapshot.by_id.get(match.doc_id)
+        if doc is not None and match.doc_id not in results:
+            results[match.doc_id] = _hit(doc, match.score, "exact" if match.exact else "fuzzy")
+    return sorted(results.values(), key=lambda hit: -hit["score"])[:k]
+
+
+def calibrate(score: float, stats: Optional[Dict[str, float]], reference: Optional[Dict[str, float]]) -> float:
+    """Map a cosine score from this index onto the scale of ``reference`` (the semantic index).
+
+    Long route documents score lower against short questions than stop names do, so raw cosines
+    from the two indexes are not comparable. Both builders record how high the best hit scores
+    for the same probe questions; a route score is moved to the same number of standard
+    deviations from the semantic mean. Indexes built without those stats are left as they are.
+    """
+    if not stats or not reference:
+        return score
+    z = (score - stats["mean"]) / max(stats["std"], 1e-6)
+    return reference["mean"] + z * reference["std"]
+
+
+def search_vector(
+    vec: np.ndarray,
+    k: int = 2,
+    lexical: Optional[Sequence[Dict[str, Any]]] = None,
+    reference: Optional[Dict[str, float]] = None,
+) -> List[Dict[str, Any]]:
+    """Routes closest to a query embedding, with calibrated scores, fused with named routes."""
+    snapshot = _store.get()
+    index = snapshot.index
+    if index is None or index.ntotal == 0 or not settings.route_search_enabled:
+        return list(lexical or [])
+    if index.d != vec.shape[1]:
+        logger.warning("Route index has dim %s but queries have %s; rebuild it", index.d, vec.shape[1])
+        return list(lexical or [])
+
+    scores, ids = index.search(vec, k)
+    results: List[Dict[str, Any]] = []
+    for score, route_id in zip(scores[0], ids[0]):
+        doc = snapshot.by_id.get(f"{DOC_PREFIX}{route_id}")
+        if route_id < 0 or doc is None:
+            continue
+        results.append(_hit(doc, calibrate(float(score), snapshot.score_stats, reference), "vector"))
+    if lexical:
+        return semantic_search._fuse(results, lexical, k)
+    return results
@@ -0,0 +1,84 @@
+# src/app/services/route_shapes.py
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import orjson
+
+from src.app.core.config import settings
+
+SHAPES_PATH = settings.index_dir / "route_shapes.json"
+
+
+@dataclass(frozen=True)
+class ShapePayload:
+    body: bytes
+    etag: str
+
+
+@dataclass(frozen=True)
+class _ShapeCache:
+    stamp: Tuple[int, int]
+    version: str
+    # (route_id, direction_id or None, tolerance or None) -> serialized response
+    payloads: Dict[Tuple[str, Optional[str], Optional[str]], ShapePayload]
+
+
+_cache: Optional[_ShapeCache] = None
+
+
+def _payload(body: Dict[str, object], version: str) -> ShapePayload:
+    raw = orjson.dumps(body)
+    digest = hashlib.sha1(raw).hexdigest()[:16]
+    return ShapePayload(body=raw, etag=f'"{version}-{digest}"')
+
+
+def _load(stamp: Tuple[int, int]) -> _ShapeCache:
+    doc = orjson.loads(SHAPES_PATH.read_bytes())
+    version = str(doc.get("version") or "")
+    payloads: Dict[Tuple[str, Optional[str], Optional[str]], ShapePayload] = {}
+
+    for route_id, directions in (doc.get("routes") or {}).items():
+        payloads[(route_id, None, None)] = _payload(
+            {"route_id": route_id, "version": version, "directions": directions}, version
+        )
+        for direction_id, shape in directions.items():
+            payloads[(route_id, direction_id, None)] = _payload(
+                {"route_id": route_id, "version": version, "directions": {direction_id: shape}}, version
+            )
+            for tolerance, level in (shape.get("levels") or {}).items():
+                only_level = {**shape, "levels": {tolerance: level}}
+                payloads[(route_id, direction_id, tolerance)] = _payload(
+                    {"route_id": route_id, "version": version, "directions": {direction_id: only_level}},
+                    version,
+                )
+    return _ShapeCache(stamp=stamp, version=version, payloads=payloads)
+
+
+def _current() -> Optional[_ShapeCache]:
+    """Serialized shapes for the build on disk, reloaded when the file is replaced."""
+    global _cache
+    try:
+        stat = SHAPES_PATH.stat()
+    except FileNotFoundError:
+        return None
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    if _cache is None or _cache.stamp != stamp:
+        _cache = _load(stamp)
+    return _cache
+
+
+def get_route_shape(
+    route_id: str,
+    direction_id: Optional[str] = None,
+    tolerance_m: Optional[str] = None,
+) -> Optional[ShapePayload]:
+    """Precomputed encoded-polyline payload for a route, optionally narrowed down."""
+    cache = _current()
+    if cache is None:
+        return None
+    if tolerance_m is not None and direction_id is None:
+        return None
+    return cache.payloads.get((route_id, direction_id, tolerance_m))
@@ -1,73 +1,359 @@
 from __future__ import annotations
 
+import asyncio
+import math
+from dataclasses import dataclass
 from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Protocol, Sequence, Set, Tuple
 
 import faiss
 import numpy as np
 import orjson
-from sentence_transformers import SentenceTransformer
 
 from src.app.core.config import settings
+from src.app.services import lexical_index
+from src.app.services.embedding_batcher import EmbeddingBatcher
+from src.app.services.index_store import IndexStore, read_index_mmap, selector_params
 
-INDEX_PATH = settings.index_dir / "semantic.faiss"
-META_PATH = settings.index_dir / "semantic_meta.json"
+# Files of indexes built before manifests; newer builds are found through semantic_manifest.json.
+LEGACY_FILES = {
+    "index": settings.index_dir / "semantic.faiss",
+    "meta": settings.index_dir / "semantic_meta.json",
+    "lexicon": settings.index_dir / "semantic_lexicon.json",
+}
+ONNX_DIR = settings.index_dir / "onnx"
 
 
-def _load_meta() -> Dict[str, Dict[str, Any]]:
-    if not META_PATH.exists():
-        return {}
-    raw = orjson.loads(META_PATH.read_bytes())
-    return {doc["doc_id"]: doc for doc in raw.get("documents", [])}
+class _Encoder(Protocol):
+    def encode(self, sentences: List[str], batch_size: int, normalize_embeddings: bool) -> np.ndarray: ...
 
 
-@lru_cache(maxsize=1)
-def _meta_cache() -> Dict[str, Dict[str, Any]]:
-    return _load_meta()
+@dataclass(frozen=True)
+class SearchFilter:
+    """Restricts semantic search to matching documents; unset fields match everything."""
 
+    # Campus as written in the semantic overlay ("Busch"), compared case-insensitively
+    campus: Optional[str] = None
+    # (min_lat, min_lon, max_lat, max_lon); landmarks sit at the centroid of their nearby stops
+    bbox: Optional[Tuple[float, float, float, float]] = None
+    # Document types, e.g. ("stop", "landmark")
+    types: Optional[Tuple[str, ...]] = None
 
-@lru_cache(maxsize=1)
-def _index_cache() -> faiss.Index:
-    if not INDEX_PATH.exists():
-        raise FileNotFoundError(f"Semantic index missing at {INDEX_PATH}")
-    return faiss.read_index(str(INDEX_PATH))
+    @classmethod
+    def around(cls, lat: float, lon: float, radius_m: float, **fields: Any) -> "SearchFilter":
+        dlat = radius_m / 111_320
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        return cls(bbox=(lat - dlat, lon - dlon, lat + dlat, lon + dlon), **fields)
+
+
+@dataclass(frozen=True)
+class _Columns:
+    """Per-row metadata as arrays, so a filter is a few vectorized comparisons."""
+
+    types: np.ndarray
+    campus: np.ndarray
+    lat: np.ndarray
+    lon: np.ndarray
+    campus_names: Tuple[str, ...]
+    # Share of stop documents with a campus; the overlay only covers some stops
+    campus_coverage: float
+
+
+def _columns(rows: Sequence[Dict[str, Any]]) -> _Columns:
+    coords: Dict[str, Tuple[float, float]] = {}
+    for doc in rows:
+        meta = doc.get("metadata") or {}
+        if meta.get("type") == "stop" and meta.get("lat") is not None and meta.get("lon") is not None:
+            coords[str(meta["stop_id"])] = (float(meta["lat"]), float(meta["lon"]))
+    lat = np.full(len(rows), np.nan)
+    lon = np.full(len(rows), np.nan)
+    for row, doc in enumerate(rows):
+        meta = doc.get("metadata") or {}
+        if meta.get("type") == "stop":
+            point = coords.get(str(meta.get("stop_id")))
+            points = [point] if point else []
+        else:
+            points = [coords[str(s)] for s in meta.get("near_stop_ids") or [] if str(s) in coords]
+        if points:
+            lat[row] = sum(p[0] for p in points) / len(points)
+            lon[row] = sum(p[1] for p in points) / len(points)
+    types = np.array([(doc.get("metadata") or {}).get("type", "") for doc in rows], dtype=object)
+    campus = np.array([((doc.get("metadata") or {}).get("campus") or "").lower() for doc in rows], dtype=object)
+    stops = types == "stop"
+    return _Columns(
+        types=types,
+        campus=campus,
+        lat=lat,
+        lon=lon,
+        campus_names=tuple(sorted({(doc.get("metadata") or {}).get("campus") for doc in rows} - {None, ""})),
+        campus_coverage=float(np.mean(campus[stops] != "")) if stops.any() else 0.0,
+    )
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    """One published version of the semantic index; never mutated once loaded."""
+
+    index: Optional[faiss.Index]
+    # Documents in FAISS row order
+    rows: List[Dict[str, Any]]
+    by_id: Dict[str, Dict[str, Any]]
+    # doc_id -> FAISS row
+    row_of: Dict[str, int]
+    columns: _Columns
+    lexical: lexical_index.LexicalIndex
+    # Mean and std of the best score probe queries got at build time; other indexes calibrate to it.
+    score_stats: Optional[Dict[str, float]]
+
+
+def _load_snapshot(index_dir: Path, manifest: Optional[Dict[str, Any]]) -> _Snapshot:
+    if manifest is None:
+        files = dict(LEGACY_FILES)
+    else:
+        files = {role: index_dir / name for role, name in manifest["files"].items()}
+        # A published version must be complete; a missing file keeps the previous one serving.
+        missing = [str(files[role]) for role in ("index", "meta") if not files[role].exists()]
+        if missing:
+            raise FileNotFoundError(f"Semantic index {manifest['version']} is missing {', '.join(missing)}")
+
+    meta_path = files["meta"]
+    rows: List[Dict[str, Any]] = []
+    if meta_path.exists():
+        rows = list(orjson.loads(meta_path.read_bytes()).get("documents", []))
+
+    index = read_index_mmap(files["index"]) if files["index"].exists() else None
+    if index is not None and index.ntotal != len(rows):
+        raise ValueError(f"Semantic index has {index.ntotal} vectors but {len(rows)} documents")
+
+    lexicon_path = files.get("lexicon")
+    if lexicon_path is not None and lexicon_path.exists():
+        raw = orjson.loads(lexicon_path.read_bytes())
+        entries = [
+            (str(e["phrase"]), str(e["doc_id"]), float(e.get("weight", 1.0)))
+            for e in raw.get("entries", [])
+        ]
+    else:
+        # Index built before the lexicon existed: official names only.
+        entries = lexical_index.build_entries(rows)
+
+    return _Snapshot(
+        index=index,
+        rows=rows,
+        by_id={doc["doc_id"]: doc for doc in rows},
+        row_of={doc["doc_id"]: row for row, doc in enumerate(rows)},
+        columns=_columns(rows),
+        lexical=lexical_index.LexicalIndex(entries),
+        score_stats=(manifest or {}).get("score_stats"),
+    )
+
+
+_store: IndexStore[_Snapshot] = IndexStore("semantic", _load_snapshot)
 
 
 @lru_cache(maxsize=1)
-def _model_cache() -> SentenceTransformer:
+def _model_cache() -> _Encoder:
+    # Imported here so a worker only pays for the backend it uses (torch alone is hundreds of MB).
+    if settings.embedding_backend == "onnx":
+        from src.app.services.onnx_encoder import OnnxEncoder
+
+        return OnnxEncoder(ONNX_DIR, threads=settings.onnx_threads)
+    from sentence_transformers import SentenceTransformer
+
     return SentenceTransformer(settings.sbert_model)
 
 
-def _embed_query(text: str) -> np.ndarray:
+def embed_queries(texts: Sequence[str]) -> np.ndarray:
+    """Normalized (n, dim) float32 embeddings of queries, encoded as one batch."""
     model = _model_cache()
-    embedding = model.encode([text], normalize_embeddings=True).astype("float32")
-    return embedding
+    return model.encode(
+        list(texts),
+        batch_size=max(len(texts), 1),
+        normalize_embeddings=True,
+    ).astype("float32")
+
+
+def embed_query(text: str) -> np.ndarray:
+    """Normalized (1, dim) float32 embedding of a query, encoded on the calling thread."""
+    return embed_queries([text])
+
+
+embedding_batcher = EmbeddingBatcher(
+    embed_queries,
+    max_batch=settings.embed_batch_max_size,
+    max_wait_ms=settings.embed_batch_max_wait_ms,
+)
+
+
+async def embed_query_async(text: str) -> np.ndarray:
+    """embed_query() for request handlers: batched with concurrent queries, off the event loop."""
+    if settings.embed_batching_enabled:
+        return await embedding_batcher.embed(text)
+    return await asyncio.to_thread(embed_query, text)
+
+
+def score_stats() -> Optional[Dict[str, float]]:
+    return _store.get().score_stats
+
+
+def _filter_mask(snapshot: _Snapshot, filters: SearchFilter) -> np.ndarray:
+    """Boolean mask over FAISS rows of the documents ``filters`` keeps."""
+    cols = snapshot.columns
+    mask = np.ones(len(snapshot.rows), dtype=bool)
+    if filters.types is not None:
+        mask &= np.isin(cols.types, list(filters.types))
+    if filters.campus is not None:
+        # Documents without a campus are kept: most stops have none in the overlay.
+        mask &= (cols.campus == filters.campus.lower()) | (cols.campus == "")
+    if filters.bbox is not None:
+        min_lat, min_lon, max_lat, max_lon = filters.bbox
+        # NaN coordinates compare False, so documents without a location drop out.
+        mask &= (cols.lat >= min_lat) & (cols.lat <= max_lat) & (cols.lon >= min_lon) & (cols.lon <= max_lon)
+    return mask
 
 
-def search(query: str, k: int = 5) -> List[Dict[str, Any]]:
-    """Semantic search over stops/landmarks; returns docs with metadata."""
+def campuses() -> List[str]:
+    """Campus names present in the index, as written in the overlay."""
+    return list(_store.get().columns.campus_names)
+
+
+def stop_ids() -> Set[str]:
+    """Ids of the stops in the index."""
+    return {
+        str(doc["metadata"]["stop_id"])
+        for doc in _store.get().rows
+        if (doc.get("metadata") or {}).get("type") == "stop"
+    }
+
+
+def campus_coverage() -> float:
+    """Share of indexed stops that have a campus."""
+    return _store.get().columns.campus_coverage
+
+
+def mentioned_campus(query: str) -> Optional[str]:
+    """The one campus the query names ("on Busch", "cook campus"), or None for zero or several.
+
+    Names like "Cook/Douglass" also match either half. Words inside a stop or landmark name the
+    query mentions ("Livingston Student Center") do not count.
+    """
+    words = lexical_index.normalize(query)
+    named = set()
+    for match in _store.get().lexical.match(query, fuzzy=False):
+        named.update(range(match.start, match.end))
+    tokens = " " + " ".join("|" if i in named else word for i, word in enumerate(words)) + " "
+    found = set()
+    for campus in campuses():
+        variants = [campus] + (campus.split("/") if "/" in campus else [])
+        if any(f" {' '.join(lexical_index.normalize(v))} " in tokens for v in variants if v.strip()):
+            found.add(campus)
+    return found.pop() if len(found) == 1 else None
+
+
+def get_document(doc_id: str) -> Dict[str, Any] | None:
+    """Return an indexed stop/landmark document by id."""
+    return _store.get().by_id.get(doc_id)
+
+
+def _hit(doc: Dict[str, Any], score: float, match: str) -> Dict[str, Any]:
+    return {
+        "score": score,
+        "doc_id": doc["doc_id"],
+        "text": doc.get("text", ""),
+        "metadata": doc.get("metadata", {}),
+        # exact / fuzzy (lexical only), vector, or fused (both fired)
+        "match": match,
+    }
+
+
+def lexical_search(query: str, k: int = 5, filters: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+    """Names, nicknames and aliases mentioned in the query, exactly or with one typo per word.
+
+    Only the ``types`` of ``filters`` apply: a stop the user names is kept whatever its campus
+    or location.
+    """
+    if not settings.lexical_search_enabled or not query.strip():
+        return []
+    snapshot = _store.get()
+    allowed = _filter_mask(snapshot, SearchFilter(types=filters.types)) if filters is not None else None
+    results: List[Dict[str, Any]] = []
+    for match in snapshot.lexical.match(query):
+        doc = snapshot.by_id.get(match.doc_id)
+        if doc is None or (allowed is not None and not allowed[snapshot.row_of[match.doc_id]]):
+            continue
+        results.append(_hit(doc, match.score, "exact" if match.exact else "fuzzy"))
+        if len(results) == k:
+            break
+    return results
+
+
+def is_exact(lexical_hits: Sequence[Dict[str, Any]]) -> bool:
+    """True when the best lexical hit is a verbatim name, so the embedding can be skipped."""
+    return bool(lexical_hits) and lexical_hits[0]["match"] == "exact" and lexical_hits[0]["score"] >= 1.0
+
+
+def _fuse(
+    vector_hits: List[Dict[str, Any]],
+    lexical_hits: Sequence[Dict[str, Any]],
+    k: int,
+) -> List[Dict[str, Any]]:
+    """Noisy-OR of the two scores: either signal alone keeps its score, agreement raises it."""
+    fused: Dict[str, Dict[str, Any]] = {hit["doc_id"]: hit for hit in vector_hits}
+    for lex in lexical_hits:
+        vec = fused.get(lex["doc_id"])
+        if vec is None:
+            fused[lex["doc_id"]] = lex
+            continue
+        score = 1.0 - (1.0 - max(vec["score"], 0.0)) * (1.0 - lex["score"])
+        fused[lex["doc_id"]] = {**vec, "score": score, "match": "fused"}
+    return sorted(fused.values(), key=lambda hit: -hit["score"])[:k]
+
+
+def search(query: str, k: int = 5, filters: Optional[SearchFilter] = None) -> List[Dict[str, Any]]:
+    """Semantic search over stops/landmarks; returns docs with metadata.
+
+    Verbatim mentions of a name or alias are answered from the lexical index without embedding.
+    With ``filters``, all vector results come from matching documents; named ones are always kept.
+    """
     if not query.strip():
         return []
+    lexical = lexical_search(query, k, filters)
+    if is_exact(lexical):
+        return lexical
+    return search_vector(embed_query(query), k, lexical, filters)
 
-    index = _index_cache()
-    meta = _meta_cache()
 
-    vec = _embed_query(query)
-    scores, ids = index.search(vec, k)
+def search_vector(
+    vec: np.ndarray,
+    k: int = 5,
+    lexical: Optional[Sequence[Dict[str, Any]]] = None,
+    filters: Optional[SearchFilter] = None,
+) -> List[Dict[str, Any]]:
+    """Semantic search with an embedding from embed_query(), fused with lexical hits if given.
+
+    ``filters`` are applied inside the FAISS search through an ID selector, so non-matching
+    documents never take one of the k slots.
+    """
+    snapshot = _store.get()
+    if snapshot.index is None:
+        raise FileNotFoundError(f"Semantic index missing in {settings.index_dir}")
+    rows = snapshot.rows
+
+    params = None
+    if filters is not None:
+        allowed = np.flatnonzero(_filter_mask(snapshot, filters)).astype("int64")
+        if allowed.size == 0:
+            return list(lexical or [])
+        if allowed.size < len(rows):
+            selector = faiss.IDSelectorBatch(allowed)
+            params = selector_params(snapshot.index, selector)
+    scores, ids = snapshot.index.search(vec, k, params=params)
 
     results: List[Dict[str, Any]] = []
-    for score, doc_id in zip(scores[0], ids[0]):
-        doc = meta.get(str(doc_id))
-        if not doc:
+    for score, row in zip(scores[0], ids[0]):
+        if row < 0 or row >= len(rows):
             continue
-        results.append(
-            {
-                "score": float(score),
-                "doc_id": doc["doc_id"],
-                "text": doc.get("text", ""),
-                "metadata": doc.get("metadata", {}),
-            }
-        )
+        results.append(_hit(rows[row], float(score), "vector"))
+    if lexical:
+        return _fuse(results, lexical, k)
     return results
-
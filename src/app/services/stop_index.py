@@ -0,0 +1,193 @@
+# src/app/services/stop_index.py
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.app.core.config import settings
+from src.app.services import gtfs_static
+from src.app.services.gtfs_static import StaticFeed
+
+_SPATIAL_KEY = "stop_grid"
+_EARTH_RADIUS_M = 6_371_000.0
+
+
+@dataclass(frozen=True)
+class NearbyStop:
+    stop: int
+    distance_m: float
+
+
+@dataclass(frozen=True)
+class StopGrid:
+    """Uniform grid over an equirectangular projection of the stops, in meters."""
+
+    cell_m: float
+    lat0: float
+    lon0: float
+    cos_lat0: float
+    cells: Dict[Tuple[int, int], np.ndarray]
+    # Projected x/y of every stop; NaN for stops without coordinates.
+    xs: np.ndarray
+    ys: np.ndarray
+    # Occupied cell bounds (min_x, min_y, max_x, max_y).
+    bounds: Tuple[int, int, int, int]
+
+    def project(self, lat: float, lon: float) -> Tuple[float, float]:
+        x = math.radians(lon - self.lon0) * self.cos_lat0 * _EARTH_RADIUS_M
+        y = math.radians(lat - self.lat0) * _EARTH_RADIUS_M
+        return x, y
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int(math.floor(x / self.cell_m)), int(math.floor(y / self.cell_m))
+
+    def _max_ring(self, cx: int, cy: int) -> int:
+        min_x, min_y, max_x, max_y = self.bounds
+        return max(abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y))
+
+    def _ring(self, cx: int, cy: int, ring: int) -> List[np.ndarray]:
+        if ring == 0:
+            bucket = self.cells.get((cx, cy))
+            return [bucket] if bucket is not None else []
+        found: List[np.ndarray] = []
+        for dx in range(-ring, ring + 1):
+            for dy in (-ring, ring):
+                bucket = self.cells.get((cx + dx, cy + dy))
+                if bucket is not None:
+                    found.append(bucket)
+        for dy in range(-ring + 1, ring):
+            for dx in (-ring, ring):
+                bucket = self.cells.get((cx + dx, cy + dy))
+                if bucket is not None:
+                    found.append(bucket)
+        return found
+
+    def _distances(self, x: float, y: float, stops: np.ndarray) -> np.ndarray:
+        return np.hypot(self.xs[stops] - x, self.ys[stops] - y)
+
+    def _all_stops(self) -> np.ndarray:
+        return np.concatenate(list(self.cells.values()))
+
+    def nearest(self, lat: float, lon: float, k: int, max_distance_m: Optional[float] = None) -> List[NearbyStop]:
+        """k nearest stops, expanding rings of cells until no closer stop can exist."""
+        if k <= 0 or not self.cells:
+            return []
+        x, y = self.project(lat, lon)
+        cx, cy = self._cell(x, y)
+        limit = max_distance_m if max_distance_m is not None else float("inf")
+
+        candidates: List[np.ndarray] = []
+        count = 0
+        for ring in range(self._max_ring(cx, cy) + 1):
+            if 8 * ring > len(self.cells):
+                # Far from the stops, walking rings costs more than scanning every stop.
+                candidates = [self._all_stops()]
+                break
+            buckets = self._ring(cx, cy, ring)
+            candidates.extend(buckets)
+            count += sum(len(b) for b in buckets)
+            # Everything outside ring r is at least r * cell_m away from the query point.
+            reach = ring * self.cell_m
+            if reach > limit:
+                break
+            if count >= k:
+                stops = np.concatenate(candidates)
+                dist = self._distances(x, y, stops)
+                kth = np.partition(dist, k - 1)[k - 1]
+                if kth <= reach:
+                    break
+        if not candidates:
+            return []
+
+        stops = np.concatenate(candidates)
+        dist = self._distances(x, y, stops)
+        order = np.argsort(dist, kind="stable")[:k]
+        return [
+            NearbyStop(stop=int(stops[i]), distance_m=float(dist[i]))
+            for i in order
+            if dist[i] <= limit
+        ]
+
+    def within(self, lat: float, lon: float, radius_m: float) -> List[NearbyStop]:
+        """All stops within radius_m, nearest first."""
+        if not self.cells:
+            return []
+        x, y = self.project(lat, lon)
+        cx, cy = self._cell(x, y)
+        rings = min(self._max_ring(cx, cy), int(math.ceil(radius_m / self.cell_m)))
+        if 4 * rings * (rings + 1) > len(self.cells):
+            candidates = [self._all_stops()]
+        else:
+            candidates = [b for ring in range(rings + 1) for b in self._ring(cx, cy, ring)]
+        if not candidates:
+            return []
+        stops = np.concatenate(candidates)
+        dist = self._distances(x, y, stops)
+        keep = np.flatnonzero(dist <= radius_m)
+        keep = keep[np.argsort(dist[keep], kind="stable")]
+        return [NearbyStop(stop=int(stops[i]), distance_m=float(dist[i])) for i in keep]
+
+
+def build_stop_grid(feed: StaticFeed) -> StopGrid:
+    cell_m = float(settings.stop_grid_cell_m)
+    valid = ~(np.isnan(feed.stop_lat) | np.isnan(feed.stop_lon))
+    if not valid.any():
+        empty = np.full(len(feed.stop_ids), np.nan)
+        return StopGrid(cell_m, 0.0, 0.0, 1.0, {}, empty, empty, (0, 0, 0, 0))
+
+    lat0 = float(np.mean(feed.stop_lat[valid]))
+    lon0 = float(np.mean(feed.stop_lon[valid]))
+    cos_lat0 = math.cos(math.radians(lat0))
+    xs = np.radians(feed.stop_lon - lon0) * cos_lat0 * _EARTH_RADIUS_M
+    ys = np.radians(feed.stop_lat - lat0) * _EARTH_RADIUS_M
+
+    valid_idx = np.flatnonzero(valid)
+    gx = np.floor(xs[valid_idx] / cell_m).astype(np.int64)
+    gy = np.floor(ys[valid_idx] / cell_m).astype(np.int64)
+    buckets: Dict[Tuple[int, int], List[int]] = {}
+    for stop, cx, cy in zip(valid_idx, gx, gy):
+        buckets.setdefault((int(cx), int(cy)), []).append(int(stop))
+
+    return StopGrid(
+        cell_m=cell_m,
+        lat0=lat0,
+        lon0=lon0,
+        cos_lat0=cos_lat0,
+        cells={key: np.asarray(stops, dtype=np.int32) for key, stops in buckets.items()},
+        xs=xs,
+        ys=ys,
+        bounds=(int(gx.min()), int(gy.min()), int(gx.max()), int(gy.max())),
+    )
+
+
+def get_stop_grid(feed: StaticFeed) -> StopGrid:
+    return feed.derived(_SPATIAL_KEY, build_stop_grid)
+
+
+gtfs_static.warm_on_load(_SPATIAL_KEY, build_stop_grid)
+
+
+def nearest_stops(
+    lat: float,
+    lon: float,
+    k: int = 5,
+    max_distance_m: Optional[float] = None,
+) -> List[Dict[str, object]]:
+    """Closest stops to a coordinate from the current snapshot, as plain dicts."""
+    feed = gtfs_static.current_feed()
+    if feed is None:
+        return []
+    hits = get_stop_grid(feed).nearest(lat, lon, k, max_distance_m)
+    return [
+        {
+            "stop_id": feed.stop_ids[hit.stop],
+            "stop_name": feed.stop_names[hit.stop],
+            "lat": float(feed.stop_lat[hit.stop]),
+            "lon": float(feed.stop_lon[hit.stop]),
+            "distance_m": round(hit.distance_m, 1),
+        }
+        for hit in hits
+    ]
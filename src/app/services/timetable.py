@@ -0,0 +1,123 @@
+# src/app/services/timetable.py
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import numpy as np
+
+from src.app.services import gtfs_static
+from src.app.services.gtfs_static import StaticFeed, agency_tz, service_day_start
+
+_TIMETABLE_KEY = "timetable"
+
+
+@dataclass(frozen=True)
+class StopTimetable:
+    """Departures at one stop across all trips, sorted by departure time."""
+
+    departures: np.ndarray
+    arrivals: np.ndarray
+    trips: np.ndarray
+    services: np.ndarray
+    sequences: np.ndarray
+
+
+@dataclass(frozen=True)
+class Timetable:
+    by_stop: Dict[int, StopTimetable]
+    # Latest departure in the feed; trips this far past midnight still belong to an earlier service day.
+    max_departure: int
+
+
+@dataclass(frozen=True)
+class ScheduledDeparture:
+    trip_id: str
+    route_id: str
+    stop_sequence: int
+    arrival: int
+    departure: int
+    headsign: str
+
+
+def build_timetable(feed: StaticFeed) -> Timetable:
+    if len(feed.st_stop) == 0:
+        return Timetable(by_stop={}, max_departure=0)
+
+    order = np.lexsort((feed.st_departure, feed.st_stop))
+    stops = feed.st_stop[order]
+    boundaries = np.flatnonzero(np.diff(stops)) + 1
+    starts = np.concatenate(([0], boundaries))
+    ends = np.concatenate((boundaries, [len(stops)]))
+
+    by_stop: Dict[int, StopTimetable] = {}
+    for start, end in zip(starts, ends):
+        rows = order[start:end]
+        trips = feed.st_trip[rows]
+        by_stop[int(stops[start])] = StopTimetable(
+            departures=feed.st_departure[rows],
+            arrivals=feed.st_arrival[rows],
+            trips=trips,
+            services=feed.trip_service[trips],
+            sequences=feed.st_sequence[rows],
+        )
+    return Timetable(by_stop=by_stop, max_departure=int(feed.st_departure.max()))
+
+
+def get_timetable(feed: StaticFeed) -> Timetable:
+    return feed.derived(_TIMETABLE_KEY, build_timetable)
+
+
+gtfs_static.warm_on_load(_TIMETABLE_KEY, build_timetable)
+
+
+def next_departures(
+    feed: StaticFeed,
+    stop_id: str,
+    now_sec: int,
+    limit: int,
+    horizon_sec: int,
+) -> List[ScheduledDeparture]:
+    """Return the next scheduled departures at a stop within the horizon."""
+    stop = feed.stop_index.get(stop_id)
+    if stop is None or limit <= 0:
+        return []
+    timetable = get_timetable(feed)
+    entries = timetable.by_stop.get(stop)
+    if entries is None:
+        return []
+
+    end_sec = now_sec + horizon_sec
+    tz = agency_tz()
+    first_day = (datetime.fromtimestamp(now_sec - timetable.max_departure, tz) - timedelta(hours=12)).date()
+    last_day = datetime.fromtimestamp(end_sec, tz).date()
+
+    found: List[tuple[int, int, int]] = []
+    day = first_day
+    while day <= last_day:
+        day_start = service_day_start(day)
+        lo = int(np.searchsorted(entries.departures, now_sec - day_start, side="left"))
+        hi = int(np.searchsorted(entries.departures, end_sec - day_start, side="right"))
+        if lo < hi:
+            active = feed.active_services(day)[entries.services[lo:hi]]
+            for offset in np.flatnonzero(active)[:limit]:
+                found.append((day_start + int(entries.departures[lo + offset]), day_start, lo + int(offset)))
+        day += timedelta(days=1)
+
+    found.sort()
+    departures: List[ScheduledDeparture] = []
+    for departure, day_start, pos in found[:limit]:
+        trip = int(entries.trips[pos])
+        route = int(feed.trip_route[trip])
+        departures.append(
+            ScheduledDeparture(
+                trip_id=feed.trip_ids[trip],
+                route_id=feed.route_ids[route] if route >= 0 else "",
+                stop_sequence=int(entries.sequences[pos]),
+                arrival=day_start + int(entries.arrivals[pos]),
+                departure=departure,
+                headsign=feed.trip_destination(trip),
+            )
+        )
+    return departures
@@ -12,11 +12,13 @@ from sqlalchemy import text
 
 from src.app.core.config import settings
 from src.app.db.session import get_session
+from src.app.services import gtfs_static, timetable
 from src.app.schemas.transit import (
     ActiveRoute,
     ArrivalItem,
     AlertsResponse,
     Vehicle,
+    VehicleProgress,
     WidgetArrival,
     WidgetStop,
 )
@@ -26,6 +28,8 @@ JSONDict = Dict[str, Any]
 DEFAULT_ROUTE_COLOR = "#666666"
 ARRIVAL_LOOKBACK_SECONDS = 3600
 _STALE_TTL_FRACTION = 4
+SOURCE_LIVE = "live"
+SOURCE_SCHEDULED = "scheduled"
 
 
 # ---------------------------------------------------------------------------
@@ -182,6 +186,7 @@ def _deserialize_arrival(payload: bytes, score: Any, now_sec: int) -> JSONDict |
         return None
     if not _populate_arrival_fields(doc, now_sec, score):
         return None
+    doc.setdefault("source", SOURCE_LIVE)
     return doc
 
 
@@ -237,6 +242,7 @@ def _build_arrival_item(doc: JSONDict, route_id: str) -> ArrivalItem:
         "departure": _coerce_int(doc.get("departure")),
         "delay_s": _coerce_int(doc.get("delay_s") or doc.get("delay")),
         "eta_seconds": _coerce_int(doc.get("eta_seconds")),
+        "source": doc.get("source") or SOURCE_LIVE,
     }
     return ArrivalItem(**payload)
 
@@ -257,6 +263,11 @@ def _build_vehicle(doc: JSONDict, route_id: Optional[str]) -> Vehicle | None:
         "updated_at": _coerce_int(doc.get("updated_at")),
         "ingested_at_ms": _coerce_int(doc.get("ingested_at_ms")),
     }
+    progress = doc.get("progress")
+    if isinstance(progress, dict):
+        payload["progress"] = VehicleProgress(
+            **{k: v for k, v in progress.items() if k in VehicleProgress.model_fields}
+        )
     return Vehicle(**payload)
 
 
@@ -264,7 +275,11 @@ def _route_id_for_doc(doc: JSONDict, trip_map: Dict[str, str]) -> Optional[str]:
     trip_id = _ensure_str(doc.get("trip_id"))
     if not trip_id:
         return None
-    return trip_map.get(trip_id)
+    route_id = trip_map.get(trip_id)
+    if route_id is None and doc.get("source") == SOURCE_SCHEDULED:
+        # Scheduled docs come from the static feed, so their route_id is already canonical.
+        return _ensure_str(doc.get("route_id"))
+    return route_id
 
 
 def _default_route_meta(route_id: str) -> Dict[str, str]:
@@ -277,10 +292,63 @@ def _build_widget_arrival(doc: JSONDict, route_meta: Dict[str, str]) -> WidgetAr
         eta_seconds=eta_seconds,
         route_long_name=route_meta.get("route_long_name", ""),
         route_color=route_meta.get("route_color", DEFAULT_ROUTE_COLOR),
-        to="TBD",
+        to=_ensure_str(doc.get("headsign")) or "TBD",
+        source=doc.get("source") or SOURCE_LIVE,
     )
 
 
+def _scheduled_arrival_docs(
+    stop_ids: List[str],
+    now_sec: int,
+    horizon_sec: int,
+    per_stop_limit: int,
+) -> Dict[str, List[JSONDict]]:
+    """Next scheduled departures per stop, shaped like cached arrival documents."""
+    feed = gtfs_static.current_feed()
+    if feed is None or not settings.schedule_fallback_enabled:
+        return {}
+
+    per_stop: Dict[str, List[JSONDict]] = {}
+    for stop_id in stop_ids:
+        departures = timetable.next_departures(feed, stop_id, now_sec, per_stop_limit, horizon_sec)
+        per_stop[stop_id] = [
+            {
+                "trip_id": dep.trip_id,
+                "route_id": dep.route_id,
+                "stop_sequence": dep.stop_sequence,
+                "arrival": dep.arrival,
+                "departure": dep.departure,
+                "eta_seconds": max(0, dep.arrival - now_sec),
+                "headsign": dep.headsign,
+                "source": SOURCE_SCHEDULED,
+            }
+            for dep in departures
+        ]
+    return per_stop
+
+
+def _merge_with_schedule(
+    live: List[JSONDict],
+    scheduled: List[JSONDict],
+    feed_stale: bool,
+    limit: int,
+) -> List[JSONDict]:
+    """Fill gaps in realtime arrivals with scheduled trips that have no live prediction."""
+    if not scheduled:
+        return live
+
+    live_trips = _trip_ids_from_docs(live)
+    fill = [doc for doc in scheduled if doc.get("trip_id") not in live_trips]
+    if live and not feed_stale:
+        # Trip updates usually cover only the next few trips; trust them up to their last prediction.
+        last_live = max(_coerce_int(doc.get("arrival")) or 0 for doc in live)
+        fill = [doc for doc in fill if (_coerce_int(doc.get("arrival")) or 0) > last_live]
+
+    merged = live + fill
+    merged.sort(key=lambda item: item.get("eta_seconds", float("inf")))
+    return merged[:limit]
+
+
 # ---------------------------------------------------------------------------
 # Helpers: database lookups
 # ---------------------------------------------------------------------------
@@ -458,17 +526,44 @@ async def _load_vehicle_documents(r: redis.Redis) -> List[JSONDict]:
         if not vehicle_id:
             continue
         pipeline.get(f"{prefix}:vehicle:{vehicle_id}")
+        pipeline.get(f"{prefix}:vehicle:{vehicle_id}:progress")
 
     payloads = await pipeline.execute()
     documents: List[JSONDict] = []
-    for payload in payloads:
+    for payload, progress in zip(payloads[::2], payloads[1::2]):
         doc = _decode_json_bytes(payload)
         if doc:
+            doc["progress"] = _decode_json_bytes(progress)
             documents.append(doc)
 
     return documents
 
 
+async def _trip_destinations(r: redis.Redis, trip_ids: Set[str]) -> Dict[str, str]:
+    """Headsign per trip from map-matched vehicles, falling back to the static feed."""
+    if not trip_ids:
+        return {}
+    ordered = sorted(trip_ids)
+    payloads = await r.hmget(f"{settings.redis_key_prefix}:trips:progress", ordered)
+
+    destinations: Dict[str, str] = {}
+    for trip_id, payload in zip(ordered, payloads):
+        progress = _decode_json_bytes(payload)
+        headsign = _ensure_str(progress.get("headsign")) if progress else None
+        if headsign:
+            destinations[trip_id] = headsign
+
+    feed = gtfs_static.current_feed()
+    if feed is not None:
+        for trip_id in trip_ids - destinations.keys():
+            trip = feed.trip_index.get(trip_id)
+            if trip is not None:
+                destination = feed.trip_destination(trip)
+                if destination:
+                    destinations[trip_id] = destination
+    return destinations
+
+
 async def _build_route_stops_map(route_ids: Set[str]) -> Dict[str, List[str]]:
     tasks = {
         route_id: asyncio.create_task(_fetch_representative_trip_stop_names(route_id))
@@ -505,8 +600,21 @@ async def get_stop_arrivals(
     horizon_sec: int,
 ) -> Tuple[List[ArrivalItem], bool]:
     """Return arrivals for a single stop along with staleness info."""
-    per_stop_docs, _ = await _load_arrival_documents(r, [stop_id], horizon_sec, limit)
-    docs = per_stop_docs.get(stop_id, [])
+    per_stop_docs, now_sec = await _load_arrival_documents(r, [stop_id], horizon_sec, limit)
+    prefix = settings.redis_key_prefix
+    stale = await _is_feed_stale(
+        r,
+        f"{prefix}:trip_updates:raw",
+        settings.trip_updates_staleness_s,
+    )
+
+    scheduled = _scheduled_arrival_docs([stop_id], now_sec, horizon_sec, limit)
+    docs = _merge_with_schedule(
+        per_stop_docs.get(stop_id, []),
+        scheduled.get(stop_id, []),
+        stale,
+        limit,
+    )
     trip_map = await _trip_route_map_for_groups({stop_id: docs})
 
     arrivals: List[ArrivalItem] = []
@@ -516,12 +624,6 @@ async def get_stop_arrivals(
             continue
         arrivals.append(_build_arrival_item(doc, route_id))
 
-    prefix = settings.redis_key_prefix
-    stale = await _is_feed_stale(
-        r,
-        f"{prefix}:trip_updates:raw",
-        settings.trip_updates_staleness_s,
-    )
     return arrivals, stale
 
 
@@ -554,10 +656,14 @@ async def get_route_vehicles(
 async def get_vehicle(r: redis.Redis, vehicle_id: str) -> Vehicle | None:
     """Return a single vehicle enriched with its route, if available."""
     prefix = settings.redis_key_prefix
-    payload = await r.get(f"{prefix}:vehicle:{vehicle_id}")
+    payload, progress = await r.mget(
+        f"{prefix}:vehicle:{vehicle_id}",
+        f"{prefix}:vehicle:{vehicle_id}:progress",
+    )
     doc = _decode_json_bytes(payload)
     if not doc:
         return None
+    doc["progress"] = _decode_json_bytes(progress)
 
     trip_id = _ensure_str(doc.get("trip_id"))
     route_id: Optional[str] = None
@@ -620,6 +726,39 @@ async def get_active_routes(r: redis.Redis) -> List[ActiveRoute]:
     return routes
 
 
+async def get_trip_delays(r: redis.Redis, stop_ids: List[str], until: Optional[int] = None) -> Dict[str, int]:
+    """Return trip_id -> delay_s from the nearest cached prediction of each trip.
+
+    Only predictions at ``stop_ids`` between now and ``until`` (unix seconds) are read.
+    """
+    if not stop_ids:
+        return {}
+
+    prefix = settings.redis_key_prefix
+    now_sec = _now_seconds()
+    pipeline = r.pipeline()
+    for stop_id in stop_ids:
+        pipeline.zrangebyscore(
+            f"{prefix}:stop:{stop_id}:arrivals", now_sec, "+inf" if until is None else until, withscores=True
+        )
+    results = await pipeline.execute()
+
+    nearest: Dict[str, Tuple[int, int]] = {}
+    for rows in results:
+        for payload, score in rows or []:
+            doc = _decode_json_bytes(payload)
+            if not doc:
+                continue
+            trip_id = _ensure_str(doc.get("trip_id"))
+            delay = _coerce_int(doc.get("delay_s") or doc.get("delay"))
+            when = _coerce_int(score)
+            if not trip_id or delay is None or when is None:
+                continue
+            if trip_id not in nearest or when < nearest[trip_id][0]:
+                nearest[trip_id] = (when, delay)
+    return {trip_id: delay for trip_id, (_, delay) in nearest.items()}
+
+
 async def get_arrivals_widget(
     r: redis.Redis,
     stop_ids: List[str],
@@ -627,7 +766,21 @@ async def get_arrivals_widget(
     per_stop_limit: int = 30,
 ) -> List[WidgetStop]:
     """Return widget-ready arrivals for multiple stops."""
-    per_stop_docs, _ = await _load_arrival_documents(r, stop_ids, horizon_sec, per_stop_limit)
+    per_stop_docs, now_sec = await _load_arrival_documents(r, stop_ids, horizon_sec, per_stop_limit)
+    stale = await _is_feed_stale(
+        r,
+        f"{settings.redis_key_prefix}:trip_updates:raw",
+        settings.trip_updates_staleness_s,
+    )
+
+    scheduled = _scheduled_arrival_docs(stop_ids, now_sec, horizon_sec, per_stop_limit)
+    for stop_id in stop_ids:
+        per_stop_docs[stop_id] = _merge_with_schedule(
+            per_stop_docs.get(stop_id, []),
+            scheduled.get(stop_id, []),
+            stale,
+            per_stop_limit,
+        )
     trip_map = await _trip_route_map_for_groups(per_stop_docs)
 
     route_ids: Set[str] = set()
@@ -637,9 +790,18 @@ async def get_arrivals_widget(
             if mapped_route:
                 route_ids.add(mapped_route)
 
+    live_trip_ids: Set[str] = set()
+    for docs in per_stop_docs.values():
+        live_trip_ids.update(
+            _trip_ids_from_docs([doc for doc in docs if doc.get("source") != SOURCE_SCHEDULED])
+        )
+
     routes_meta_task = asyncio.create_task(_fetch_routes_metadata(route_ids))
     stop_names_task = asyncio.create_task(_fetch_stop_names(set(stop_ids)))
-    routes_meta, stop_names = await asyncio.gather(routes_meta_task, stop_names_task)
+    destinations_task = asyncio.create_task(_trip_destinations(r, live_trip_ids))
+    routes_meta, stop_names, destinations = await asyncio.gather(
+        routes_meta_task, stop_names_task, destinations_task
+    )
 
     stops: List[WidgetStop] = []
     for stop_id in stop_ids:
@@ -648,6 +810,9 @@ async def get_arrivals_widget(
             route_id = _route_id_for_doc(doc, trip_map)
             if not route_id:
                 continue
+            if not doc.get("headsign"):
+                trip_id = _ensure_str(doc.get("trip_id"))
+                doc["headsign"] = destinations.get(trip_id) if trip_id else None
             route_meta = routes_meta.get(route_id) or _default_route_meta(route_id)
             arrivals.append(_build_widget_arrival(doc, route_meta))
 
@@ -1,56 +1,99 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
 
-import psycopg
+import numpy as np
 
-from src.app.core.config import settings
+from src.app.services import gtfs_static
+from src.app.services.gtfs_static import StaticFeed
 
+_STOP_ROUTES_KEY = "stop_routes"
 
-def _connect() -> psycopg.Connection:
-    return psycopg.connect(settings.dsn())
+
+@dataclass(frozen=True)
+class StopRoutes:
+    """Routes serving each stop, as CSR arrays over feed stop indices."""
+
+    # routes[offsets[s]:offsets[s + 1]] are the route indices serving stop s, in display order.
+    offsets: np.ndarray
+    routes: np.ndarray
+
+    def for_stop(self, stop: int) -> np.ndarray:
+        return self.routes[self.offsets[stop]:self.offsets[stop + 1]]
+
+
+def build_stop_routes(feed: StaticFeed) -> StopRoutes:
+    n_routes = len(feed.route_ids)
+    offsets = np.zeros(len(feed.stop_ids) + 1, dtype=np.int64)
+    if not n_routes or not len(feed.st_trip):
+        return StopRoutes(offsets=offsets, routes=np.empty(0, dtype=np.int32))
+
+    # Display order: short name (blank last), long name, route_id.
+    order = sorted(
+        range(n_routes),
+        key=lambda i: (
+            not feed.routes[i]["short_name"],
+            feed.routes[i]["short_name"],
+            feed.routes[i]["long_name"],
+            feed.route_ids[i],
+        ),
+    )
+    rank = np.empty(n_routes, dtype=np.int64)
+    rank[order] = np.arange(n_routes)
+
+    st_route = feed.trip_route[feed.st_trip]
+    valid = st_route >= 0
+    # One key per distinct (stop, route rank); np.unique sorts them by stop, then display order.
+    keys = np.unique(feed.st_stop[valid].astype(np.int64) * n_routes + rank[st_route[valid]])
+    stops = keys // n_routes
+    routes = np.asarray(order, dtype=np.int32)[keys % n_routes]
+    np.cumsum(np.bincount(stops, minlength=len(feed.stop_ids)), out=offsets[1:])
+    return StopRoutes(offsets=offsets, routes=routes)
+
+
+def get_stop_routes(feed: StaticFeed) -> StopRoutes:
+    return feed.derived(_STOP_ROUTES_KEY, build_stop_routes)
+
+
+gtfs_static.warm_on_load(_STOP_ROUTES_KEY, build_stop_routes)
+
+
+def _stop_dict(feed: StaticFeed, stop: int) -> Dict[str, object]:
+    lat, lon = float(feed.stop_lat[stop]), float(feed.stop_lon[stop])
+    return {
+        "stop_id": feed.stop_ids[stop],
+        "name": feed.stop_names[stop],
+        "lat": None if np.isnan(lat) else lat,
+        "lon": None if np.isnan(lon) else lon,
+    }
+
+
+def get_stops(stop_ids: Iterable[str]) -> Dict[str, Dict[str, object]]:
+    """Stops with the routes serving them, for every known id; one pass over the loaded snapshot."""
+    feed = gtfs_static.current_feed()
+    if feed is None:
+        return {}
+    table = get_stop_routes(feed)
+    found: Dict[str, Dict[str, object]] = {}
+    for stop_id in stop_ids:
+        stop = feed.stop_index.get(stop_id)
+        if stop is None or stop_id in found:
+            continue
+        doc = _stop_dict(feed, stop)
+        doc["routes"] = [dict(feed.routes[int(route)]) for route in table.for_stop(stop)]
+        found[stop_id] = doc
+    return found
 
 
 def get_stop(stop_id: str) -> Optional[Dict[str, object]]:
-    sql = f"""
-    SELECT stop_id, stop_name, stop_lat, stop_lon
-    FROM "{settings.gtfs_schema}".stops
-    WHERE stop_id = %s
-    """
-    with _connect() as con, con.cursor() as cur:
-        cur.execute(sql, (stop_id,))
-        row = cur.fetchone()
-        if not row:
-            return None
-        return {
-            "stop_id": row[0],
-            "name": row[1],
-            "lat": row[2],
-            "lon": row[3],
-        }
+    feed = gtfs_static.current_feed()
+    if feed is None:
+        return None
+    stop = feed.stop_index.get(stop_id)
+    return _stop_dict(feed, stop) if stop is not None else None
 
 
 def get_routes_for_stop(stop_id: str) -> List[Dict[str, object]]:
-    sql = f"""
-    SELECT DISTINCT r.route_id, r.route_short_name, r.route_long_name, r.route_color
-    FROM "{settings.gtfs_schema}".stop_times st
-    JOIN "{settings.gtfs_schema}".trips t ON t.trip_id = st.trip_id
-    JOIN "{settings.gtfs_schema}".routes r ON r.route_id = t.route_id
-    WHERE st.stop_id = %s
-    ORDER BY r.route_short_name NULLS LAST, r.route_long_name, r.route_id
-    """
-    with _connect() as con, con.cursor() as cur:
-        cur.execute(sql, (stop_id,))
-        rows = cur.fetchall()
-    routes: List[Dict[str, object]] = []
-    for row in rows:
-        routes.append(
-            {
-                "route_id": row[0],
-                "short_name": row[1],
-                "long_name": row[2],
-                "color": row[3],
-            }
-        )
-    return routes
-
+    doc = get_stops([stop_id]).get(stop_id)
+    return list(doc["routes"]) if doc else []
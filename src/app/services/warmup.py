@@ -0,0 +1,98 @@
+# src/app/services/warmup.py
+from __future__ import annotations
+
+import asyncio
+import gc
+import logging
+import time
+from typing import Any, Dict, Optional
+
+import anyio
+
+from src.app.core.config import settings
+from src.app.services import gtfs_static, route_search, semantic_search
+
+logger = logging.getLogger(__name__)
+
+# Goes through lexical matching, embedding and the vector index, like a real chat request.
+_DUMMY_QUERY = "when is the next bus at the student center"
+
+_state: Dict[str, Any] = {
+    "ready": not settings.warmup_enabled,
+    "started_at": None,
+    "finished_at": None,
+    "attempts": 0,
+    "steps_ms": {},
+    "error": None,
+    "preloaded": False,
+}
+
+
+def _timed(step: str, fn: Any, *args: Any) -> Any:
+    started = time.perf_counter()
+    result = fn(*args)
+    _state["steps_ms"][step] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def preload() -> None:
+    """Load model weights and map indexes in a pre-fork master so workers share the pages.
+
+    Nothing is run through the model or the index here: their thread pools (OpenMP, onnxruntime)
+    do not survive fork, so the first inference has to happen in each worker.
+    """
+    _timed("preload_index", semantic_search._store.get)
+    _timed("preload_route_index", route_search._store.get)
+    _timed("preload_model", semantic_search._model_cache)
+    # Keep the collector from touching (and so copying) every preloaded object after fork.
+    gc.freeze()
+    _state["preloaded"] = True
+    logger.info("Preloaded indexes and %s embedding model before fork", settings.embedding_backend)
+
+
+def _warm_sync() -> None:
+    _timed("index", semantic_search._store.get)
+    _timed("route_index", route_search._store.get)
+    _timed("model", semantic_search._model_cache)
+    _timed("lexical_search", semantic_search.lexical_search, _DUMMY_QUERY)
+
+
+async def _warm() -> None:
+    await anyio.to_thread.run_sync(_warm_sync)
+    started = time.perf_counter()
+    # Through the batcher, so its thread and the model's first-call allocations are in place.
+    vector = await semantic_search.embed_query_async(_DUMMY_QUERY)
+    _state["steps_ms"]["embed_query"] = round((time.perf_counter() - started) * 1000, 1)
+    await anyio.to_thread.run_sync(_timed, "vector_search", semantic_search.search_vector, vector, 5)
+    await anyio.to_thread.run_sync(_timed, "route_search", route_search.search_vector, vector, 2)
+    started = time.perf_counter()
+    await gtfs_static.refresh_feed()
+    _state["steps_ms"]["gtfs_feed"] = round((time.perf_counter() - started) * 1000, 1)
+
+
+async def run_warmup(retry_s: Optional[int] = None) -> None:
+    """Load everything the first chat request needs, retrying until it succeeds."""
+    if not settings.warmup_enabled:
+        return
+    retry = retry_s or settings.index_check_s
+    _state["started_at"] = int(time.time())
+    while True:
+        _state["attempts"] += 1
+        try:
+            await _warm()
+        except Exception as exc:
+            _state["error"] = f"{type(exc).__name__}: {exc}"
+            logger.exception("Warmup failed; retrying in %ss", retry)
+            await asyncio.sleep(retry)
+            continue
+        _state.update(ready=True, error=None, finished_at=int(time.time()))
+        logger.info("Warmup finished: %s", _state["steps_ms"])
+        return
+
+
+def is_ready() -> bool:
+    return bool(_state["ready"])
+
+
+def status() -> Dict[str, Any]:
+    return {**_state, "steps_ms": dict(_state["steps_ms"])}
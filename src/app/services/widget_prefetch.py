@@ -0,0 +1,117 @@
+# src/app/services/widget_prefetch.py
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import redis.asyncio as redis
+
+from src.app.schemas.chat_widgets import (
+    ActiveRoutesConfig,
+    ArrivalsWidgetRequest,
+    BusArrivalsConfig,
+    LLMWidgetConfig,
+)
+from src.app.schemas.transit import ActiveRoutesResponse, ArrivalsWidgetResponse
+from src.app.services import transit_cache
+from src.app.services.intent_router import INTENT_ACTIVE_ROUTES, INTENT_ARRIVALS
+
+WidgetData = Union[ArrivalsWidgetResponse, ActiveRoutesResponse]
+
+_HORIZON_SEC: int = ArrivalsWidgetRequest.model_fields["horizon_sec"].default
+_PER_STOP_LIMIT: int = ArrivalsWidgetRequest.model_fields["per_stop_limit"].default
+
+# speculated: loads started before the config was known; used/wasted: how they ended;
+# direct: loads started after the config was known (fast path, cache hit, or a missed guess).
+_stats: Dict[str, int] = {"speculated": 0, "used": 0, "wasted": 0, "direct": 0}
+
+
+async def load_arrivals(r: redis.Redis, stop_ids: Sequence[str]) -> ArrivalsWidgetResponse:
+    """The payload of POST /widgets/arrivals with its default horizon and limit."""
+    stops = await transit_cache.get_arrivals_widget(
+        r,
+        stop_ids=list(stop_ids),
+        horizon_sec=_HORIZON_SEC,
+        per_stop_limit=_PER_STOP_LIMIT,
+    )
+    return ArrivalsWidgetResponse(as_of=int(time.time() * 1000), stops=stops)
+
+
+async def load_active_routes(r: redis.Redis) -> ActiveRoutesResponse:
+    """The payload of GET /widgets/active-routes."""
+    routes = await transit_cache.get_active_routes(r)
+    return ActiveRoutesResponse(as_of=int(time.time() * 1000), routes=routes)
+
+
+class Prefetch:
+    """Widget data for one chat request, loaded speculatively while the model is still answering.
+
+    ``start`` guesses the widget from the resolved context; ``resolve`` reuses that load when the
+    final config agrees with the guess and loads fresh data otherwise.
+    """
+
+    def __init__(self, r: redis.Redis) -> None:
+        self._r = r
+        self._task: Optional[asyncio.Task[WidgetData]] = None
+        self._intent: Optional[str] = None
+        self._stop_ids: List[str] = []
+
+    def start(self, intent: str, stop_ids: Sequence[str] = ()) -> None:
+        if self._task is not None:
+            return
+        if intent == INTENT_ARRIVALS and stop_ids:
+            self._task = asyncio.create_task(load_arrivals(self._r, stop_ids))
+        elif intent == INTENT_ACTIVE_ROUTES:
+            self._task = asyncio.create_task(load_active_routes(self._r))
+        else:
+            return
+        self._intent = intent
+        self._stop_ids = list(stop_ids)
+        _stats["speculated"] += 1
+
+    async def cancel(self) -> None:
+        task, self._task = self._task, None
+        if task is None:
+            return
+        _stats["wasted"] += 1
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await task
+
+    async def _take(self) -> WidgetData:
+        assert self._task is not None
+        task, self._task = self._task, None
+        _stats["used"] += 1
+        return await task
+
+    async def resolve(self, config: LLMWidgetConfig) -> Tuple[Optional[WidgetData], bool]:
+        """Widget data for the final config, and whether it came from the speculative load."""
+        if isinstance(config, BusArrivalsConfig):
+            if not config.stopIds:
+                await self.cancel()
+                return None, False
+            if self._task is not None and self._intent == INTENT_ARRIVALS and set(config.stopIds) <= set(self._stop_ids):
+                data = await self._take()
+                assert isinstance(data, ArrivalsWidgetResponse)
+                by_id = {stop.stop_id: stop for stop in data.stops}
+                stops = [by_id[stop_id] for stop_id in config.stopIds if stop_id in by_id]
+                return data.model_copy(update={"stops": stops}), True
+            await self.cancel()
+            _stats["direct"] += 1
+            return await load_arrivals(self._r, config.stopIds), False
+
+        if isinstance(config, ActiveRoutesConfig):
+            if self._task is not None and self._intent == INTENT_ACTIVE_ROUTES:
+                return await self._take(), True
+            await self.cancel()
+            _stats["direct"] += 1
+            return await load_active_routes(self._r), False
+
+        await self.cancel()
+        return None, False
+
+
+def metrics() -> Dict[str, int]:
+    return dict(_stats)
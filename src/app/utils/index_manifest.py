@@ -0,0 +1,65 @@
+"""Versioned index files plus a manifest naming the current version.
+
+Builders write every file of a new version under a fresh name, then replace the manifest in one
+``os.replace``. Readers only ever follow the manifest, so they see either the old version or the
+new one in full, never a half-written mix.
+"""
+from __future__ import annotations
+
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import orjson
+
+
+def manifest_path(index_dir: Path, name: str) -> Path:
+    return index_dir / f"{name}_manifest.json"
+
+
+def new_version() -> str:
+    return time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+
+
+def versioned_path(index_dir: Path, name: str, version: str, suffix: str) -> Path:
+    """e.g. semantic-20250101T030000-ab12cd.faiss"""
+    return index_dir / f"{name}-{version}{suffix}"
+
+
+def read_manifest(index_dir: Path, name: str) -> Optional[Dict[str, Any]]:
+    path = manifest_path(index_dir, name)
+    try:
+        return orjson.loads(path.read_bytes())
+    except FileNotFoundError:
+        return None
+
+
+def write_manifest(index_dir: Path, name: str, version: str, files: Dict[str, Path], **info: Any) -> Dict[str, Any]:
+    """Publish ``version``; ``files`` maps a role ("index", "meta", ...) to a file in index_dir."""
+    manifest = {
+        "name": name,
+        "version": version,
+        "built_at": int(time.time()),
+        "files": {role: path.name for role, path in files.items()},
+        **info,
+    }
+    target = manifest_path(index_dir, name)
+    tmp = target.with_suffix(f".{uuid.uuid4().hex[:6]}.tmp")
+    tmp.write_bytes(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+    os.replace(tmp, target)
+    return manifest
+
+
+def prune_versions(index_dir: Path, name: str, keep: Iterable[str]) -> int:
+    """Delete files of versions not in ``keep``. Workers that still have one mapped keep reading
+    it until they swap: an unlinked file lives on while it is mapped."""
+    kept = set(keep)
+    removed = 0
+    for path in index_dir.glob(f"{name}-*"):
+        version = path.name[len(name) + 1 :].split(".", 1)[0]
+        if version not in kept:
+            path.unlink(missing_ok=True)
+            removed += 1
+    return removed
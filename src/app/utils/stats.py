@@ -0,0 +1,12 @@
+"""Latency summaries shared by /health metrics and the benchmark tasks."""
+from __future__ import annotations
+
+from typing import Iterable
+
+
+def percentile(samples: Iterable[float], q: float) -> float:
+    """Nearest-rank ``q`` quantile (0..1) of ``samples``; 0.0 when there are none."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+
+from config import settings
+
+
+def build_index(
+    embeddings: np.ndarray,
+    spec: Optional[str] = None,
+    ids: Optional[np.ndarray] = None,
+    min_docs: Optional[int] = None,
+) -> Tuple[faiss.Index, str]:
+    """Inner-product index over normalized embeddings, from a faiss factory string.
+
+    ``spec`` defaults to FAISS_INDEX ("Flat", "HNSW32", "IVF256,PQ32", ...). Collections smaller
+    than FAISS_MIN_DOCS always get Flat: exact search is faster there and IVF/PQ could not be
+    trained on so few vectors anyway. ``ids`` wraps the index in an IDMap2 so search returns them.
+    Returns the index and the factory string actually used.
+    """
+    spec = spec or settings.faiss_index
+    min_docs = settings.faiss_min_docs if min_docs is None else min_docs
+    if len(embeddings) < min_docs and spec != "Flat":
+        print(f"{len(embeddings)} documents < FAISS_MIN_DOCS={min_docs}; using Flat instead of {spec}")
+        spec = "Flat"
+    factory = f"IDMap2,{spec}" if ids is not None else spec
+    index = faiss.index_factory(embeddings.shape[1], factory, faiss.METRIC_INNER_PRODUCT)
+    if not index.is_trained:
+        index.train(embeddings)
+    if ids is not None:
+        index.add_with_ids(embeddings, ids)
+    else:
+        index.add(embeddings)
+    return index, spec
+
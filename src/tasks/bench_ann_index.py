@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import argparse
+import math
+import statistics
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import faiss
+import numpy as np
+import orjson
+
+from ann_index import build_index
+from config import settings
+from embedding_cache import get_encoder
+from score_stats import probe_queries
+from src.app.utils.index_manifest import read_manifest
+from src.app.utils.stats import percentile
+
+# faiss factory strings contain commas, so specs are separated by ";".
+DEFAULT_SPECS = "Flat;HNSW32;IVF{nlist},Flat;IVF{nlist},PQ{m}"
+
+
+def _published_texts() -> List[str]:
+    """Documents of the current semantic and route indexes."""
+    texts: List[str] = []
+    for name in ("semantic", "routes"):
+        manifest = read_manifest(settings.index_dir, name)
+        if manifest is None:
+            continue
+        meta = orjson.loads((settings.index_dir / manifest["files"]["meta"]).read_bytes())
+        if name == "semantic":
+            texts += [doc["text"] for doc in meta.get("documents", [])]
+        else:
+            texts += [value["doc"] if isinstance(value, dict) else value for value in meta.values()]
+    return texts
+
+
+def _perturb(base: np.ndarray, n: int, noise: float, rng: np.random.Generator) -> np.ndarray:
+    """``n`` vectors around random rows of ``base``; ``noise`` is the noise norm relative to a row.
+
+    Keeps the cluster structure of real documents (what ANN indexes are sensitive to), unlike
+    uniform random vectors.
+    """
+    rows = base[rng.integers(0, len(base), n)]
+    jitter = rng.standard_normal(rows.shape).astype("float32") * (noise / math.sqrt(base.shape[1]))
+    out = rows + jitter
+    faiss.normalize_L2(out)
+    return out
+
+
+def _specs(template: str, n: int, dim: int) -> List[str]:
+    nlist = max(8, int(4 * math.sqrt(n)))
+    m = dim // 8 if dim % 8 == 0 else dim // 4
+    return [spec.format(nlist=nlist, m=m) for spec in template.split(";") if spec.strip()]
+
+
+def _search_params(spec: str, nprobes: Sequence[int], efs: Sequence[int]) -> List[Tuple[str, Optional[int]]]:
+    if spec.startswith("IVF"):
+        return [("nprobe", value) for value in nprobes]
+    if spec.startswith("HNSW"):
+        return [("efSearch", value) for value in efs]
+    return [("", None)]
+
+
+def _bench_one(
+    docs: np.ndarray,
+    queries: np.ndarray,
+    kth_score: np.ndarray,
+    spec: str,
+    k: int,
+    nprobes: Sequence[int],
+    efs: Sequence[int],
+) -> List[Dict[str, object]]:
+    start = time.perf_counter()
+    try:
+        index, _ = build_index(docs, spec, min_docs=0)
+    except RuntimeError as exc:
+        # e.g. PQ needs at least 256 training vectors
+        print(f"  {spec}: skipped ({str(exc).splitlines()[-1][:80]})")
+        return []
+    build_s = time.perf_counter() - start
+    size_mb = len(faiss.serialize_index(index)) / 1e6
+
+    rows: List[Dict[str, object]] = []
+    params = faiss.ParameterSpace()
+    for name, value in _search_params(spec, nprobes, efs):
+        if name:
+            params.set_index_parameter(index, name, value)
+        latencies: List[float] = []
+        found = np.empty((len(queries), k), dtype="int64")
+        for row, query in enumerate(queries):
+            t = time.perf_counter()
+            _, ids = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - t) * 1000)
+            found[row] = ids[0]
+        # A result counts if it scores at least as high as the exact k-th hit, so ties between
+        # near-identical documents are not reported as misses.
+        scores = np.einsum("qkd,qd->qk", docs[np.maximum(found, 0)], queries)
+        recall = float(np.mean((scores >= kth_score[:, None] - 1e-5) & (found >= 0)))
+        rows.append(
+            {
+                "spec": spec + (f" {name}={value}" if name else ""),
+                "build_s": build_s,
+                "size_mb": size_mb,
+                "recall": recall,
+                "p50_ms": statistics.median(latencies),
+                "p95_ms": percentile(latencies, 0.95),
+            }
+        )
+    return rows
+
+
+def bench_ann_index(
+    sizes: Sequence[int],
+    template: str,
+    k: int,
+    noise: float,
+    nprobes: Sequence[int],
+    efs: Sequence[int],
+    n_queries: int,
+    seed: int,
+) -> None:
+    rng = np.random.default_rng(seed)
+    encoder = get_encoder()
+    texts = _published_texts()
+    if not texts:
+        raise SystemExit(f"No published semantic/route index in {settings.index_dir}; build one first.")
+    real = encoder.encode(texts)
+    questions = probe_queries()
+    probes = encoder.encode(questions) if questions else real[:0]
+    print(f"{len(real)} real documents, {len(probes)} probe questions, dim {real.shape[1]}, k={k}")
+
+    for n in [len(real)] + [s for s in sizes if s > len(real)]:
+        docs = real if n == len(real) else np.vstack([real, _perturb(real, n - len(real), noise, rng)])
+        # Real questions plus near-duplicates of random documents, as questions about them would be.
+        queries = np.vstack([probes, _perturb(docs, max(0, n_queries - len(probes)), noise, rng)])
+        exact = faiss.IndexFlatIP(docs.shape[1])
+        exact.add(docs)
+        exact_scores, _ = exact.search(queries, k)
+
+        print(f"\n{n} documents ({'real' if n == len(real) else 'real + synthetic'}), {len(queries)} queries")
+        print(f"{'index':>28} {'build s':>8} {'MB':>7} {'recall@k':>9} {'p50 ms':>7} {'p95 ms':>7}")
+        for spec in _specs(template, n, docs.shape[1]):
+            for r in _bench_one(docs, queries, exact_scores[:, -1], spec, k, nprobes, efs):
+                print(
+                    f"{r['spec']:>28} {r['build_s']:>8.2f} {r['size_mb']:>7.1f} {r['recall']:>9.3f} "
+                    f"{r['p50_ms']:>7.3f} {r['p95_ms']:>7.3f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recall@k against Flat, latency, build time and size of FAISS index types.")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated collection sizes, padded synthetically")
+    parser.add_argument("--specs", default=DEFAULT_SPECS, help="';'-separated faiss factory strings; {nlist} and {m} are filled in per size")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.75, help="Synthetic vectors' distance from the real ones")
+    parser.add_argument("--nprobe", default="4,16,64", help="IVF lists probed, comma-separated")
+    parser.add_argument("--ef-search", default="16,64,128", help="HNSW efSearch, comma-separated")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    bench_ann_index(
+        sizes=[int(s) for s in args.sizes.split(",") if s.strip()],
+        template=args.specs,
+        k=args.k,
+        noise=args.noise,
+        nprobes=[int(s) for s in args.nprobe.split(",")],
+        efs=[int(s) for s in args.ef_search.split(",")],
+        n_queries=args.queries,
+        seed=args.seed,
+    )
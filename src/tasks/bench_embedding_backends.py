@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+import orjson
+
+from src.app.utils.stats import percentile
+
+EVAL_PATH = Path(__file__).resolve().parents[2] / "data" / "eval" / "intent_eval.jsonl"
+BACKENDS = ("torch", "onnx")
+
+
+def _rss_mb() -> float:
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def _measure(backend: str, queries: Sequence[str], out: "mp.Queue[Dict[str, Any]]") -> None:
+    """Runs in a fresh process so RSS and cold start only reflect this backend."""
+    os.environ["EMBEDDING_BACKEND"] = backend
+    from src.app.services import semantic_search
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    first = semantic_search.embed_query(queries[0])
+    cold_ms = (time.perf_counter() - start) * 1000
+    rss_loaded = _rss_mb()
+
+    latencies: List[float] = []
+    vectors = np.empty((len(queries), first.shape[1]), dtype=np.float32)
+    for row, query in enumerate(queries):
+        start = time.perf_counter()
+        vectors[row] = semantic_search.embed_query(query)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    batch = list(queries[:32])
+    start = time.perf_counter()
+    for _ in range(10):
+        semantic_search.embed_queries(batch)
+    batch_ms = (time.perf_counter() - start) * 100
+
+    out.put(
+        {
+            "backend": backend,
+            "cold_ms": cold_ms,
+            "rss_model_mb": rss_loaded - rss_before,
+            "rss_total_mb": _rss_mb(),
+            "p50_ms": statistics.median(latencies),
+            "p95_ms": percentile(latencies, 0.95),
+            "batch32_ms": batch_ms,
+            "vectors": vectors,
+        }
+    )
+
+
+def _recall(reference: np.ndarray, candidate: np.ndarray, k: int) -> float | None:
+    """Share of the reference backend's top-k index hits the candidate backend also returns."""
+    from src.app.services import semantic_search
+
+    index = semantic_search._store.get().index
+    if index is None:
+        return None
+    _, want = index.search(reference, k)
+    _, got = index.search(candidate, k)
+    overlap = [len(set(w[w >= 0]) & set(g[g >= 0])) / max(1, int((w >= 0).sum())) for w, g in zip(want, got)]
+    return float(np.mean(overlap))
+
+
+def bench_embedding_backends(queries: Sequence[str], k: int) -> None:
+    ctx = mp.get_context("spawn")
+    results: Dict[str, Dict[str, Any]] = {}
+    for backend in BACKENDS:
+        out: "mp.Queue[Dict[str, Any]]" = ctx.Queue()
+        proc = ctx.Process(target=_measure, args=(backend, queries, out))
+        proc.start()
+        results[backend] = out.get()
+        proc.join()
+
+    print(f"{len(queries)} queries")
+    print(f"{'backend':>8} {'cold ms':>8} {'model MB':>9} {'RSS MB':>7} {'p50 ms':>7} {'p95 ms':>7} {'32/batch ms':>12}")
+    for backend, r in results.items():
+        print(
+            f"{backend:>8} {r['cold_ms']:>8.0f} {r['rss_model_mb']:>9.0f} {r['rss_total_mb']:>7.0f} "
+            f"{r['p50_ms']:>7.2f} {r['p95_ms']:>7.2f} {r['batch32_ms']:>12.2f}"
+        )
+
+    reference, candidate = results["torch"]["vectors"], results["onnx"]["vectors"]
+    cosine = np.sum(reference * candidate, axis=1)
+    print(f"onnx vs torch cosine: min={cosine.min():.4f} mean={cosine.mean():.4f}")
+    recall = _recall(reference, candidate, k)
+    if recall is None:
+        print("Semantic index missing; skipped recall.")
+    else:
+        print(f"onnx recall@{k} against torch results on the semantic index: {recall:.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency, memory and recall of the torch and ONNX query encoders.")
+    parser.add_argument("--path", type=Path, default=EVAL_PATH, help="JSONL with a 'message' per line")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+    messages = [orjson.loads(line)["message"] for line in args.path.read_bytes().splitlines() if line.strip()]
+    bench_embedding_backends(messages, args.k)
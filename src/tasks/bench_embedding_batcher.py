@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import statistics
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, List, Sequence
+
+import numpy as np
+import orjson
+
+from src.app.core.config import settings
+from src.app.services import semantic_search
+from src.app.services.embedding_batcher import EmbeddingBatcher
+from src.app.utils.stats import percentile
+
+EVAL_PATH = Path(__file__).resolve().parents[2] / "data" / "eval" / "intent_eval.jsonl"
+
+
+def _load_queries(path: Path) -> List[str]:
+    return [orjson.loads(line)["message"] for line in path.read_bytes().splitlines() if line.strip()]
+
+
+async def _run(
+    embed: Callable[[str], Awaitable[np.ndarray]],
+    queries: Sequence[str],
+    concurrency: int,
+    total: int,
+) -> tuple[list[float], float, float]:
+    """Closed loop: ``concurrency`` clients each send their next query as soon as one returns."""
+    latencies: list[float] = []
+    next_query = 0
+    lag_ms = 0.0
+    done = asyncio.Event()
+
+    async def heartbeat() -> None:
+        # How long the event loop is held up: what every other request on the worker would feel.
+        nonlocal lag_ms
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            lag_ms = max(lag_ms, (time.perf_counter() - start) * 1000 - 1)
+
+    async def client() -> None:
+        nonlocal next_query
+        while next_query < total:
+            query = queries[next_query % len(queries)]
+            next_query += 1
+            start = time.perf_counter()
+            await embed(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    beat = asyncio.create_task(heartbeat())
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done.set()
+    await beat
+    return latencies, elapsed, lag_ms
+
+
+async def bench_embedding_batcher(
+    queries: Sequence[str],
+    levels: Sequence[int],
+    per_client: int,
+    max_batch: int,
+    max_wait_ms: float,
+) -> None:
+    t0 = time.perf_counter()
+    dim = semantic_search.embed_queries(queries[:1]).shape[1]
+    print(f"Loaded {settings.sbert_model} (dim {dim}) in {time.perf_counter() - t0:.2f}s")
+    # Warm both paths so neither pays for first-call allocation.
+    semantic_search.embed_queries(list(queries[:max_batch]))
+
+    print(f"{len(queries)} distinct queries; max_batch={max_batch} max_wait_ms={max_wait_ms}")
+    print(f"{'mode':>8} {'conc':>5} {'q/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'loop lag':>9} {'batch':>6}")
+    for concurrency in levels:
+        total = max(concurrency * per_client, 50)
+
+        async def unbatched(text: str) -> np.ndarray:
+            return await asyncio.to_thread(semantic_search.embed_query, text)
+
+        batcher = EmbeddingBatcher(semantic_search.embed_queries, max_batch=max_batch, max_wait_ms=max_wait_ms)
+        for mode, embed in (("thread", unbatched), ("batched", batcher.embed)):
+            latencies, elapsed, lag_ms = await _run(embed, queries, concurrency, total)
+            batch = f"{batcher.metrics()['batch_size_mean']:>6.1f}" if mode == "batched" else f"{1:>6}"
+            print(
+                f"{mode:>8} {concurrency:>5} {len(latencies) / elapsed:>8.1f} "
+                f"{statistics.median(latencies):>8.2f} {percentile(latencies, 0.95):>8.2f} "
+                f"{percentile(latencies, 0.99):>8.2f} {lag_ms:>8.1f}ms {batch}"
+            )
+        await batcher.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query embedding throughput/latency, per-call vs micro-batched.")
+    parser.add_argument("--path", type=Path, default=EVAL_PATH, help="JSONL with a 'message' per line")
+    parser.add_argument("--concurrency", default="1,10,100", help="Comma-separated concurrent clients")
+    parser.add_argument("--per-client", type=int, default=20, help="Queries sent by each client")
+    parser.add_argument("--max-batch", type=int, default=settings.embed_batch_max_size)
+    parser.add_argument("--max-wait-ms", type=float, default=settings.embed_batch_max_wait_ms)
+    args = parser.parse_args()
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    asyncio.run(
+        bench_embedding_batcher(_load_queries(args.path), levels, args.per_client, args.max_batch, args.max_wait_ms)
+    )
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime
+
+from src.app.services import gtfs_static
+from src.app.services.journey_planner import get_raptor_data, plan_journey
+from src.app.utils.stats import percentile
+
+
+def bench_journey_planner(depart_at: int, sample: int | None, seed: int) -> None:
+    t0 = time.perf_counter()
+    feed = gtfs_static.load_feed()
+    t1 = time.perf_counter()
+    data = get_raptor_data(feed)
+    t2 = time.perf_counter()
+    print(f"Loaded GTFS {feed.version}: {len(feed.stop_ids)} stops, {len(feed.st_trip)} stop_times in {t1 - t0:.2f}s")
+    print(f"Built {len(data.patterns)} patterns + transfers in {(t2 - t1) * 1000:.1f}ms")
+
+    served = [stop for stop, patterns in enumerate(data.stop_patterns) if patterns]
+    pairs = [(a, b) for a in served for b in served if a != b]
+    if sample is not None and sample < len(pairs):
+        pairs = random.Random(seed).sample(pairs, sample)
+
+    latencies: list[float] = []
+    found = 0
+    for origin, dest in pairs:
+        start = time.perf_counter()
+        journey = plan_journey(feed, [origin], [dest], depart_at)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found += journey is not None
+
+    if not latencies:
+        print("No stop pairs to benchmark.")
+        return
+    print(f"Queries: {len(latencies)}  found: {found} ({found / len(latencies):.1%})")
+    print(
+        f"Latency ms  mean={statistics.fmean(latencies):.2f}  p50={percentile(latencies, 0.5):.2f}  "
+        f"p95={percentile(latencies, 0.95):.2f}  p99={percentile(latencies, 0.99):.2f}  max={max(latencies):.2f}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the RAPTOR planner over all stop pairs.")
+    parser.add_argument("--depart-at", type=str, default=None, help="ISO datetime; defaults to now")
+    parser.add_argument("--sample", type=int, default=None, help="Random subset of stop pairs")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    when = datetime.fromisoformat(args.depart_at) if args.depart_at else datetime.now()
+    bench_journey_planner(int(when.timestamp()), args.sample, args.seed)
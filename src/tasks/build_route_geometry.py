@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import psycopg
+
+from config import settings
+
+ROUTE_GEOMETRY_PATH = settings.index_dir / "route_geometry.npz"
+_EARTH_RADIUS_M = 6_371_000.0
+
+
+def _connect() -> psycopg.Connection:
+    return psycopg.connect(settings.dsn())
+
+
+def _project(lat: np.ndarray, lon: np.ndarray, lat0: float) -> np.ndarray:
+    return np.column_stack(
+        (
+            np.radians(lon) * math.cos(math.radians(lat0)) * _EARTH_RADIUS_M,
+            np.radians(lat) * _EARTH_RADIUS_M,
+        )
+    )
+
+
+def _fetch_shapes() -> Dict[str, np.ndarray]:
+    sql = f"""
+    SELECT shape_id, shape_pt_lat::double precision, shape_pt_lon::double precision
+    FROM "{settings.gtfs_schema}".shapes
+    ORDER BY shape_id, shape_pt_sequence
+    """
+    with _connect() as con, con.cursor() as cur:
+        cur.execute(sql)
+        rows = cur.fetchall()
+    grouped: Dict[str, List[Tuple[float, float]]] = {}
+    for shape_id, lat, lon in rows:
+        grouped.setdefault(str(shape_id), []).append((lat, lon))
+    return {k: np.asarray(v, dtype=np.float64) for k, v in grouped.items() if len(v) >= 2}
+
+
+def _gtfs_seconds(value: Optional[Union[int, str]]) -> float:
+    """Seconds after midnight, as loaded, or 'HH:MM:SS' (hours may exceed 24); NaN when blank."""
+    if isinstance(value, int):
+        return float(value)
+    if not value:
+        return math.nan
+    try:
+        h, m, s = (int(part) for part in str(value).strip().split(":"))
+    except ValueError:
+        return math.nan
+    return float(h * 3600 + m * 60 + s)
+
+
+StopRow = Tuple[str, str, int, float, float, float]
+
+
+def _fetch_trip_stops() -> List[Tuple[str, str, str, str, List[StopRow]]]:
+    """(trip_id, route_id, shape_id, headsign, [(stop_id, stop_name, seq, lat, lon, time_s)]) per trip."""
+    schema = settings.gtfs_schema
+    with _connect() as con, con.cursor() as cur:
+        cur.execute(
+            "SELECT column_name FROM information_schema.columns WHERE table_schema = %s AND table_name = 'trips'",
+            (schema,),
+        )
+        columns = {row[0] for row in cur.fetchall()}
+        if "shape_id" not in columns:
+            return []
+        headsign = "COALESCE(t.trip_headsign, '')" if "trip_headsign" in columns else "''"
+        cur.execute(f"""
+            SELECT t.trip_id, t.route_id, t.shape_id, {headsign},
+                   st.stop_id, COALESCE(NULLIF(s.stop_name, ''), s.stop_id), st.stop_sequence,
+                   s.stop_lat::double precision, s.stop_lon::double precision,
+                   COALESCE(st.arrival_time, st.departure_time)
+            FROM "{schema}".trips t
+            JOIN "{schema}".stop_times st ON st.trip_id = t.trip_id
+            JOIN "{schema}".stops s ON s.stop_id = st.stop_id
+            WHERE t.shape_id IS NOT NULL AND t.shape_id <> ''
+            ORDER BY t.trip_id, st.stop_sequence
+        """)
+        rows = cur.fetchall()
+
+    trips: Dict[str, Tuple[str, str, str, str, List[StopRow]]] = {}
+    for trip_id, route_id, shape_id, trip_headsign, stop_id, stop_name, seq, lat, lon, at in rows:
+        entry = trips.setdefault(
+            str(trip_id), (str(trip_id), str(route_id), str(shape_id), str(trip_headsign or ""), [])
+        )
+        entry[4].append((str(stop_id), str(stop_name), int(seq), float(lat), float(lon), _gtfs_seconds(at)))
+    return list(trips.values())
+
+
+def _stop_distances(shape_xy: np.ndarray, cum: np.ndarray, stop_xy: np.ndarray) -> np.ndarray:
+    """Distance along the shape of each stop, kept non-decreasing for loops and doubling back."""
+    seg_start = shape_xy[:-1]
+    seg_vec = shape_xy[1:] - seg_start
+    seg_len2 = np.maximum((seg_vec ** 2).sum(axis=1), 1e-9)
+
+    dists = np.empty(len(stop_xy), dtype=np.float64)
+    floor = 0.0
+    for i, point in enumerate(stop_xy):
+        t = np.clip(((point - seg_start) * seg_vec).sum(axis=1) / seg_len2, 0.0, 1.0)
+        along = cum[:-1] + t * np.sqrt(seg_len2)
+        offset = np.hypot(*(seg_start + t[:, None] * seg_vec - point).T)
+        # Segments behind the previous stop are not candidates.
+        offset = np.where(along + 1.0 < floor, np.inf, offset)
+        best = int(np.argmin(offset))
+        floor = float(along[best]) if np.isfinite(offset[best]) else floor
+        dists[i] = floor
+    return dists
+
+
+def build_route_geometry() -> None:
+    shapes = _fetch_shapes()
+    trips = _fetch_trip_stops()
+    if not shapes or not trips:
+        print("No shapes or shaped trips found; skipping route geometry build.")
+        return
+
+    shape_ids = sorted(shapes)
+    shape_index = {shape_id: i for i, shape_id in enumerate(shape_ids)}
+    lat0 = float(np.mean(np.concatenate([pts[:, 0] for pts in shapes.values()])))
+
+    shape_offsets = [0]
+    shape_lat: List[np.ndarray] = []
+    shape_lon: List[np.ndarray] = []
+    shape_dist: List[np.ndarray] = []
+    shape_xy: Dict[str, np.ndarray] = {}
+    for shape_id in shape_ids:
+        pts = shapes[shape_id]
+        xy = _project(pts[:, 0], pts[:, 1], lat0)
+        cum = np.concatenate(([0.0], np.cumsum(np.hypot(*np.diff(xy, axis=0).T))))
+        shape_xy[shape_id] = xy
+        shape_lat.append(pts[:, 0])
+        shape_lon.append(pts[:, 1])
+        shape_dist.append(cum)
+        shape_offsets.append(shape_offsets[-1] + len(pts))
+
+    # Trips sharing shape, stop sequence and headsign collapse into one pattern.
+    pattern_index: Dict[Tuple[str, str, Tuple[str, ...], str], int] = {}
+    pattern_shape: List[int] = []
+    pattern_route: List[str] = []
+    pattern_headsign: List[str] = []
+    stop_offsets = [0]
+    stop_ids: List[str] = []
+    stop_seqs: List[int] = []
+    stop_dists: List[np.ndarray] = []
+    trip_ids: List[str] = []
+    trip_pattern: List[int] = []
+    # Scheduled seconds since each trip's first stop, collected per pattern.
+    pattern_times: List[List[np.ndarray]] = []
+
+    for trip_id, route_id, shape_id, headsign, stops in trips:
+        if shape_id not in shape_index:
+            continue
+        destination = headsign or stops[-1][1]
+        key = (route_id, shape_id, tuple(s[0] for s in stops), destination)
+        pattern = pattern_index.get(key)
+        if pattern is None:
+            pattern = len(pattern_shape)
+            pattern_index[key] = pattern
+            pattern_shape.append(shape_index[shape_id])
+            pattern_route.append(route_id)
+            pattern_headsign.append(destination)
+            stop_xy = _project(
+                np.array([s[3] for s in stops]), np.array([s[4] for s in stops]), lat0
+            )
+            sid = shape_index[shape_id]
+            stop_dists.append(_stop_distances(shape_xy[shape_id], shape_dist[sid], stop_xy))
+            stop_ids.extend(s[0] for s in stops)
+            stop_seqs.extend(s[2] for s in stops)
+            stop_offsets.append(stop_offsets[-1] + len(stops))
+            pattern_times.append([])
+        times = np.array([s[5] for s in stops])
+        pattern_times[pattern].append(times - times[0])
+        trip_ids.append(trip_id)
+        trip_pattern.append(pattern)
+
+    # Median scheduled offset per pattern stop; the ingestor's ETA prior when no travel times were observed.
+    stop_sched: List[np.ndarray] = []
+    for per_trip in pattern_times:
+        stacked = np.vstack(per_trip)
+        known = ~np.isnan(stacked)
+        median = np.full(stacked.shape[1], np.nan)
+        for col in np.flatnonzero(known.any(axis=0)):
+            median[col] = np.median(stacked[known[:, col], col])
+        stop_sched.append(median)
+
+    tmp_path = ROUTE_GEOMETRY_PATH.with_name("route_geometry.tmp.npz")
+    np.savez_compressed(
+        tmp_path,
+        lat0=np.float64(lat0),
+        shape_ids=np.asarray(shape_ids),
+        shape_offsets=np.asarray(shape_offsets, dtype=np.int64),
+        shape_lat=np.concatenate(shape_lat),
+        shape_lon=np.concatenate(shape_lon),
+        shape_dist=np.concatenate(shape_dist),
+        pattern_shape=np.asarray(pattern_shape, dtype=np.int32),
+        pattern_route=np.asarray(pattern_route),
+        pattern_headsign=np.asarray(pattern_headsign),
+        pattern_stop_offsets=np.asarray(stop_offsets, dtype=np.int64),
+        stop_ids=np.asarray(stop_ids),
+        stop_sequences=np.asarray(stop_seqs, dtype=np.int32),
+        stop_dists=np.concatenate(stop_dists),
+        stop_sched_s=np.concatenate(stop_sched),
+        trip_ids=np.asarray(trip_ids),
+        trip_pattern=np.asarray(trip_pattern, dtype=np.int32),
+    )
+    tmp_path.replace(ROUTE_GEOMETRY_PATH)
+    print(f"Wrote {len(shape_ids)} shapes, {len(pattern_shape)} patterns, {len(trip_ids)} trips to {ROUTE_GEOMETRY_PATH}")
+
+
+if __name__ == "__main__":
+    build_route_geometry()
@@ -4,10 +4,15 @@ import json
 
 import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer
 
+from ann_index import build_index
 from config import settings
+from embedding_cache import get_encoder
 from gtfs_queries import get_representative_routes, get_representative_trip_stops
+from score_stats import top1_score_stats
+from src.app.utils.index_manifest import new_version, prune_versions, read_manifest, versioned_path, write_manifest
+
+INDEX_NAME = "routes"
 
 
 def build_route_index():
@@ -22,31 +27,53 @@ def build_route_index():
         stop_names = [s[1] for s in ordered_stops]
         title = short_name or long_name or str(route_id)
         doc = f"Route {route_id} ({title}): {long_name}. Ordered stops: " + " → ".join(stop_names) + "."
-        records.append({"route_id": int(str(route_id)), "doc": doc})
+        records.append(
+            {
+                "route_id": int(str(route_id)),
+                "doc": doc,
+                "short_name": short_name or "",
+                "long_name": long_name or "",
+            }
+        )
 
     if not records:
         print("No routes found; skipping FAISS build.")
         return
 
-    # embeddings
-    model = SentenceTransformer(settings.sbert_model)
-    texts = [r["doc"] for r in records]
-    emb = model.encode(texts, show_progress_bar=True, batch_size=64, normalize_embeddings=True).astype("float32")
+    # embeddings; only routes whose document changed are re-encoded
+    encoder = get_encoder()
+    emb = encoder.encode([r["doc"] for r in records], show_progress_bar=True)
 
     # faiss
     dim = emb.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    id_index = faiss.IndexIDMap2(index)
     ids = np.array([r["route_id"] for r in records], dtype="int64")
-    id_index.add_with_ids(emb, ids)
+    id_index, index_type = build_index(emb, ids=ids)
 
     out_dir = settings.index_dir
     out_dir.mkdir(parents=True, exist_ok=True)
-    faiss_path = out_dir / "routes.faiss"
-    meta_path  = out_dir / "routes_meta.json"
+    previous = read_manifest(out_dir, INDEX_NAME)
+    version = new_version()
+    faiss_path = versioned_path(out_dir, INDEX_NAME, version, ".faiss")
+    meta_path = versioned_path(out_dir, INDEX_NAME, version, ".meta.json")
 
     faiss.write_index(id_index, str(faiss_path))
     with open(meta_path, "w", encoding="utf-8") as f:
-        json.dump({str(r["route_id"]): r["doc"] for r in records}, f, ensure_ascii=False, indent=2)
+        meta = {
+            str(r["route_id"]): {"doc": r["doc"], "short_name": r["short_name"], "long_name": r["long_name"]}
+            for r in records
+        }
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    write_manifest(
+        out_dir,
+        INDEX_NAME,
+        version,
+        {"index": faiss_path, "meta": meta_path},
+        documents=len(records),
+        dim=dim,
+        index_type=index_type,
+        model=settings.sbert_model,
+        score_stats=top1_score_stats(encoder, id_index),
+    )
+    prune_versions(out_dir, INDEX_NAME, keep=[version] + ([previous["version"]] if previous else []))
 
-    print(f"Created {faiss_path}  ({id_index.ntotal} routes)")
+    print(f"Created {faiss_path}  ({id_index.ntotal} routes; {encoder.stats()})")
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import hashlib
+import math
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import orjson
+import psycopg
+
+from config import settings
+
+ROUTE_SHAPES_PATH = settings.index_dir / "route_shapes.json"
+_EARTH_RADIUS_M = 6_371_000.0
+
+
+def _connect() -> psycopg.Connection:
+    return psycopg.connect(settings.dsn())
+
+
+def _trip_columns(cur: psycopg.Cursor) -> set[str]:
+    cur.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_schema = %s AND table_name = 'trips'",
+        (settings.gtfs_schema,),
+    )
+    return {row[0] for row in cur.fetchall()}
+
+
+def _fetch_route_shape_ids() -> Dict[Tuple[str, str], str]:
+    """Most frequently used shape per (route_id, direction_id)."""
+    with _connect() as con, con.cursor() as cur:
+        columns = _trip_columns(cur)
+        if "shape_id" not in columns:
+            return {}
+        direction = "COALESCE(NULLIF(direction_id::text, ''), '0')" if "direction_id" in columns else "'0'"
+        cur.execute(f"""
+            SELECT route_id, {direction} AS direction_id, shape_id, COUNT(*) AS n
+            FROM "{settings.gtfs_schema}".trips
+            WHERE shape_id IS NOT NULL AND shape_id <> ''
+            GROUP BY 1, 2, 3
+            ORDER BY 1, 2, n DESC, 3
+        """)
+        rows = cur.fetchall()
+
+    chosen: Dict[Tuple[str, str], str] = {}
+    for route_id, direction_id, shape_id, _ in rows:
+        chosen.setdefault((str(route_id), str(direction_id)), str(shape_id))
+    return chosen
+
+
+def _fetch_shape_points(shape_ids: Sequence[str]) -> Dict[str, np.ndarray]:
+    sql = f"""
+    SELECT shape_id, shape_pt_lat::double precision, shape_pt_lon::double precision
+    FROM "{settings.gtfs_schema}".shapes
+    WHERE shape_id = ANY(%s)
+    ORDER BY shape_id, shape_pt_sequence
+    """
+    with _connect() as con, con.cursor() as cur:
+        cur.execute(sql, (list(shape_ids),))
+        rows = cur.fetchall()
+
+    grouped: Dict[str, List[Tuple[float, float]]] = {}
+    for shape_id, lat, lon in rows:
+        grouped.setdefault(str(shape_id), []).append((lat, lon))
+    return {shape_id: np.asarray(points, dtype=np.float64) for shape_id, points in grouped.items()}
+
+
+def simplify(points: np.ndarray, tolerance_m: float) -> np.ndarray:
+    """Douglas-Peucker on lat/lon points, measured in local meters; returns kept points."""
+    if len(points) <= 2:
+        return points
+    lat0 = math.radians(float(points[:, 0].mean()))
+    xy = np.column_stack(
+        (
+            np.radians(points[:, 1]) * math.cos(lat0) * _EARTH_RADIUS_M,
+            np.radians(points[:, 0]) * _EARTH_RADIUS_M,
+        )
+    )
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        seg = xy[end] - xy[start]
+        rel = xy[start + 1:end] - xy[start]
+        seg_len = float(np.hypot(*seg))
+        if seg_len == 0.0:
+            dist = np.hypot(rel[:, 0], rel[:, 1])
+        else:
+            dist = np.abs(seg[0] * rel[:, 1] - seg[1] * rel[:, 0]) / seg_len
+        idx = int(np.argmax(dist))
+        if dist[idx] > tolerance_m:
+            split = start + 1 + idx
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return points[keep]
+
+
+def encode_polyline(points: np.ndarray, precision: int = 5) -> str:
+    """Google encoded polyline algorithm format."""
+    factor = 10 ** precision
+    scaled = np.round(points * factor).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+
+    out: List[str] = []
+    for value in deltas.ravel():
+        v = int(value) << 1
+        if value < 0:
+            v = ~v
+        while v >= 0x20:
+            out.append(chr((0x20 | (v & 0x1F)) + 63))
+            v >>= 5
+        out.append(chr(v + 63))
+    return "".join(out)
+
+
+def build_route_shapes() -> None:
+    route_shapes = _fetch_route_shape_ids()
+    if not route_shapes:
+        print("No shapes referenced by trips; skipping route shape build.")
+        return
+
+    points_by_shape = _fetch_shape_points(sorted(set(route_shapes.values())))
+    tolerances = settings.shape_tolerances_m
+
+    routes: Dict[str, Dict[str, object]] = {}
+    for (route_id, direction_id), shape_id in sorted(route_shapes.items()):
+        points = points_by_shape.get(shape_id)
+        if points is None or len(points) < 2:
+            continue
+        levels = {}
+        for tolerance in tolerances:
+            simplified = simplify(points, tolerance)
+            levels[f"{tolerance:g}"] = {
+                "polyline": encode_polyline(simplified),
+                "points": int(len(simplified)),
+            }
+        routes.setdefault(route_id, {})[direction_id] = {
+            "shape_id": shape_id,
+            "raw_points": int(len(points)),
+            "levels": levels,
+        }
+
+    body = orjson.dumps({"routes": routes}, option=orjson.OPT_SORT_KEYS)
+    payload = {
+        "version": hashlib.sha256(body).hexdigest()[:16],
+        "tolerances_m": list(tolerances),
+        "routes": routes,
+    }
+    tmp_path = ROUTE_SHAPES_PATH.with_suffix(".json.tmp")
+    tmp_path.write_bytes(orjson.dumps(payload))
+    tmp_path.replace(ROUTE_SHAPES_PATH)
+    print(f"Wrote simplified shapes for {len(routes)} routes to {ROUTE_SHAPES_PATH}")
+
+
+if __name__ == "__main__":
+    build_route_shapes()
@@ -2,13 +2,15 @@ from __future__ import annotations
 
 import numpy as np
 import orjson
-from typing import Any, Dict, List, Sequence, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import faiss
 import psycopg
-from sentence_transformers import SentenceTransformer
 
+from ann_index import build_index
 from config import settings
+from embedding_cache import CachedEncoder, get_encoder
+from score_stats import top1_score_stats
 from src.app.schemas.semantic import (
     LandmarkSemanticInfo,
     SemanticIndexDocument,
@@ -16,9 +18,15 @@ from src.app.schemas.semantic import (
     build_landmark_documents,
     build_stop_documents,
 )
+from src.app.utils.index_manifest import (
+    new_version,
+    prune_versions,
+    read_manifest,
+    versioned_path,
+    write_manifest,
+)
 
-SEMANTIC_INDEX_PATH = settings.index_dir / "semantic.faiss"
-SEMANTIC_META_PATH = settings.index_dir / "semantic_meta.json"
+INDEX_NAME = "semantic"
 SEMANTIC_DATA_PATH = settings.repo_root / "data" / "semantic" / "semantic_knowledge.json"
 
 
@@ -126,41 +134,71 @@ def _merge_stops(
     return merged
 
 
-def _build_semantic_documents() -> List[SemanticIndexDocument]:
+# A stop is only near its landmarks, so naming one is weaker evidence than naming the stop.
+NEARBY_LANDMARK_WEIGHT = 0.9
+
+
+def _lexicon_entries(
+    stops: Sequence[StopSemanticInfo],
+    landmarks: Sequence[LandmarkSemanticInfo],
+) -> List[Dict[str, Any]]:
+    """Exact strings people use for each document, for the lexical fast path."""
+    entries: List[Dict[str, Any]] = []
+
+    def add(phrase: str, doc_id: str, kind: str, weight: float = 1.0) -> None:
+        if phrase.strip():
+            entries.append({"phrase": phrase, "doc_id": doc_id, "kind": kind, "weight": weight})
+
+    for stop in stops:
+        add(stop.official_name, stop.stop_id, "name")
+        for nickname in stop.nicknames:
+            add(nickname, stop.stop_id, "nickname")
+        for landmark in stop.landmarks_nearby:
+            add(landmark, stop.stop_id, "nearby_landmark", NEARBY_LANDMARK_WEIGHT)
+    for landmark in landmarks:
+        add(landmark.name, landmark.landmark_id, "name")
+        for alias in landmark.aliases:
+            add(alias, landmark.landmark_id, "alias")
+    return entries
+
+
+def _build_semantic_documents() -> Tuple[List[SemanticIndexDocument], List[Dict[str, Any]]]:
     dynamic_rows = _fetch_dynamic_stops()
     overlay_map, landmarks = _load_semantic_overlay()
     stops = _merge_stops(dynamic_rows, overlay_map)
     stop_docs = build_stop_documents(stops)
     landmark_docs = build_landmark_documents(landmarks)
-    return stop_docs + landmark_docs
-
+    return stop_docs + landmark_docs, _lexicon_entries(stops, landmarks)
 
-def _embed_documents(documents: Sequence[SemanticIndexDocument]) -> np.ndarray:
-    if not documents:
-        return np.empty((0, 0), dtype="float32")
 
-    model = SentenceTransformer(settings.sbert_model)
-    embeddings = model.encode(
-        [doc.text for doc in documents],
-        show_progress_bar=True,
-        batch_size=64,
-        normalize_embeddings=True,
-    ).astype("float32")
-    return embeddings
+def _embed_documents(encoder: CachedEncoder, documents: Sequence[SemanticIndexDocument]) -> np.ndarray:
+    # Only documents whose text changed since an earlier build are run through the model.
+    return encoder.encode([doc.text for doc in documents], show_progress_bar=True)
 
 
 def _write_index(
+    encoder: CachedEncoder,
     documents: Sequence[SemanticIndexDocument],
     embeddings: np.ndarray,
-) -> None:
+    lexicon: Sequence[Dict[str, Any]],
+) -> Optional[Dict[str, Any]]:
+    """Write a new version and publish it; serving workers pick it up from the manifest."""
     if not documents or embeddings.size == 0:
         print("No semantic documents to index.")
-        return
+        return None
 
     dim = len(embeddings[0])
-    index = faiss.IndexFlatIP(dim)
-    index.add(embeddings)
-    faiss.write_index(index, str(SEMANTIC_INDEX_PATH))
+    index, index_type = build_index(embeddings)
+
+    out_dir = settings.index_dir
+    previous = read_manifest(out_dir, INDEX_NAME)
+    version = new_version()
+    files = {
+        "index": versioned_path(out_dir, INDEX_NAME, version, ".faiss"),
+        "meta": versioned_path(out_dir, INDEX_NAME, version, ".meta.json"),
+        "lexicon": versioned_path(out_dir, INDEX_NAME, version, ".lexicon.json"),
+    }
+    faiss.write_index(index, str(files["index"]))
 
     meta = [
         {
@@ -170,15 +208,36 @@ def _write_index(
         }
         for doc in documents
     ]
-    SEMANTIC_META_PATH.write_bytes(orjson.dumps({"documents": meta}, option=orjson.OPT_INDENT_2))
+    files["meta"].write_bytes(orjson.dumps({"documents": meta}, option=orjson.OPT_INDENT_2))
+    files["lexicon"].write_bytes(orjson.dumps({"entries": list(lexicon)}, option=orjson.OPT_INDENT_2))
+
+    manifest = write_manifest(
+        out_dir,
+        INDEX_NAME,
+        version,
+        files,
+        documents=len(documents),
+        dim=dim,
+        index_type=index_type,
+        model=settings.sbert_model,
+        score_stats=top1_score_stats(encoder, index),
+    )
+    # The previous version stays on disk for workers that have not swapped yet.
+    prune_versions(out_dir, INDEX_NAME, keep=[version] + ([previous["version"]] if previous else []))
+    return manifest
 
 
 def build_semantic_index() -> None:
     print("Building semantic FAISS index...")
-    documents = _build_semantic_documents()
-    embeddings = _embed_documents(documents)
-    _write_index(documents, embeddings)
-    print(f"Wrote {len(documents)} semantic documents to {SEMANTIC_INDEX_PATH}")
+    documents, lexicon = _build_semantic_documents()
+    encoder = get_encoder()
+    embeddings = _embed_documents(encoder, documents)
+    manifest = _write_index(encoder, documents, embeddings, lexicon)
+    if manifest is not None:
+        print(
+            f"Published semantic index {manifest['version']}: {len(documents)} documents, "
+            f"{len(lexicon)} lexical phrases in {settings.index_dir} ({encoder.stats()})"
+        )
 
 
 if __name__ == "__main__":
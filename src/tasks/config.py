@@ -22,6 +22,10 @@ class Settings:
 
     gtfs_url: str = _env("GTFS_URL", "https://passio3.com/rutgers/passioTransit/gtfs/google_transit.zip")
     gtfs_schema: str = _env("GTFS_SCHEMA", "gtfs")
+    # Feed versions kept as gtfs_old_<stamp> schemas after a swap, for gtfs_loader.py --rollback.
+    gtfs_keep_versions: int = int(os.getenv("GTFS_KEEP_VERSIONS", "1"))
+    # Postgres connections used to load tables (and convert stop_times) in parallel.
+    gtfs_load_workers: int = int(os.getenv("GTFS_LOAD_WORKERS", "4"))
 
     database_url: str | None = os.getenv("DATABASE_URL")
     pg_host: str = os.getenv("PGHOST", "localhost")
@@ -32,9 +36,21 @@ class Settings:
 
     build_faiss: bool = os.getenv("BUILD_FAISS", "true").lower() == "true"
     sbert_model: str = os.getenv("SBERT_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+    # faiss index_factory string for the semantic and route indexes ("Flat", "HNSW32", "IVF1024,PQ32").
+    # Collections under faiss_min_docs stay Flat. See src/tasks/bench_ann_index.py.
+    faiss_index: str = os.getenv("FAISS_INDEX", "Flat")
+    faiss_min_docs: int = int(os.getenv("FAISS_MIN_DOCS", "10000"))
+
+    shape_tolerances_m: tuple[float, ...] = tuple(
+        float(t) for t in os.getenv("SHAPE_TOLERANCES_M", "2,10,40").split(",") if t.strip()
+    )
 
     def dsn(self) -> str:
         if self.database_url:
+            # DATABASE_URL is shared with the app's SQLAlchemy engine ("postgresql+psycopg://...");
+            # psycopg only takes the plain scheme.
+            if self.database_url.startswith("postgresql+"):
+                return "postgresql://" + self.database_url.split("://", 1)[1]
             return self.database_url
         return f"postgresql://{self.pg_user}:{self.pg_password}@{self.pg_host}:{self.pg_port}/{self.pg_database}"
 
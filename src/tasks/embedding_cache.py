@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Sequence
+
+import numpy as np
+
+from config import settings
+
+# Entries no build has asked for in this long are dropped (documents that left the feed).
+_MAX_IDLE_S = 30 * 24 * 3600
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEncoder:
+    """Normalized document embeddings, persisted by (model name, sha256 of the text).
+
+    Builders only encode texts not seen before with the same model; the model itself is loaded
+    on the first miss, so a build where nothing changed never loads it at all.
+    """
+
+    def __init__(self, model_name: str, path: Path) -> None:
+        self.model_name = model_name
+        self.path = path
+        self._model = None
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(path))
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL, text_hash TEXT NOT NULL, dim INTEGER NOT NULL,"
+            " vector BLOB NOT NULL, used_at INTEGER NOT NULL,"
+            " PRIMARY KEY (model, text_hash))"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+
+            self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def _lookup(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(hashes))
+        # SQLite caps bound parameters per statement.
+        for start in range(0, len(unique), 500):
+            chunk = unique[start : start + 500]
+            rows = self._db.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                [self.model_name, *chunk],
+            )
+            for text_hash, blob in rows:
+                found[text_hash] = np.frombuffer(blob, dtype="float32")
+        return found
+
+    def encode(self, texts: Sequence[str], show_progress_bar: bool = False) -> np.ndarray:
+        """(n, dim) float32 embeddings in the order of ``texts``."""
+        if not texts:
+            return np.empty((0, 0), dtype="float32")
+        hashes = [_text_hash(text) for text in texts]
+        cached = self._lookup(hashes)
+        missing: Dict[str, str] = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in cached:
+                missing.setdefault(text_hash, text)
+        self.hits += len(texts) - sum(1 for h in hashes if h in missing)
+        self.misses += len(missing)
+
+        now = int(time.time())
+        if missing:
+            fresh = self.model.encode(
+                list(missing.values()),
+                show_progress_bar=show_progress_bar,
+                batch_size=64,
+                normalize_embeddings=True,
+            ).astype("float32")
+            rows = [
+                (self.model_name, text_hash, vector.shape[0], vector.tobytes(), now)
+                for text_hash, vector in zip(missing, fresh)
+            ]
+            self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            cached.update(zip(missing, fresh))
+        self._db.executemany(
+            "UPDATE embeddings SET used_at = ? WHERE model = ? AND text_hash = ?",
+            [(now, self.model_name, text_hash) for text_hash in set(hashes) - set(missing)],
+        )
+        self._db.commit()
+        return np.stack([cached[text_hash] for text_hash in hashes])
+
+    def prune(self, max_idle_s: int = _MAX_IDLE_S) -> int:
+        cur = self._db.execute("DELETE FROM embeddings WHERE used_at < ?", (int(time.time()) - max_idle_s,))
+        self._db.commit()
+        return cur.rowcount
+
+    def stats(self) -> str:
+        return f"{self.hits} cached, {self.misses} encoded with {self.model_name}"
+
+
+@lru_cache(maxsize=1)
+def get_encoder() -> CachedEncoder:
+    """One encoder (and at most one model load) per process, shared by every builder."""
+    return CachedEncoder(settings.sbert_model, settings.index_dir / "embedding_cache.sqlite")
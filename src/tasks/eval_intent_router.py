@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import orjson
+
+from src.app.core.config import settings as app_settings
+from src.app.services.intent_router import FastRoute, fast_route
+
+EVAL_PATH = Path(__file__).resolve().parents[2] / "data" / "eval" / "intent_eval.jsonl"
+
+
+def _load_cases(path: Path) -> List[Dict[str, Any]]:
+    return [orjson.loads(line) for line in path.read_bytes().splitlines() if line.strip()]
+
+
+def _semantic_hits(message: str) -> List[Tuple[str, float]]:
+    """Stop hits the chat router would compute for ``message``."""
+    from src.app.services import retrieval
+    from src.app.services.llm_router import _resolve_context, _search_filter
+
+    retrieved = asyncio.run(retrieval.retrieve(message, k=5, filters=_search_filter(message, None, None)))
+    return _resolve_context(message, retrieved.hits, retrieved.embedding).stop_hits
+
+
+def _stored_hits(case: Dict[str, Any]) -> List[Tuple[str, float]]:
+    # Hand-written hits stand in until --record has been run against a real index.
+    raw = case["stop_hits"] if "stop_hits" in case else case.get("synthetic_stop_hits") or []
+    return [(str(s), float(score)) for s, score in raw]
+
+
+def _check_labels(cases: Sequence[Dict[str, Any]]) -> None:
+    """Fail if a case expects (or stands next to) a stop the index does not have."""
+    from src.app.services import semantic_search
+
+    known = semantic_search.stop_ids()
+    missing = sorted(
+        {
+            stop_id
+            for case in cases
+            for stop_id in [*(case["expected"].get("stopIds") or []), *(case.get("nearby_stop_ids") or [])]
+        }
+        - known
+    )
+    if missing:
+        raise SystemExit(f"Stop ids not in the semantic index ({len(known)} stops): {', '.join(missing)}")
+
+
+def _record(path: Path, cases: Sequence[Dict[str, Any]], hits: Sequence[List[Tuple[str, float]]]) -> None:
+    """Replace the stored hits in ``path`` with the ones the live index returned."""
+    lines = []
+    for case, stop_hits in zip(cases, hits):
+        case = {key: value for key, value in case.items() if key not in ("stop_hits", "synthetic_stop_hits")}
+        case["stop_hits"] = [[stop_id, round(score, 4)] for stop_id, score in stop_hits]
+        # Same layout as the hand-written file, so a re-record diffs cleanly
+        lines.append(json.dumps(case, ensure_ascii=False))
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def _is_correct(route: FastRoute, expected: Dict[str, Any]) -> bool:
+    if route.config.type != expected["type"]:
+        return False
+    if route.config.type == "bus_arrivals":
+        return set(route.config.stopIds) == set(expected.get("stopIds") or [])
+    return True
+
+
+def _evaluate(
+    cases: Sequence[Dict[str, Any]],
+    hits: Sequence[List[Tuple[str, float]]],
+    recorded: Sequence[bool],
+    threshold: float,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """Bypass rate and recall over every case; accuracy only over cases with recorded hits."""
+    bypassed = checked = correct = eligible = eligible_bypassed = 0
+    mistakes: List[str] = []
+    for case, stop_hits, is_recorded in zip(cases, hits, recorded):
+        expected = case["expected"]
+        is_widget = expected["type"] != "chat_message"
+        eligible += is_widget
+        route: Optional[FastRoute] = fast_route(
+            case["message"], stop_hits, case.get("nearby_stop_ids") or [], threshold
+        )
+        if route is None:
+            continue
+        bypassed += 1
+        eligible_bypassed += is_widget
+        if not is_recorded:
+            continue
+        checked += 1
+        if _is_correct(route, expected):
+            correct += 1
+        else:
+            mistakes.append(f"{case['message']!r}: got {route.config.model_dump()}, expected {expected}")
+    total = len(cases)
+    return (
+        {
+            "bypass_rate": bypassed / total if total else 0.0,
+            # Hand-written hits rank the expected stop first by construction, so they prove nothing.
+            "accuracy": correct / checked if checked else None,
+            "recall": eligible_bypassed / eligible if eligible else 0.0,
+            "bypassed": bypassed,
+            "total": total,
+        },
+        mistakes,
+    )
+
+
+def eval_intent_router(path: Path, thresholds: Sequence[float], semantic: bool, record: bool = False) -> None:
+    cases = _load_cases(path)
+    if semantic or record:
+        _check_labels(cases)
+        hits = [_semantic_hits(case["message"]) for case in cases]
+        recorded = [True] * len(cases)
+        source = "live semantic index"
+        if record:
+            _record(path, cases, hits)
+            print(f"Recorded stop hits for {len(cases)} cases in {path}")
+    else:
+        hits = [_stored_hits(case) for case in cases]
+        recorded = ["stop_hits" in case for case in cases]
+        synthetic = recorded.count(False)
+        source = "recorded hits" if not synthetic else f"{synthetic} with synthetic hits"
+    print(f"{len(cases)} cases from {path} ({source})")
+    if not all(recorded):
+        print("Accuracy only counts cases with recorded hits; run with --record against a real index.")
+    print(f"{'threshold':>9}  {'bypass':>7}  {'accuracy':>8}  {'recall':>7}")
+    mistakes_at_default: List[str] = []
+    for threshold in thresholds:
+        metrics, mistakes = _evaluate(cases, hits, recorded, threshold)
+        marker = " *" if threshold == app_settings.intent_fast_path_threshold else ""
+        accuracy = "-" if metrics["accuracy"] is None else f"{metrics['accuracy']:.1%}"
+        print(
+            f"{threshold:>9.2f}  {metrics['bypass_rate']:>7.1%}  {accuracy:>8}  "
+            f"{metrics['recall']:>7.1%}{marker}"
+        )
+        if marker:
+            mistakes_at_default = mistakes
+    print("* configured intent_fast_path_threshold")
+    for line in mistakes_at_default:
+        print(f"  wrong: {line}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bypass rate and accuracy of the chat intent fast path.")
+    parser.add_argument("--path", type=Path, default=EVAL_PATH)
+    parser.add_argument(
+        "--thresholds",
+        default="0.4,0.5,0.6,0.7,0.8,0.9",
+        help="Comma-separated confidence thresholds to sweep",
+    )
+    parser.add_argument(
+        "--semantic",
+        action="store_true",
+        help="Recompute stop hits with the semantic index instead of using the recorded ones",
+    )
+    parser.add_argument(
+        "--record",
+        action="store_true",
+        help="Like --semantic, and write the hits back to --path as the recorded ones",
+    )
+    args = parser.parse_args()
+    thresholds = sorted({float(t) for t in args.thresholds.split(",") if t.strip()} | {app_settings.intent_fast_path_threshold})
+    eval_intent_router(args.path, thresholds, args.semantic, args.record)
+
+
+if __name__ == "__main__":
+    main()
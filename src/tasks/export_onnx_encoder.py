@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import argparse
+import shutil
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import orjson
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from sentence_transformers import SentenceTransformer
+
+from config import settings
+from src.app.services.onnx_encoder import CONFIG_FILE, MODEL_FILE, TOKENIZER_FILE, OnnxEncoder
+from src.app.utils.index_manifest import read_manifest
+
+ONNX_DIR = settings.index_dir / "onnx"
+EVAL_PATH = settings.repo_root / "data" / "eval" / "intent_eval.jsonl"
+# Lowest cosine similarity allowed between a PyTorch and an ONNX embedding of the same text.
+DEFAULT_TOLERANCE = 0.98
+
+
+class _LastHiddenState(torch.nn.Module):
+    def __init__(self, model: torch.nn.Module) -> None:
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids=None):  # type: ignore[no-untyped-def]
+        kwargs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if token_type_ids is not None:
+            kwargs["token_type_ids"] = token_type_ids
+        return self.model(**kwargs).last_hidden_state
+
+
+def _sample_texts(limit: int) -> List[str]:
+    """Texts the encoder will actually see: indexed documents and chat queries."""
+    texts: List[str] = []
+    manifest = read_manifest(settings.index_dir, "semantic")
+    meta_path = settings.index_dir / (manifest["files"]["meta"] if manifest else "semantic_meta.json")
+    if meta_path.exists():
+        docs = orjson.loads(meta_path.read_bytes()).get("documents", [])
+        texts += [doc["text"] for doc in docs if doc.get("text")]
+    if EVAL_PATH.exists():
+        texts += [orjson.loads(line)["message"] for line in EVAL_PATH.read_bytes().splitlines() if line.strip()]
+    if not texts:
+        texts = ["when is the next bus at livingston plaza", "which routes are running", "hill center"]
+    return texts[:limit]
+
+
+def _export(st: SentenceTransformer, out_dir: Path, opset: int) -> None:
+    transformer, pooling = st[0], st[1]
+    pooling_config = pooling.get_config_dict()
+    # "pooling_mode" in newer sentence-transformers, one boolean per mode in older ones.
+    if pooling_config.get("pooling_mode", "mean" if pooling_config.get("pooling_mode_mean_tokens") else None) != "mean":
+        raise SystemExit(f"{settings.sbert_model} does not use mean pooling; the ONNX encoder only implements mean")
+
+    tokenizer = transformer.tokenizer
+    sample = tokenizer(["when is the next bus"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    fp32_path = out_dir / "model.onnx"
+    torch.onnx.export(
+        _LastHiddenState(transformer.auto_model.eval()),
+        tuple(sample[name] for name in input_names),
+        str(fp32_path),
+        input_names=input_names,
+        output_names=["last_hidden_state"],
+        dynamic_axes={name: {0: "batch", 1: "seq"} for name in input_names + ["last_hidden_state"]},
+        opset_version=opset,
+        # The TorchScript exporter takes dynamic_axes as is and needs no onnxscript.
+        dynamo=False,
+    )
+    quantize_dynamic(str(fp32_path), str(out_dir / MODEL_FILE), weight_type=QuantType.QInt8)
+    fp32_path.unlink()
+
+    tokenizer.backend_tokenizer.save(str(out_dir / TOKENIZER_FILE))
+    (out_dir / CONFIG_FILE).write_bytes(
+        orjson.dumps(
+            {
+                "model": settings.sbert_model,
+                "model_file": MODEL_FILE,
+                "max_seq_length": int(st.max_seq_length),
+                "dim": int(st.get_sentence_embedding_dimension()),
+                "pad_token_id": int(tokenizer.pad_token_id or 0),
+                "quantization": "dynamic-int8",
+            },
+            option=orjson.OPT_INDENT_2,
+        )
+    )
+
+
+def _verify(st: SentenceTransformer, out_dir: Path, tolerance: float, limit: int) -> float:
+    texts = _sample_texts(limit)
+    reference = st.encode(texts, batch_size=64, normalize_embeddings=True).astype("float32")
+    candidate = OnnxEncoder(out_dir).encode(texts, batch_size=64, normalize_embeddings=True)
+    cosine = np.sum(reference * candidate, axis=1)
+    worst = int(np.argmin(cosine))
+    print(
+        f"Checked {len(texts)} texts: cosine to PyTorch min={cosine.min():.4f} "
+        f"mean={cosine.mean():.4f} (tolerance {tolerance})"
+    )
+    if cosine.min() < tolerance:
+        raise SystemExit(f"ONNX encoder out of tolerance on {texts[worst]!r}: cosine {cosine[worst]:.4f}")
+    return float(cosine.min())
+
+
+def export_onnx_encoder(tolerance: float, opset: int, limit: int) -> None:
+    print(f"Exporting {settings.sbert_model} to int8 ONNX...")
+    st = SentenceTransformer(settings.sbert_model, device="cpu")
+    staging = ONNX_DIR.with_name(ONNX_DIR.name + ".tmp")
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+    try:
+        _export(st, staging, opset)
+        _verify(st, staging, tolerance, limit)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    # Only a verified export replaces the one workers are serving from.
+    shutil.rmtree(ONNX_DIR, ignore_errors=True)
+    staging.rename(ONNX_DIR)
+    size_mb = (ONNX_DIR / MODEL_FILE).stat().st_size / 1e6
+    print(f"Wrote {ONNX_DIR / MODEL_FILE} ({size_mb:.1f} MB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the SBERT query encoder to int8 ONNX and verify it.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Minimum cosine to PyTorch")
+    parser.add_argument("--opset", type=int, default=14)
+    parser.add_argument("--verify-limit", type=int, default=2000, help="Texts compared against PyTorch")
+    args = parser.parse_args()
+    export_onnx_encoder(args.tolerance, args.opset, args.verify_limit)
@@ -1,9 +1,17 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import re
 import requests
+import threading
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
 
 import psycopg
 from tqdm import tqdm
@@ -15,15 +23,21 @@ GTFS_FILES: list[str] = [
     "stop_times.txt", "calendar.txt", "calendar_dates.txt", "shapes.txt",
 ]
 
+_print_lock = threading.Lock()
+
+def _log(msg: str):
+    # Tables load on several threads at once; keep their lines whole.
+    with _print_lock:
+        print(msg, flush=True)
+
 def _sanitize_col(name: str) -> str:
     s = name.strip().lower()
     s = re.sub(r"\W+", "_", s)
     s = re.sub(r"^(\d)", r"c_\1", s)
     return s.strip("_") or "col"
 
-def _read_header(path: Path) -> list[str]:
-    with open(path, "r", encoding="utf-8-sig") as f:
-        line = f.readline().rstrip("\n\r")
+def _parse_header(line: bytes) -> list[str]:
+    line = line.decode("utf-8-sig").rstrip("\n\r")
     cols = [_sanitize_col(c.strip()) for c in line.split(",")]
     # dedupe
     seen = {}
@@ -34,132 +48,443 @@ def _read_header(path: Path) -> list[str]:
         out.append(c if n == 1 else f"{c}_{n}")
     return out
 
-def download_gtfs_zip(url: str, dst: Path) -> Path:
+def download_gtfs_zip(url: str, dst: Path, force: bool = False) -> bool:
+    """Download ``url`` to ``dst`` unless the copy there is still current; True if it was downloaded.
+
+    The ETag and Last-Modified of the last download are kept next to ``dst`` and sent back as
+    If-None-Match / If-Modified-Since, so an unchanged feed costs a single 304.
+    """
     dst.parent.mkdir(parents=True, exist_ok=True)
-    resp = requests.get(url, stream=True, timeout=60)
+    validators_path = dst.with_name(dst.name + ".http.json")
+    headers = {}
+    if dst.exists() and validators_path.exists() and not force:
+        saved = json.loads(validators_path.read_text())
+        if saved.get("etag"):
+            headers["If-None-Match"] = saved["etag"]
+        if saved.get("last_modified"):
+            headers["If-Modified-Since"] = saved["last_modified"]
+
+    resp = requests.get(url, stream=True, timeout=60, headers=headers)
+    if resp.status_code == 304:
+        resp.close()
+        return False
     resp.raise_for_status()
     total = int(resp.headers.get("content-length", 0))
-    with open(dst, "wb") as f, tqdm(total=total or None, unit="B", unit_scale=True, desc="download") as bar:
+    # Written aside and renamed, so a failed download never leaves a truncated zip behind.
+    tmp = dst.with_name(dst.name + ".part")
+    with open(tmp, "wb") as f, tqdm(total=total or None, unit="B", unit_scale=True, desc="download") as bar:
         for chunk in resp.iter_content(chunk_size=8192):
             f.write(chunk)
             bar.update(len(chunk))
-    return dst
-
-def extract_zip(zip_path: Path, target_dir: Path):
-    target_dir.mkdir(parents=True, exist_ok=True)
-    for old in target_dir.glob("*.txt"):
-        old.unlink()
-    with zipfile.ZipFile(zip_path) as z:
-        z.extractall(target_dir)
-
-def _alter_to_int(cur: psycopg.Cursor, table: str, col: str):
-    cur.execute(f"""
-        ALTER TABLE {settings.gtfs_schema}."{table}"
-        ALTER COLUMN "{col}" TYPE integer
-        USING NULLIF("{col}", '')::integer
-    """)
-
-def _alter_to_date_yyyymmdd(cur: psycopg.Cursor, table: str, col: str):
-    cur.execute(f"""
-        ALTER TABLE {settings.gtfs_schema}."{table}"
-        ALTER COLUMN "{col}" TYPE date
-        USING CASE
-            WHEN "{col}" ~ '^\d{{8}}$' THEN to_date("{col}", 'YYYYMMDD')
-            WHEN "{col}" = '' THEN NULL
-            
-        END
-    """)
-
-def rebuild_postgres_from_dir(txt_dir: Path):
-    dsn = settings.dsn()
-
-    if dsn.startswith("postgresql+"):
-        dsn = "postgresql://" + dsn.split("://", 1)[1]
+    tmp.replace(dst)
+    validators_path.write_text(
+        json.dumps({"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")})
+    )
+    return True
+
+def _zip_names(z: zipfile.ZipFile) -> dict[str, str]:
+    # Some feeds put the files in a folder inside the zip.
+    return {Path(info.filename).name: info.filename for info in z.infolist() if not info.is_dir()}
+
+def _feed_members(source: Path) -> dict[str, int]:
+    """GTFS files present in ``source`` (a directory or a .zip) and their uncompressed sizes."""
+    if source.is_dir():
+        return {fname: (source / fname).stat().st_size for fname in GTFS_FILES if (source / fname).exists()}
+    with zipfile.ZipFile(source) as z:
+        names = _zip_names(z)
+        return {fname: z.getinfo(names[fname]).file_size for fname in GTFS_FILES if fname in names}
+
+@contextmanager
+def _open_member(source: Path, fname: str) -> Iterator[BinaryIO]:
+    """``fname`` from a directory, or decompressed on the fly from a zip without extracting it."""
+    if source.is_dir():
+        with open(source / fname, "rb") as f:
+            yield f
+        return
+    # One ZipFile per caller: members are read from several threads at once.
+    with zipfile.ZipFile(source) as z, z.open(_zip_names(z)[fname]) as f:
+        yield f
+
+def _file_hashes(source: Path) -> dict[str, str]:
+    """sha256 of each GTFS file in ``source``, by table name."""
+    hashes: dict[str, str] = {}
+    for fname in _feed_members(source):
+        digest = hashlib.sha256()
+        with _open_member(source, fname) as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        hashes[fname.replace(".txt", "")] = digest.hexdigest()
+    return hashes
+
+def _feed_version(hashes: dict[str, str]) -> str:
+    """Load time plus a hash over the sha256 of each file."""
+    digest = hashlib.sha256()
+    for fname in GTFS_FILES:
+        table = fname.replace(".txt", "")
+        if table not in hashes:
+            continue
+        digest.update(fname.encode("utf-8"))
+        digest.update(hashes[table].encode("ascii"))
+    return f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{digest.hexdigest()[:12]}"
+
+# Types of the GTFS columns we know; anything else (and every id) stays text. Times are stored
+# as integer seconds after midnight of the service day, so "25:10:00" is 90600.
+COLUMN_TYPES: dict[str, dict[str, str]] = {
+    "stops": {"stop_lat": "float", "stop_lon": "float", "location_type": "int", "wheelchair_boarding": "int"},
+    "routes": {"route_type": "int", "route_sort_order": "int"},
+    "trips": {"direction_id": "int", "wheelchair_accessible": "int", "bikes_allowed": "int"},
+    "stop_times": {
+        "arrival_time": "time", "departure_time": "time", "stop_sequence": "int",
+        "pickup_type": "int", "drop_off_type": "int", "timepoint": "int", "shape_dist_traveled": "float",
+    },
+    "calendar": {
+        **{day: "int" for day in ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")},
+        "start_date": "date", "end_date": "date",
+    },
+    "calendar_dates": {"date": "date", "exception_type": "int"},
+    "shapes": {
+        "shape_pt_lat": "float", "shape_pt_lon": "float", "shape_pt_sequence": "int", "shape_dist_traveled": "float",
+    },
+}
+
+_SQL_TYPES = {"int": "integer", "float": "double precision", "date": "date", "time": "integer", "text": "text"}
+
+# Conversions from the raw text. The plain casts are tried first; if any value is malformed the
+# guarded ones turn it into NULL instead of failing the load.
+_CAST = {
+    "int": "NULLIF({c}, '')::integer",
+    "float": "NULLIF({c}, '')::double precision",
+    "date": "to_date(NULLIF(trim({c}), ''), 'YYYYMMDD')",
+    "time": "extract(epoch FROM NULLIF({c}, '')::interval)::integer",
+    "text": "{c}",
+}
+_GUARDED_CAST = {
+    "int": "CASE WHEN {c} ~ '^\\s*-?\\d+\\s*$' THEN {c}::integer END",
+    "float": "CASE WHEN {c} ~ '^\\s*-?(\\d+\\.?\\d*|\\.\\d+)([eE][-+]?\\d+)?\\s*$' THEN {c}::double precision END",
+    "date": "CASE WHEN {c} ~ '^\\s*\\d{{8}}\\s*$' THEN to_date(trim({c}), 'YYYYMMDD') END",
+    "time": """CASE WHEN {c} ~ '^\\s*\\d+:\\d\\d:\\d\\d\\s*$' THEN
+        split_part(trim({c}), ':', 1)::integer * 3600
+        + split_part(trim({c}), ':', 2)::integer * 60
+        + split_part(trim({c}), ':', 3)::integer END""",
+    "text": "{c}",
+}
+
+def _select(casts: dict[str, str], cols: list[str], kinds: list[str]) -> str:
+    return ", ".join(casts[k].format(c=f'"{c}"') for c, k in zip(cols, kinds))
+
+def _copy_rest(cur: psycopg.Cursor, target: str, f: BinaryIO, options: str = ""):
+    """COPY the rest of ``f``, its header line already read, into ``target``."""
+    with cur.copy(f"COPY {target} FROM STDIN WITH (FORMAT csv{options})") as cp:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                break
+            cp.write(chunk)
+
+def _page_ranges(cur: psycopg.Cursor, table: str, parts: int) -> list[tuple[int, Optional[int]]]:
+    """Split ``table`` into about ``parts`` ranges of heap pages (the last one open-ended)."""
+    cur.execute(f"SELECT pg_relation_size('{table}') / current_setting('block_size')::int")
+    pages = cur.fetchone()[0]
+    if pages == 0:
+        # Header-only file
+        return [(0, None)]
+    # Slicing only pays off past a few MB.
+    parts = max(1, min(parts, pages // 1024))
+    step = -(-pages // parts)
+    return [(lo, lo + step if lo + step < pages else None) for lo in range(0, pages, step)]
+
+def _insert_converted(target: str, raw: str, select: str, lo: int, hi: Optional[int]):
+    # Each slice runs on its own connection, so the conversion uses more than one core.
+    where = f"ctid >= '({lo},0)'::tid" + (f" AND ctid < '({hi},0)'::tid" if hi is not None else "")
+    with psycopg.connect(settings.dsn(), autocommit=True) as con:
+        con.execute(f"INSERT INTO {target} SELECT {select} FROM {raw} WHERE {where};")
+
+def _convert(cur: psycopg.Cursor, table: str, target: str, raw: str, cols: list[str], kinds: list[str]):
+    """Fill ``target`` from the all-text ``raw``, converting in parallel page ranges."""
+    ranges = _page_ranges(cur, raw, settings.gtfs_load_workers)
+
+    def run(casts: dict[str, str]):
+        select = _select(casts, cols, kinds)
+        with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+            for fut in [pool.submit(_insert_converted, target, raw, select, lo, hi) for lo, hi in ranges]:
+                fut.result()
+
+    try:
+        run(_CAST)
+    except psycopg.DataError as e:
+        _log(f"  ! {table}: {str(e).splitlines()[0]}; malformed values become NULL")
+        # Other slices may have gone in already.
+        cur.execute(f"TRUNCATE {target};")
+        run(_GUARDED_CAST)
+
+def _load_table(cur: psycopg.Cursor, schema: str, table: str, source: Path, fname: str):
+    """Create ``table`` with typed columns and fill it straight from ``source``.
+
+    Integers, floats and YYYYMMDD dates are parsed by COPY itself. Times need a conversion, so
+    tables with time columns (and any file COPY rejects) go through an unlogged text table and
+    INSERT … SELECT. Either way the final table is written once, never rewritten by ALTER TYPE.
+    """
+    target = f'"{schema}"."{table}"'
+    with _open_member(source, fname) as f:
+        header = f.readline()
+        cols = _parse_header(header)
+        kinds = [COLUMN_TYPES.get(table, {}).get(c, "text") for c in cols]
+        col_defs = ", ".join(f'"{c}" {_SQL_TYPES[k]}' for c, k in zip(cols, kinds))
+        cur.execute(f"CREATE TABLE {target} ({col_defs});")
+
+        typed = [f'"{c}"' for c, k in zip(cols, kinds) if k != "text"]
+        if "time" not in kinds:
+            # Quoted empty fields ("") would otherwise be '' and fail integer/date input.
+            force_null = f", FORCE_NULL ({', '.join(typed)})" if typed else ""
+            try:
+                _copy_rest(cur, target, f, force_null)
+                return
+            except psycopg.DataError as e:
+                # A failed COPY writes nothing; redo it with the forgiving conversions below.
+                _log(f"  ! {table}: {str(e).splitlines()[0]}; loading through text")
+
+    # A regular (unlogged) table rather than a temp one, so other connections can convert slices of it.
+    raw = f'"{schema}"."_raw_{table}"'
+    raw_defs = ", ".join(f'"{c}" text' for c in cols)
+    cur.execute(f"CREATE UNLOGGED TABLE {raw} ({raw_defs});")
+    try:
+        with _open_member(source, fname) as f:
+            f.readline()
+            _copy_rest(cur, raw, f)
+        _convert(cur, table, target, raw, cols, kinds)
+    finally:
+        cur.execute(f"DROP TABLE IF EXISTS {raw};")
+
+def _copy_table(cur: psycopg.Cursor, live: str, schema: str, table: str):
+    """Copy an unchanged table from the live schema; it is already typed, so nothing is parsed."""
+    cur.execute(f'CREATE TABLE "{schema}"."{table}" (LIKE "{live}"."{table}");')
+    cur.execute(f'INSERT INTO "{schema}"."{table}" SELECT * FROM "{live}"."{table}";')
+
+def _schema_stamp() -> str:
+    # Sorts by time (to the microsecond), so the newest retired schema comes first.
+    return datetime.now(timezone.utc).strftime("%Y%m%dt%H%M%S%f")
+
+def _schema_exists(cur: psycopg.Cursor, name: str) -> bool:
+    cur.execute("SELECT to_regnamespace(%s) IS NOT NULL", (f'"{name}"',))
+    return bool(cur.fetchone()[0])
+
+def _schemas_like(cur: psycopg.Cursor, schema: str, kind: str) -> list[str]:
+    """``{schema}_{kind}_<stamp>`` schemas, newest first."""
+    cur.execute(
+        "SELECT nspname FROM pg_namespace WHERE nspname LIKE %s ORDER BY nspname DESC",
+        (f"{schema}\\_{kind}\\_%",),
+    )
+    return [row[0] for row in cur.fetchall()]
 
+def _retired_schemas(cur: psycopg.Cursor, schema: str) -> list[str]:
+    """Previously live versions kept for rollback, newest first."""
+    return _schemas_like(cur, schema, "old")
+
+_INDEXES: dict[str, list[tuple[str, str]]] = {
+    "stops": [("gtfs_stops_stop_id_idx", '"stop_id"')],
+    "routes": [("gtfs_routes_route_id_idx", '"route_id"')],
+    "trips": [("gtfs_trips_trip_id_idx", '"trip_id"'), ("gtfs_trips_route_id_idx", '"route_id"')],
+    "stop_times": [("gtfs_stop_times_trip_seq_idx", '"trip_id", "stop_sequence"')],
+    "calendar": [("gtfs_calendar_service_id_idx", '"service_id"')],
+    "calendar_dates": [("gtfs_calendar_dates_idx", '"service_id", "date"')],
+    "shapes": [("gtfs_shapes_id_seq_idx", '"shape_id", "shape_pt_sequence"')],
+}
+
+def _table_format(table: str) -> str:
+    """Changes whenever the loader would build ``table`` differently, so it gets reloaded."""
+    spec = json.dumps([COLUMN_TYPES.get(table), _INDEXES.get(table)], sort_keys=True)
+    return hashlib.sha256(spec.encode("utf-8")).hexdigest()[:12]
+
+def _schema_file_hashes(cur: psycopg.Cursor, schema: str) -> dict[str, tuple[str, str]]:
+    """(sha256, format) each table in ``schema`` was loaded from; empty for schemas without a record."""
+    cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'"{schema}"."feed_files"',))
+    if not cur.fetchone()[0]:
+        return {}
+    cur.execute(f'SELECT table_name, sha256, format FROM "{schema}"."feed_files"')
+    return {table: (sha256, fmt) for table, sha256, fmt in cur.fetchall()}
+
+def feed_file_hashes() -> dict[str, tuple[str, str]]:
+    """What each live GTFS table was loaded from; nightly_refresh rebuilds what depends on changes."""
+    with psycopg.connect(settings.dsn()) as con, con.cursor() as cur:
+        return _schema_file_hashes(cur, settings.gtfs_schema)
+
+def _load_and_index(schema: str, source: Path, fname: str, copy_from: Optional[str]) -> int:
+    """Load (or copy from ``copy_from``), index and ANALYZE one table on its own connection; returns its row count."""
+    table = fname.replace(".txt", "")
+    started = time.perf_counter()
+    with psycopg.connect(settings.dsn(), autocommit=True) as con, con.cursor() as cur:
+        if copy_from is None:
+            _load_table(cur, schema, table, source, fname)
+        else:
+            _copy_table(cur, copy_from, schema, table)
+        cur.execute(f'SELECT COUNT(*) FROM "{schema}"."{table}"')
+        n = cur.fetchone()[0]
+        origin = fname if copy_from is None else f"{copy_from}.{table} (unchanged)"
+        _log(f"  • Loaded {origin} → {schema}.{table} ({n} rows, {time.perf_counter() - started:.1f}s)")
+
+        for name, cols in _INDEXES.get(table, []):
+            try:
+                cur.execute(f'CREATE INDEX IF NOT EXISTS {name} ON "{schema}"."{table}" ({cols});')
+            except Exception as e:
+                _log(f"  ! Index {name} skipped: {e}")
+        # The planner needs stats before the first live query.
+        try:
+            cur.execute(f'ANALYZE "{schema}"."{table}"')
+        except Exception as e:
+            _log(f"  ! ANALYZE of {table} skipped: {e}")
+        _log(f"  • Indexed {schema}.{table} ({time.perf_counter() - started:.1f}s)")
+    return n
+
+def _load_schema(
+    cur: psycopg.Cursor,
+    schema: str,
+    source: Path,
+    hashes: dict[str, str],
+    unchanged: set[str],
+    live: str,
+) -> str:
+    """Load, type, index and ANALYZE the feed in ``schema``; returns its GTFS version.
+
+    Tables in ``unchanged`` are copied from the ``live`` schema instead of being parsed again.
+    Tables load concurrently, each over its own connection, and are indexed as soon as they are
+    in, while the others are still loading.
+    """
+    members = _feed_members(source)
+    for fname in GTFS_FILES:
+        if fname not in members:
+            print(f"  ! Skipping missing {fname}")
+
+    rows: dict[str, int] = {}
+    # Largest first, so stop_times is not left loading on its own at the end.
+    order = sorted(members, key=members.get, reverse=True)
+    with ThreadPoolExecutor(max_workers=settings.gtfs_load_workers) as pool:
+        futures = {
+            pool.submit(
+                _load_and_index, schema, source, fname, live if fname.replace(".txt", "") in unchanged else None
+            ): fname.replace(".txt", "")
+            for fname in order
+        }
+        try:
+            for fut in as_completed(futures):
+                rows[futures[fut]] = fut.result()
+        except BaseException:
+            # Let running loads finish before the caller drops the schema under them.
+            pool.shutdown(wait=True, cancel_futures=True)
+            raise
+
+    # What each table was loaded from, so the next refresh can tell what changed.
+    cur.execute(
+        f'CREATE TABLE "{schema}"."feed_files" (table_name text PRIMARY KEY, sha256 text NOT NULL, '
+        "format text NOT NULL, row_count bigint NOT NULL);"
+    )
+    cur.executemany(
+        f'INSERT INTO "{schema}"."feed_files" VALUES (%s, %s, %s, %s);',
+        [(table, hashes[table], _table_format(table), n) for table, n in rows.items()],
+    )
+
+    # The API polls this row to notice a new feed and rebuild its in-memory indexes; it goes live
+    # together with the tables when the schema is swapped in.
+    version = _feed_version(hashes)
+    cur.execute(f'CREATE TABLE "{schema}"."feed_version" (version text NOT NULL, loaded_at timestamptz NOT NULL DEFAULT now());')
+    cur.execute(f'INSERT INTO "{schema}"."feed_version" (version) VALUES (%s);', (version,))
+    return version
+
+def _swap_in(con: psycopg.Connection, staging: str, schema: str, retired: Optional[str]):
+    """Make ``staging`` the live schema in one transaction, renaming the live one to ``retired``.
+
+    Queries resolve schema names per statement, so each sees either the old tables or the new
+    ones; statements already running finish on the old tables, which stay until pruned.
+    """
+    with con.transaction(), con.cursor() as cur:
+        # Renames wait behind DDL on the schema, never behind reads; don't queue forever.
+        cur.execute("SET LOCAL lock_timeout = '10s'")
+        if retired is not None and _schema_exists(cur, schema):
+            cur.execute(f'ALTER SCHEMA "{schema}" RENAME TO "{retired}"')
+        cur.execute(f'ALTER SCHEMA "{staging}" RENAME TO "{schema}"')
+
+def _prune_retired(cur: psycopg.Cursor, schema: str, keep: int):
+    for name in _retired_schemas(cur, schema)[keep:]:
+        cur.execute(f'DROP SCHEMA "{name}" CASCADE')
+        print(f"  • Dropped retired schema {name}")
+
+def rebuild_postgres(source: Path, force: bool = False) -> list[str]:
+    """Load the feed into a staging schema and swap it in; the API keeps serving the old one until then.
+
+    ``source`` is the feed's .zip (read in place, nothing is extracted) or a directory of .txt files.
+    Only files whose content changed since the live load are parsed; the other tables are copied
+    over from the live schema. When nothing changed the live schema is left alone. Returns the
+    tables that changed.
+    """
     schema = settings.gtfs_schema
+    stamp = _schema_stamp()
+    staging = f"{schema}_staging_{stamp}"
+    hashes = _file_hashes(source)
 
-    with psycopg.connect(
-            dbname="ru_gtfs", user="appuser", password="1234", host="localhost", port=5432,
-            autocommit=True
-    ) as con:
+    with psycopg.connect(settings.dsn(), autocommit=True) as con:
         with con.cursor() as cur:
             cur.execute("SELECT current_database(), current_user")
             db, usr = cur.fetchone()
             print(f"• Connected to DB={db} as {usr}")
 
-            cur.execute(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE;')
-            cur.execute(f'CREATE SCHEMA "{schema}";')
-
-            for fname in GTFS_FILES:
-                csv_path = txt_dir / fname
-                if not csv_path.exists():
-                    print(f"  ! Skipping missing {fname}")
-                    continue
-
-                table = fname.replace(".txt", "")
-                cols = _read_header(csv_path)
-                col_defs = ", ".join(f'"{c}" text' for c in cols)
-                cur.execute(f'CREATE TABLE "{schema}"."{table}" ({col_defs});')
-
-                with open(csv_path, "rb") as f:
-                    copy_sql = f'COPY "{schema}"."{table}" FROM STDIN WITH (FORMAT csv, HEADER true)'
-                    with cur.copy(copy_sql) as cp:
-                        while True:
-                            chunk = f.read(1024 * 1024)
-                            if not chunk:
-                                break
-                            cp.write(chunk)
-
-                cur.execute(f'SELECT COUNT(*) FROM "{schema}"."{table}"')
-                n = cur.fetchone()[0]
-                print(f"  • Loaded {fname} → {schema}.{table} ({n} rows)")
-
-            print("• Typing critical columns…")
-            for (tbl, col, fn) in [
-                ("stop_times", "stop_sequence", _alter_to_int),
-                ("shapes", "shape_pt_sequence", _alter_to_int),
-                ("routes", "route_type", _alter_to_int),
-            ]:
-                try:
-                    fn(cur, tbl, col)
-                except Exception as e:
-                    print(f"  ! Could not type {tbl}.{col}: {e}")
-
-            for (tbl, col) in [("calendar", "start_date"),
-                               ("calendar", "end_date"),
-                               ("calendar_dates", "date")]:
-                try:
-                    _alter_to_date_yyyymmdd(cur, tbl, col)
-                except Exception as e:
-                    print(f"  ! Could not type {tbl}.{col}: {e}")
-
-            print("• Creating indexes…")
-            idx_sql = [
-                f'CREATE INDEX IF NOT EXISTS gtfs_stops_stop_id_idx ON "{schema}"."stops" ("stop_id");',
-                f'CREATE INDEX IF NOT EXISTS gtfs_routes_route_id_idx ON "{schema}"."routes" ("route_id");',
-                f'CREATE INDEX IF NOT EXISTS gtfs_trips_trip_id_idx  ON "{schema}"."trips" ("trip_id");',
-                f'CREATE INDEX IF NOT EXISTS gtfs_trips_route_id_idx ON "{schema}"."trips" ("route_id");',
-                f'CREATE INDEX IF NOT EXISTS gtfs_stop_times_trip_seq_idx ON "{schema}"."stop_times" ("trip_id", "stop_sequence");',
-                f'CREATE INDEX IF NOT EXISTS gtfs_calendar_service_id_idx ON "{schema}"."calendar" ("service_id");',
-                f'CREATE INDEX IF NOT EXISTS gtfs_calendar_dates_idx    ON "{schema}"."calendar_dates" ("service_id", "date");',
-                f'CREATE INDEX IF NOT EXISTS gtfs_shapes_id_seq_idx      ON "{schema}"."shapes" ("shape_id", "shape_pt_sequence");',
-            ]
-            for sql in idx_sql:
-                try:
-                    cur.execute(sql)
-                except Exception as e:
-                    print(f"  ! Index skipped: {e}")
+            current = {table: (sha256, _table_format(table)) for table, sha256 in hashes.items()}
+            previous = {} if force else _schema_file_hashes(cur, schema)
+            changed = sorted(t for t in current.keys() | previous.keys() if current.get(t) != previous.get(t))
+            if not changed:
+                print(f"• Feed unchanged; {schema} left as it is")
+                return []
+            unchanged = current.keys() - set(changed)
+            print(f"• Changed: {', '.join(changed)}" + (f"; copying {len(unchanged)} unchanged tables" if unchanged else ""))
 
+            # Left behind by a load that was killed or failed to swap.
+            for stale in _schemas_like(cur, schema, "staging"):
+                cur.execute(f'DROP SCHEMA "{stale}" CASCADE;')
+                print(f"  • Dropped stale staging schema {stale}")
+
+            cur.execute(f'CREATE SCHEMA "{staging}";')
             try:
-                cur.execute(f'ANALYZE "{schema}"')
-            except Exception as e:
-                print(f"  ! ANALYZE skipped: {e}")
+                version = _load_schema(cur, staging, source, hashes, unchanged, schema)
+            except BaseException:
+                cur.execute(f'DROP SCHEMA IF EXISTS "{staging}" CASCADE;')
+                raise
+
+        _swap_in(con, staging, schema, retired=f"{schema}_old_{stamp}")
+        print(f"• Published GTFS version {version} ({staging} → {schema})")
 
-def nightly_rebuild():
+        with con.cursor() as cur:
+            _prune_retired(cur, schema, settings.gtfs_keep_versions)
+    return changed
+
+def rollback_gtfs():
+    """Swap the most recently retired schema back in; the current one becomes retired."""
+    schema = settings.gtfs_schema
+    with psycopg.connect(settings.dsn(), autocommit=True) as con:
+        with con.cursor() as cur:
+            retired = _retired_schemas(cur, schema)
+        if not retired:
+            raise SystemExit(f"No retired {schema} schema to roll back to")
+        stamp = _schema_stamp()
+        # Named as retired now, so the next rollback toggles back instead of going further back.
+        _swap_in(con, retired[0], schema, retired=f"{schema}_old_{stamp}")
+        print(f"• Rolled back: {retired[0]} → {schema}")
+
+def nightly_rebuild(force: bool = False) -> list[str]:
+    """Download and load the feed; returns the tables that changed (none on a quiet night)."""
     zip_path = settings.data_dir / "google_transit.zip"
     print("• Downloading GTFS …")
-    download_gtfs_zip(settings.gtfs_url, zip_path)
-    print("• Extracting …")
-    extract_zip(zip_path, settings.data_dir)
+    if not download_gtfs_zip(settings.gtfs_url, zip_path, force=force):
+        # Still compared against the live schema below, in case the last load did not finish.
+        print("  • Not modified since the last download")
     print("• Loading into Postgres …")
-    rebuild_postgres_from_dir(settings.data_dir)
+    return rebuild_postgres(zip_path, force=force)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Load the GTFS feed into Postgres.")
+    parser.add_argument("--rollback", action="store_true", help="Swap the previous feed version back in")
+    parser.add_argument("--force", action="store_true", help="Download and reload every table even if unchanged")
+    args = parser.parse_args()
+    if args.rollback:
+        rollback_gtfs()
+    else:
+        nightly_rebuild(force=args.force)
@@ -1,18 +1,126 @@
 from __future__ import annotations
+import argparse
+import hashlib
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
 from config import settings
-from gtfs_loader import nightly_rebuild
-from build_route_index import build_route_index
-from build_semantic_index import build_semantic_index
+from gtfs_loader import feed_file_hashes, nightly_rebuild
+from build_route_index import INDEX_NAME as ROUTE_INDEX_NAME, build_route_index
+from build_route_geometry import ROUTE_GEOMETRY_PATH, build_route_geometry
+from build_route_shapes import ROUTE_SHAPES_PATH, build_route_shapes
+from build_semantic_index import INDEX_NAME as SEMANTIC_INDEX_NAME, SEMANTIC_DATA_PATH, build_semantic_index
+from embedding_cache import get_encoder
+from score_stats import PROBE_PATH, PROBE_SOURCE
+from src.app.utils.index_manifest import manifest_path
+
+# Fingerprint of the inputs of each step's last successful run.
+STATE_PATH = settings.index_dir / "refresh_state.json"
+
+
+def _file_hash(path: Path) -> str | None:
+    return hashlib.sha256(path.read_bytes()).hexdigest() if path.exists() else None
+
+
+def _index_inputs() -> Dict[str, Any]:
+    return {
+        "model": settings.sbert_model,
+        "faiss_index": settings.faiss_index,
+        "faiss_min_docs": settings.faiss_min_docs,
+        "probes": _file_hash(PROBE_PATH),
+        "probe_source": PROBE_SOURCE,
+    }
+
+
+@dataclass(frozen=True)
+class _Step:
+    title: str
+    build: Callable[[], None]
+    # GTFS tables the step reads
+    tables: Tuple[str, ...]
+    # Its published output; rebuilt when missing whatever the fingerprint says
+    output: Path
+    # Settings and files other than GTFS that the output depends on
+    extra: Callable[[], Dict[str, Any]]
+    faiss: bool = False
+
+
+STEPS = (
+    _Step(
+        "Building simplified route shapes",
+        build_route_shapes,
+        ("trips", "shapes"),
+        ROUTE_SHAPES_PATH,
+        lambda: {"tolerances": settings.shape_tolerances_m},
+    ),
+    _Step(
+        "Building route geometry for map matching",
+        build_route_geometry,
+        ("trips", "stop_times", "stops", "shapes"),
+        ROUTE_GEOMETRY_PATH,
+        dict,
+    ),
+    _Step(
+        "Building route FAISS index",
+        build_route_index,
+        ("routes", "trips", "stop_times", "stops"),
+        manifest_path(settings.index_dir, ROUTE_INDEX_NAME),
+        _index_inputs,
+        faiss=True,
+    ),
+    _Step(
+        "Building semantic FAISS index",
+        build_semantic_index,
+        ("stops", "stop_times", "trips", "routes"),
+        manifest_path(settings.index_dir, SEMANTIC_INDEX_NAME),
+        lambda: {**_index_inputs(), "overlay": _file_hash(SEMANTIC_DATA_PATH)},
+        faiss=True,
+    ),
+)
+
+
+def _fingerprint(step: _Step, gtfs: Dict[str, Any]) -> str:
+    inputs = {"gtfs": {table: gtfs.get(table) for table in step.tables}, **step.extra()}
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _read_state() -> Dict[str, str]:
+    return json.loads(STATE_PATH.read_text()) if STATE_PATH.exists() else {}
+
+
+def _write_state(state: Dict[str, str]) -> None:
+    tmp_path = STATE_PATH.with_suffix(".json.tmp")
+    tmp_path.write_text(json.dumps(state, indent=2, sort_keys=True))
+    tmp_path.replace(STATE_PATH)
+
 
-def main():
+def main(force: bool = False):
+    """Refresh the feed, then rebuild only the outputs whose inputs changed since their last build."""
     print("=== Rutgers GTFS nightly refresh ===")
-    nightly_rebuild()
-    if settings.build_faiss:
-        print("=== Building route FAISS index ===")
-        build_route_index()
-        print("=== Building semantic FAISS index ===")
-        build_semantic_index()
+    nightly_rebuild(force=force)
+    gtfs = feed_file_hashes()
+    state = _read_state()
+    built_index = False
+    for step in STEPS:
+        if step.faiss and not settings.build_faiss:
+            continue
+        fingerprint = _fingerprint(step, gtfs)
+        if not force and state.get(step.title) == fingerprint and step.output.exists():
+            print(f"=== {step.title}: inputs unchanged, skipped ===")
+            continue
+        print(f"=== {step.title} ===")
+        step.build()
+        state[step.title] = fingerprint
+        _write_state(state)
+        built_index |= step.faiss
+    if built_index:
+        removed = get_encoder().prune()
+        print(f"Pruned {removed} unused cached embeddings")
     print("=== Done ===")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Nightly GTFS refresh; unchanged inputs are skipped.")
+    parser.add_argument("--force", action="store_true", help="Reload the feed and rebuild every output")
+    main(force=parser.parse_args().force)
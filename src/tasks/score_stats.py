@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional
+
+import faiss
+import numpy as np
+import orjson
+
+from config import settings
+from embedding_cache import CachedEncoder
+
+# Probe questions; each index records how well its best document matches them. These are the
+# hand-written phrasings of the intent eval set, not logged user queries, so the calibration
+# is only as representative as that set. PROBE_SOURCE goes into the manifest to say so.
+PROBE_PATH = settings.repo_root / "data" / "eval" / "intent_eval.jsonl"
+PROBE_SOURCE = "synthetic:data/eval/intent_eval.jsonl"
+
+
+def probe_queries() -> List[str]:
+    if not PROBE_PATH.exists():
+        return []
+    return [orjson.loads(line)["message"] for line in PROBE_PATH.read_bytes().splitlines() if line.strip()]
+
+
+def top1_score_stats(encoder: CachedEncoder, index: faiss.Index) -> Optional[Dict[str, Any]]:
+    """Mean and std of the best score each probe question gets from ``index``.
+
+    Written to the manifest so the app can put scores from indexes with very different documents
+    (short stop names vs long route descriptions) on one scale.
+    """
+    queries = probe_queries()
+    if not queries or index.ntotal == 0:
+        return None
+    vectors = encoder.encode(queries)
+    scores, _ = index.search(vectors, 1)
+    best = scores[:, 0]
+    return {
+        "mean": float(np.mean(best)),
+        "std": float(np.std(best)),
+        "probes": len(queries),
+        "probe_source": PROBE_SOURCE,
+    }
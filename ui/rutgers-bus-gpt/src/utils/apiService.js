@@ -53,7 +53,9 @@ export const transformArrivalData = (apiResponse) => {
       color: arrival.route_color,
       destination: arrival.to,
       arrivalMinutes: Math.max(0, Math.round(arrival.eta_seconds / 60)),
-      etaSeconds: arrival.eta_seconds
+      etaSeconds: arrival.eta_seconds,
+      isScheduled: arrival.source === 'scheduled',
+      isPredicted: arrival.source === 'predicted'
     }))
   }));
 };